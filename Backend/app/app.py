@@ -1,23 +1,66 @@
-from flask import Flask, request, jsonify
+"""
+FLASK ENTRY POINT FOR THE CHAT API
+create_app() only registers routes: controllers are built on first use (or by a
+warm-up thread) and search indexes are checked in the background, so importing
+and starting the app is fast and works without network access.
+
+run: python app.py   (from Backend/app)
+indexes: flask --app app ensure-indexes   (with INDEX_SETUP=cli)
+"""
+import os
+import json
+import uuid
+from datetime import datetime, timezone
+
+from flask import Blueprint, Flask, Response, current_app, request, jsonify, stream_with_context
 from flask_cors import CORS
-from controllers.chatbot_controller import Chatbot
-from controllers.vector_store_controller import VectorStoreController as VectorStore
-from controllers.azure_storage_controller import AzureStorageController as AzureStorage
-app = Flask(__name__)
-CORS(app)
-# Initialize controllers
-chatbot = Chatbot()
-vector_store = VectorStore()
-azure_storage = AzureStorage()
+from controllers.app_controllers import AppControllers
+from controllers.client_registry import clients
+from controllers.metrics import metrics
+
+api = Blueprint("api", __name__)
+
+
+def create_app(controllers: AppControllers = None, warm_up: bool = None):
+    """Build the Flask app; controllers are created lazily by AppControllers."""
+    app = Flask(__name__)
+    CORS(app)
+    app.extensions["controllers"] = controllers or AppControllers()
+    app.register_blueprint(api)
+
+    @app.cli.command("ensure-indexes")
+    def ensure_indexes():
+        """Create missing MongoDB and Atlas Search indexes, then exit."""
+        app.extensions["controllers"].ensure_indexes()
+
+    if warm_up is None:
+        warm_up = os.getenv("WARM_UP_CONTROLLERS", "true").lower() == "true"
+    if warm_up:
+        app.extensions["controllers"].warm_up()
+    return app
+
+
+def get_controllers() -> AppControllers:
+    return current_app.extensions["controllers"]
+
+
+def parse_date(value: str):
+    """ISO date or datetime from a request; stored upload dates are UTC, so naive values are taken as UTC."""
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value)
+    return parsed.replace(tzinfo=timezone.utc) if parsed.tzinfo is None else parsed
 
 
 # Route for chatbot interaction
-@app.route('/api/chatbot', methods=['POST'])
+@api.route('/api/chatbot', methods=['POST'])
 def chat():
     try:
         data = request.json
         user_input = data['message']
-        response = chatbot.send_message(user_input)
+        # Each client keeps its own conversation; a new id is issued when none is supplied
+        session_id = data.get('session_id') or request.headers.get('X-Session-Id') or str(uuid.uuid4())
+        response = get_controllers().chatbot.send_message(user_input, session_id=session_id)
         # print(response)
         return response, 200
 
@@ -25,39 +68,146 @@ def chat():
         return jsonify({"error": str(e)}), 500
 
 
+# Route for streaming chatbot interaction (Server-Sent Events)
+@api.route('/api/chatbot/stream', methods=['POST'])
+def chat_stream():
+    try:
+        data = request.json
+        user_input = data['message']
+        session_id = data.get('session_id') or request.headers.get('X-Session-Id') or str(uuid.uuid4())
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+    controllers = get_controllers()
+
+    def events():
+        try:
+            for event in controllers.chatbot.stream_message(user_input, session_id=session_id):
+                yield f"event: {event['event']}\ndata: {json.dumps(event)}\n\n"
+        except Exception as e:
+            yield f"event: error\ndata: {json.dumps({'event': 'error', 'error': str(e)})}\n\n"
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return Response(stream_with_context(events()), mimetype='text/event-stream', headers=headers)
+
+
+# Route for session store usage and eviction counters
+@api.route('/api/chatbot/sessions', methods=['GET'])
+def session_stats():
+    return jsonify(get_controllers().chatbot.sessions.stats()), 200
+
+
+# Route for decision router accuracy and latency counters
+@api.route('/api/chatbot/router', methods=['GET'])
+def router_stats():
+    return jsonify(get_controllers().chatbot.router.stats()), 200
+
+
+# Route for cache sizes and hit rates
+@api.route('/api/cache/stats', methods=['GET'])
+def cache_stats():
+    chatbot = get_controllers().chatbot
+    stats = {"query_embeddings": chatbot.vectorStore.query_embeddings.stats()}
+    if chatbot.answer_cache is not None:
+        stats["answers"] = chatbot.answer_cache.stats()
+    return jsonify(stats), 200
+
+
+# Route for search mode and per-leg search latency
+@api.route('/api/search/stats', methods=['GET'])
+def search_stats():
+    return jsonify(get_controllers().chatbot.vectorStore.search_stats()), 200
+
+
+# Route for shared client counts and connection pool utilization
+@api.route('/api/clients/stats', methods=['GET'])
+def client_stats():
+    return jsonify(clients.stats()), 200
+
+
+# Route for Prometheus scraping: state latency histograms, LLM tokens, retrievals, errors and cache counters
+@api.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
 # Route for fetching documents from Azure Storage
-@app.route('/api/storage/files', methods=['GET'])
+@api.route('/api/storage/files', methods=['GET'])
 def fetch_documents():
     try:
-        response = azure_storage.list_files_with_urls()
+        response = get_controllers().azure_storage.list_files_with_urls()
         print(response)
         return response, 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
-# Route for adding documents to the knowledge base
-@app.route('/api/knowledge-base/add', methods=['POST'])
+# Route for adding documents to the knowledge base (as a background job; "wait": true ingests inline)
+@api.route('/api/knowledge-base/add', methods=['POST'])
 def add_document():
     try:
         data = request.json
         sources = data['sources']
         sources_types = data['sources_types']
-        vector_store.insert_data(sources, sources_types)
-        return jsonify({"message": "Documents added successfully."}), 200
+        if data.get('wait'):
+            # Ingest within the request (small batches, scripts)
+            summary = get_controllers().vector_store.insert_data(sources, sources_types, tags=data.get('tags'))
+            return jsonify({"message": "Documents added successfully.", "summary": summary}), 200
+        job_id = get_controllers().ingestion_jobs.submit(sources, sources_types, tags=data.get('tags'))
+        return jsonify({"message": "Ingestion job queued.", "job_id": job_id, "status": "queued"}), 202
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+# Route for listing recent ingestion jobs
+@api.route('/api/knowledge-base/jobs', methods=['GET'])
+def list_ingestion_jobs():
+    limit = request.args.get('limit', default=20, type=int)
+    return jsonify(get_controllers().ingestion_jobs.list(limit)), 200
+
+# Route for the status and per-source progress of an ingestion job
+@api.route('/api/knowledge-base/jobs/<job_id>', methods=['GET'])
+def ingestion_job_status(job_id):
+    job = get_controllers().ingestion_jobs.status(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job."}), 404
+    return jsonify(job), 200
+
+# Route for cancelling an ingestion job (running jobs stop at the next pipeline stage)
+@api.route('/api/knowledge-base/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_ingestion_job(job_id):
+    status = get_controllers().ingestion_jobs.cancel(job_id)
+    if status is None:
+        return jsonify({"error": "Unknown job."}), 404
+    return jsonify({"job_id": job_id, "status": status}), 200
+
 # Route for removing documents from the knowledge base
-@app.route('/api/knowledge-base/remove', methods=['POST'])
+# payload: {"sources": [...], "blob_names": [...], "upload_date_from": ISO date, "upload_date_to": ISO date}
+# (only chunks matching every given criterion are removed) or {"all": true} to clear the whole knowledge base
+@api.route('/api/knowledge-base/remove', methods=['POST'])
 def remove_document():
     try:
-        data = request.json
-        # Implement logic to remove specific documents based on identifiers
-        # For simplicity, we'll clear all documents
-        vector_store.delete_all_documents()
-        return jsonify({"message": "Documents removed successfully."}), 200
+        data = request.json or {}
+        if data.get('all'):
+            get_controllers().vector_store.delete_all_documents()
+            return jsonify({"message": "Documents removed successfully."}), 200
+
+        try:
+            date_from, date_to = parse_date(data.get('upload_date_from')), parse_date(data.get('upload_date_to'))
+        except (TypeError, ValueError) as e:
+            return jsonify({"error": f"Invalid upload date, expected an ISO 8601 date: {e}"}), 400
+        criteria = {
+            "sources": data.get('sources'),
+            "blob_names": data.get('blob_names'),
+            "date_from": date_from,
+            "date_to": date_to,
+        }
+        if not any(criteria.values()):
+            return jsonify({"error": "No removal criteria given."}), 400
+
+        deleted = get_controllers().vector_store.remove_documents(**criteria)
+        return jsonify({"message": "Documents removed successfully.", "deleted": deleted}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+app = create_app()
+
 if __name__ == '__main__':
-    app.run(debug=True)
\ No newline at end of file
+    app.run(debug=True)
@@ -0,0 +1,88 @@
+"""
+ASGI ENTRY POINT FOR THE CHAT API
+Async counterpart of app.py for chat only: the chat pipeline awaits the LLM,
+embedding and Mongo calls, so one worker can hold many conversations in flight.
+It serves chat, its stats and /metrics. Streaming chat (SSE) and the
+knowledge-base and ingestion job routes are served by app.py only.
+
+Controllers are built lazily (see app.py), off the event loop. The async Mongo
+clients of the serving loop are closed on shutdown.
+
+run: uvicorn asgi:app --port 5001   (from Backend/app)
+"""
+import os
+import uuid
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Optional
+
+from fastapi import FastAPI, Header
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
+from pydantic import BaseModel
+
+from controllers.app_controllers import AppControllers
+from controllers.client_registry import clients
+from controllers.metrics import metrics
+
+# Controllers are built on first use; the warm-up thread usually gets there before the first chat
+controllers = AppControllers()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if os.getenv("WARM_UP_CONTROLLERS", "true").lower() == "true":
+        controllers.warm_up(["chatbot"])
+    yield
+    await clients.aclose()
+
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])
+
+
+async def get_chatbot():
+    """The chatbot, built in a worker thread on first use so the event loop never blocks on it."""
+    if "chatbot" in controllers.build_seconds:
+        return controllers.chatbot
+    return await asyncio.to_thread(lambda: controllers.chatbot)
+
+
+class ChatRequest(BaseModel):
+    message: str
+    session_id: Optional[str] = None
+
+
+# Route for chatbot interaction
+@app.post('/api/chatbot')
+async def chat(data: ChatRequest, x_session_id: Optional[str] = Header(default=None)):
+    try:
+        session_id = data.session_id or x_session_id or str(uuid.uuid4())
+        chatbot = await get_chatbot()
+        return await chatbot.asend_message(data.message, session_id=session_id)
+    except Exception as e:
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+
+# Route for session store usage and eviction counters
+@app.get('/api/chatbot/sessions')
+async def session_stats():
+    return (await get_chatbot()).sessions.stats()
+
+
+# Route for decision router accuracy and latency counters
+@app.get('/api/chatbot/router')
+async def router_stats():
+    return (await get_chatbot()).router.stats()
+
+
+# Route for shared client counts and connection pool utilization
+@app.get('/api/clients/stats')
+async def client_stats():
+    return clients.stats()
+
+
+# Route for Prometheus scraping (see app.py)
+@app.get('/metrics')
+async def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type='text/plain; version=0.0.4')
@@ -0,0 +1,169 @@
+"""
+ANSWER CACHE IN FRONT OF THE CHAT PIPELINE
+- TIER 1: EXACT NORMALIZED-QUERY MATCH
+- TIER 2: SEMANTIC NEAREST NEIGHBOUR ABOVE A SIMILARITY THRESHOLD
+- ENTRIES TIED TO THE KNOWLEDGE BASE VERSION, TTL AND CAPACITY BOUNDED
+"""
+import os
+import time
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional
+
+import numpy as np
+
+from .embedding_cache import CachedEmbeddings, normalize_query
+
+logger = logging.getLogger(__name__)
+
+
+class AnswerEntry:
+    __slots__ = ("answer", "kb_version", "created", "slot")
+
+    def __init__(self, answer: str, kb_version: int, slot: int):
+        self.answer = answer
+        self.kb_version = kb_version
+        self.created = time.monotonic()
+        self.slot = slot
+
+
+class AnswerCache:
+    def __init__(self, embeddings: CachedEmbeddings, kb_version: Callable[[], int], capacity=None, ttl_seconds=None,
+                 similarity_threshold=None, akb_version: Callable[[], Awaitable[int]] = None):
+        """Cache answers per knowledge base version; kb_version() returns the current version.
+
+        akb_version is its async variant for aget()/aput(); without it kb_version() runs in a worker thread.
+        """
+        self.embeddings = embeddings
+        self.kb_version = kb_version
+        self.akb_version = akb_version or (lambda: asyncio.to_thread(kb_version))
+        self.capacity = capacity or int(os.getenv("ANSWER_CACHE_SIZE", 1000))
+        self.ttl_seconds = ttl_seconds or float(os.getenv("ANSWER_CACHE_TTL_SECONDS", 86400))
+        self.similarity_threshold = similarity_threshold or float(os.getenv("ANSWER_CACHE_SIMILARITY", 0.95))
+
+        self._entries: "OrderedDict[str, AnswerEntry]" = OrderedDict()  # least recently used first
+        self._lock = threading.Lock()
+        # Normalized query vectors live in one matrix; row i belongs to the entry with slot i
+        self._vectors: Optional[np.ndarray] = None
+        self._slot_keys = [None] * self.capacity
+        self._free_slots = list(range(self.capacity - 1, -1, -1))
+        self.counters = {"exact_hits": 0, "semantic_hits": 0, "misses": 0, "expired": 0, "invalidated": 0,
+                         "evictions": 0}
+
+    def get(self, query: str) -> Optional[str]:
+        """Return a cached answer for the query, or None."""
+        key = normalize_query(query)
+        version = self.kb_version()
+        answer = self._exact(key, version)
+        if answer is not None:
+            return answer
+        return self._semantic(self.embeddings.embed_query(query), version)
+
+    async def aget(self, query: str) -> Optional[str]:
+        """Async variant of get(): nothing blocks the event loop."""
+        key = normalize_query(query)
+        version = await self.akb_version()
+        answer = self._exact(key, version)
+        if answer is not None:
+            return answer
+        return self._semantic(await self.embeddings.aembed_query(query), version)
+
+    def put(self, query: str, answer: str):
+        """Cache an answer. The query embedding comes from the embeddings cache, so this is usually free."""
+        self._store(normalize_query(query), self.embeddings.embed_query(query), self.kb_version(), answer)
+
+    async def aput(self, query: str, answer: str):
+        """Async variant of put()."""
+        vector = await self.embeddings.aembed_query(query)
+        self._store(normalize_query(query), vector, await self.akb_version(), answer)
+
+    def _store(self, key: str, vector, version: int, answer: str):
+        vector = self._unit(vector)
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = np.zeros((self.capacity, vector.shape[0]), dtype=np.float32)
+
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                if not self._free_slots:
+                    self._drop(next(iter(self._entries)), "evictions")
+                entry = AnswerEntry(answer, version, self._free_slots.pop())
+            else:
+                entry.answer, entry.kb_version, entry.created = answer, version, time.monotonic()
+
+            self._entries[key] = entry
+            self._slot_keys[entry.slot] = key
+            self._vectors[entry.slot] = vector
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._entries):
+                self._drop(key, "invalidated")
+
+    def _exact(self, key: str, version: int) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or not self._valid(key, entry, version):
+                return None
+            self._entries.move_to_end(key)
+            self.counters["exact_hits"] += 1
+            return entry.answer
+
+    def _semantic(self, query_vector, version: int) -> Optional[str]:
+        with self._lock:
+            if self._entries:
+                similarities = self._vectors @ self._unit(query_vector)
+                # Check candidates best-first; stale ones are dropped as they are found
+                for slot in np.argsort(-similarities):
+                    if similarities[slot] < self.similarity_threshold:
+                        break
+                    key = self._slot_keys[slot]
+                    if key is None:
+                        continue
+                    entry = self._entries[key]
+                    if self._valid(key, entry, version):
+                        self._entries.move_to_end(key)
+                        self.counters["semantic_hits"] += 1
+                        return entry.answer
+
+            self.counters["misses"] += 1
+            return None
+
+    def _valid(self, key: str, entry: AnswerEntry, version: int) -> bool:
+        """Drop entries from an older knowledge base version or past their TTL. Caller holds the lock."""
+        if entry.kb_version != version:
+            self._drop(key, "invalidated")
+            return False
+        if time.monotonic() - entry.created > self.ttl_seconds:
+            self._drop(key, "expired")
+            return False
+        return True
+
+    def _drop(self, key: str, reason: str):
+        entry = self._entries.pop(key)
+        self._slot_keys[entry.slot] = None
+        self._vectors[entry.slot] = 0.0
+        self._free_slots.append(entry.slot)
+        self.counters[reason] += 1
+
+    @staticmethod
+    def _unit(vector) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def stats(self):
+        """Return hit/miss counters, size and configuration."""
+        with self._lock:
+            lookups = self.counters["exact_hits"] + self.counters["semantic_hits"] + self.counters["misses"]
+            hits = self.counters["exact_hits"] + self.counters["semantic_hits"]
+            return {
+                **self.counters,
+                "entries": len(self._entries),
+                "capacity": self.capacity,
+                "ttl_seconds": self.ttl_seconds,
+                "similarity_threshold": self.similarity_threshold,
+                "hit_rate": hits / lookups if lookups else 0.0,
+            }
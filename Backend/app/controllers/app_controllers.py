@@ -0,0 +1,104 @@
+"""
+CONTROLLERS OF THE WEB APPS, BUILT LAZILY
+- NOTHING IS CONSTRUCTED (OR IMPORTED) WHEN THE APP MODULE IS IMPORTED
+- EACH CONTROLLER IS BUILT ONCE, BY THE FIRST REQUEST THAT NEEDS IT OR BY AN OPTIONAL WARM-UP THREAD
+- SEARCH INDEXES ARE CHECKED ONCE: IN THE BACKGROUND, AT CONSTRUCTION, OR ONLY THROUGH THE CLI
+"""
+import os
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+INDEX_SETUP_MODES = ("background", "startup", "cli")
+
+
+class AppControllers:
+    def __init__(self, index_setup: str = None):
+        """index_setup: "background" (thread after construction), "startup" (inline) or "cli" (flask ensure-indexes)."""
+        self.index_setup = index_setup or os.getenv("INDEX_SETUP", "background")
+        if self.index_setup not in INDEX_SETUP_MODES:
+            raise ValueError(f"Unsupported index setup: {self.index_setup}")
+        self._lock = threading.RLock()
+        self._chatbot = None
+        self._vector_store = None
+        self._azure_storage = None
+        self._ingestion_jobs = None
+        self.build_seconds = {}
+
+    @property
+    def chatbot(self):
+        if self._chatbot is None:
+            with self._lock:
+                if self._chatbot is None:
+                    start = time.perf_counter()
+                    from .chatbot_controller import Chatbot
+                    self._chatbot = Chatbot(create_indexes=False)
+                    self.built("chatbot", start, self._chatbot.vectorStore)
+        return self._chatbot
+
+    @property
+    def vector_store(self):
+        """Knowledge base managed by the add/remove routes (QC_COLLECTION)."""
+        if self._vector_store is None:
+            with self._lock:
+                if self._vector_store is None:
+                    start = time.perf_counter()
+                    from .vector_store_controller import VectorStoreController
+                    self._vector_store = VectorStoreController(create_indexes=False)
+                    self.built("vector_store", start, self._vector_store)
+        return self._vector_store
+
+    @property
+    def azure_storage(self):
+        if self._azure_storage is None:
+            with self._lock:
+                if self._azure_storage is None:
+                    start = time.perf_counter()
+                    from .azure_storage_controller import AzureStorageController
+                    self._azure_storage = AzureStorageController()
+                    self.built("azure_storage", start)
+        return self._azure_storage
+
+    @property
+    def ingestion_jobs(self):
+        """Background ingestion into the knowledge base; opening it resumes unfinished jobs."""
+        if self._ingestion_jobs is None:
+            with self._lock:
+                if self._ingestion_jobs is None:
+                    start = time.perf_counter()
+                    from .ingestion_jobs import IngestionJobs
+                    self._ingestion_jobs = IngestionJobs(lambda: self.vector_store)
+                    self.built("ingestion_jobs", start)
+        return self._ingestion_jobs
+
+    def built(self, name: str, start: float, vector_store=None):
+        self.build_seconds[name] = round(time.perf_counter() - start, 3)
+        logger.info(f"Controller '{name}' built in {self.build_seconds[name]}s.")
+        if vector_store is None:
+            return
+        if self.index_setup == "startup":
+            vector_store.ensure_indexes()
+        elif self.index_setup == "background":
+            threading.Thread(target=vector_store.ensure_indexes, name="ensure-indexes", daemon=True).start()
+
+    def warm_up(self, names=("chatbot", "vector_store")):
+        """Build the named controllers in a background thread, so the first requests don't pay for it.
+
+        Ingestion jobs are left out: opening them resumes unfinished jobs, which only a process that
+        serves the job routes should do (not the reloader parent or a CLI command).
+        """
+        def build():
+            try:
+                for name in names:
+                    getattr(self, name)
+            except Exception as e:
+                logger.error(f"Error warming up controllers: {e}")
+
+        threading.Thread(target=build, name="warm-up", daemon=True).start()
+
+    def ensure_indexes(self):
+        """Check the indexes of every knowledge base the app serves (flask ensure-indexes)."""
+        for vector_store in (self.chatbot.vectorStore, self.vector_store):
+            vector_store.ensure_indexes()
@@ -3,7 +3,6 @@ import logging
 import uuid
 from datetime import datetime, timedelta, timezone
 
-from aiohttp.web_fileresponse import content_type
 from dotenv import load_dotenv
 from azure.identity import DefaultAzureCredential
 from azure.storage.blob import BlobServiceClient, generate_blob_sas, BlobSasPermissions, ContentSettings
@@ -102,16 +101,17 @@ class AzureStorageController:
             self.logger.error(f"Error generating SAS token for '{blob_name}': {ex}")
 
 
-cv_path = "../../Test-Documents/ben-resumes/benollomo-cv.pdf"
-cover_letter_path = "../../Test-Documents/ben-resumes/benollomo-cover-letter.pdf"
+# Example usage (run by hand, never at import: it uploads to the storage account)
+# cv_path = "../../Test-Documents/ben-resumes/benollomo-cv.pdf"
+# cover_letter_path = "../../Test-Documents/ben-resumes/benollomo-cover-letter.pdf"
 # download_path = "../../Test-Documents/ben-resumes/blob_download.pdf"
 #
 #
-storage = AzureStorageController()
+# storage = AzureStorageController()
 
 # add File
 # storage.add_file(cv_path, "benollomo-cv")
-storage.add_file(cover_letter_path, "benollomo-cover-letter")
+# storage.add_file(cover_letter_path, "benollomo-cover-letter")
 
 # storage.delete_file("benollomo-cv")
 # storage.delete_file("benollomo-cv.pdf")
@@ -125,4 +125,3 @@ storage.add_file(cover_letter_path, "benollomo-cover-letter")
 # storage.list_files_names()
 
 # print(storage.generate_blob_name("benjamin"))
-
@@ -11,11 +11,17 @@ from typing import Sequence, List
 
 from dotenv import load_dotenv
 from langchain_core.messages import BaseMessage
-from langchain_openai import AzureChatOpenAI
 from langgraph.graph.message import add_messages
 from typing_extensions import Annotated, TypedDict
 
-from .chatbot_states import StateMachine  # Import the StateMachine class
+from .answer_cache import AnswerCache
+from .client_registry import clients
+from .chatbot_states import StateMachine, ChatContext  # Import the StateMachine class
+from .context_compressor import ContextCompressor
+from .context_selector import ContextSelector
+from .metrics import metrics
+from .query_router import QueryRouter
+from .session_store import SessionStore
 from .vector_store_controller import VectorStoreController
 
 # from langchain_core.messages import SystemMessage, HumanMessage, AIMessage, trim_messages
@@ -36,8 +42,9 @@ def AIMessage(message: str):
 
 
 class Chatbot:
-    def __init__(self, systemPrompt="You are a helpful assistant.", language="all languages"):
-        self.model = AzureChatOpenAI(
+    def __init__(self, systemPrompt="You are a helpful assistant.", language="all languages", model=None, vector_store=None,
+                 search_filters=None, create_indexes=True):
+        self.model = model or clients.chat_model(
             azure_deployment=os.getenv('OPENAI_NAME'),  # or your deployment
             api_version=os.getenv('OPENAI_API_VERSION'),  # or your api version
             temperature=0,
@@ -52,31 +59,73 @@ class Chatbot:
 
         self.language = language
         self.systemPrompt = systemPrompt
-        self.message_history = []
-        self.context = ""
         self.thread_id = self.generate_thread_id()
+        self.sessions = SessionStore()
 
         # self.vector_name = "One-Piece-KB_2"
         self.vector_name = "QC_Life_Docs"
-        self.vectorStore = VectorStoreController(collection_name=self.vector_name)
-
-        self.SearchTool = self.VectorSearchTool(self.vectorStore)
-
-    def is_search_tool_required(self, query):
+        self.vectorStore = vector_store or VectorStoreController(collection_name=self.vector_name,
+                                                                 create_indexes=create_indexes)
+        # Optional scope within the collection, e.g. {"tags": ["qc"]} (see VectorStoreController.build_filter)
+        self.search_filters = search_filters
+        # Relevance cutoff, MMR and token budget decide how many retrieved chunks reach the prompt
+        self.context_selector = ContextSelector()
+        # Keeps the sentences of the selected chunks that match the query, within CONTEXT_TOKEN_BUDGET
+        self.context_compressor = ContextCompressor(self.vectorStore.query_embeddings)
+
+        self.SearchTool = self.VectorSearchTool(self.vectorStore, search_filters, self.context_selector,
+                                                self.context_compressor)
+        self.router = QueryRouter(self)
+
+        # FAQ-style first questions are answered from cache until the knowledge base changes
+        self.answer_cache = None
+        if os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true":
+            self.answer_cache = AnswerCache(self.vectorStore.query_embeddings, self.vectorStore.get_kb_version,
+                                            akb_version=self.vectorStore.aget_kb_version)
+
+        # Cache, session and routing counters are read when /metrics is scraped, not per request
+        metrics.register_collector("chatbot", self.collect_metrics)
+
+    def tool_selector_prompt(self, query):
         system_message = (
             "You are a tool selector for a chatbot answering questions about QC Life. "
             "Determine if the user's message needs context retrieval. Reply with 'yes' or 'no' only."
         )
+        return [SystemMessage(system_message), HumanMessage(query)]
 
-        prompt = [SystemMessage(system_message), HumanMessage(query)]
-        response = self.model.invoke(prompt)
+    def is_search_tool_required(self, query):
+        response = self.model.invoke(self.tool_selector_prompt(query))
+        metrics.record_usage("router", response)
         return response.content.strip().lower() == "yes"
 
+    async def ais_search_tool_required(self, query):
+        response = await self.model.ainvoke(self.tool_selector_prompt(query))
+        metrics.record_usage("router", response)
+        return response.content.strip().lower() == "yes"
+
+    def retrieve_documents(self, query, raise_errors=False):
+        selector = self.context_selector
+        retrieved_data = self.vectorStore.vector_search(query, top_k=selector.fetch_k, filters=self.search_filters,
+                                                        with_vectors=selector.mmr, raise_errors=raise_errors)
+        return selector.select(retrieved_data)
+
+    async def aretrieve_documents(self, query, raise_errors=False):
+        selector = self.context_selector
+        retrieved_data = await self.vectorStore.avector_search(query, top_k=selector.fetch_k,
+                                                               filters=self.search_filters, with_vectors=selector.mmr,
+                                                               raise_errors=raise_errors)
+        return selector.select(retrieved_data)
+
+    def format_context(self, documents):
+        return "\n".join(f"- {doc.page_content}" for doc in documents)
+
     def retrieve_context(self, query):
-        retrieved_data = self.vectorStore.vector_search(query, top_k=4)
-        context = ""
-        context = "\n".join(f"- {doc.page_content}" for doc in retrieved_data)
-        return context
+        documents = self.context_compressor.compress(query, self.retrieve_documents(query))
+        return self.format_context(documents)
+
+    async def aretrieve_context(self, query):
+        documents = await self.context_compressor.acompress(query, await self.aretrieve_documents(query))
+        return self.format_context(documents)
 
     def construct_messages(self, messages: List[BaseMessage], context: str = "") -> str:
         # Build the system message with  context
@@ -99,19 +148,113 @@ class Chatbot:
 
         return prompt
 
-    def send_message(self, query: str):
-        """Starts the state machine for processing a user query."""
-        self.context = ""
-        self.state_machine.run(query)
+    def send_message(self, query: str, session_id: str = None):
+        """Starts the state machine for processing a user query within a session."""
+        session_id = session_id or self.thread_id
+        ctx = ChatContext(query, session_id, self.sessions.window(session_id))
 
-        # Prepare the output
-        output = {
-            "message_history": self.message_history,
-            "ai_message": self.message_history[-1]
-        }
+        cacheable = self.is_cacheable(ctx)
+        if not (cacheable and self.answer_from_cache(ctx, self.answer_cache.get(query))):
+            self.state_machine.run(query, ctx)
+
+        self.cache_answer(ctx, cacheable)
+        return self.finish_turn(ctx)
+
+    async def asend_message(self, query: str, session_id: str = None):
+        """Async variant of send_message, for the ASGI app."""
+        session_id = session_id or self.thread_id
+        ctx = ChatContext(query, session_id, self.sessions.window(session_id))
+
+        cacheable = self.is_cacheable(ctx)
+        if not (cacheable and self.answer_from_cache(ctx, await self.answer_cache.aget(query))):
+            await self.state_machine.arun(query, ctx)
 
-        return output
+        await self.acache_answer(ctx, cacheable)
+        return self.finish_turn(ctx)
+
+    def stream_message(self, query: str, session_id: str = None):
+        """Streaming variant of send_message: yields state and token events, then a final 'done' event."""
+        session_id = session_id or self.thread_id
+        ctx = ChatContext(query, session_id, self.sessions.window(session_id))
+
+        cacheable = self.is_cacheable(ctx)
+        if cacheable and self.answer_from_cache(ctx, self.answer_cache.get(query)):
+            yield {"event": "token", "content": ctx.message_history[-1][1]}
+        else:
+            yield from self.state_machine.stream(query, ctx)
+
+        self.cache_answer(ctx, cacheable)
+        output = self.finish_turn(ctx)
+        yield {"event": "done", "session_id": session_id, "ai_message": output["ai_message"], "timings": ctx.timings}
+
+    def is_cacheable(self, ctx: ChatContext):
+        """Only opening questions are cached: later answers depend on the conversation so far."""
+        return self.answer_cache is not None and not ctx.message_history
+
+    def answer_from_cache(self, ctx: ChatContext, answer: str):
+        """Complete the turn with a cached answer, if there is one."""
+        if answer is None:
+            return False
+        ctx.add_message("human", ctx.query)
+        ctx.add_message("ai", answer)
+        ctx.from_cache = True
+        return True
+
+    def should_cache(self, ctx: ChatContext, cacheable: bool):
+        """A fresh answer is cached unless it was written without the context its question needed: after a
+        failed search, or when a question routed to the knowledge base found nothing in it."""
+        if not cacheable or ctx.from_cache:
+            return False
+        return not (ctx.retrieval_failed or (ctx.searched and not ctx.documents))
+
+    def cache_answer(self, ctx: ChatContext, cacheable: bool):
+        """Remember a freshly generated answer to an opening question."""
+        if self.should_cache(ctx, cacheable):
+            self.answer_cache.put(ctx.query, ctx.message_history[-1][1])
+
+    async def acache_answer(self, ctx: ChatContext, cacheable: bool):
+        """Async variant of cache_answer(): embedding and kb version lookups stay off the event loop."""
+        if self.should_cache(ctx, cacheable):
+            await self.answer_cache.aput(ctx.query, ctx.message_history[-1][1])
+
+    def finish_turn(self, ctx: ChatContext):
+        """Save the turn to the session and prepare the output."""
+        self.sessions.extend(ctx.session_id, ctx.new_messages)
+        ai_message = ctx.message_history[-1][1]
+        return {
+            "session_id": ctx.session_id,
+            "message_history": ctx.message_history,
+            "ai_message": ai_message,
+            "from_cache": ctx.from_cache,
+            "timings": ctx.timings
+        }
 
+    def collect_metrics(self):
+        """Metric families for /metrics, built from the stats() of the caches, sessions and router."""
+        caches = {name: cache.stats() for name, cache in (("query_embeddings", self.vectorStore.query_embeddings),
+                                                           ("answers", self.answer_cache),
+                                                           ("sentence_embeddings",
+                                                            self.context_compressor.sentence_embeddings))
+                  if cache is not None}
+        lookups = [({"cache": cache, "result": result}, stats[result])
+                   for cache, stats in caches.items()
+                   for result in ("memory_hits", "disk_hits", "exact_hits", "semantic_hits", "misses")
+                   if result in stats]
+        entries = [({"cache": cache}, stats["entries"]) for cache, stats in caches.items()]
+
+        sessions = self.sessions.stats()
+        router = self.router.stats()
+        speculation = self.state_machine.speculation
+        return [
+            ("chatbot_cache_lookups_total", "counter", "Cache lookups by result.", lookups),
+            ("chatbot_cache_entries", "gauge", "Entries held by each cache.", entries),
+            ("chatbot_sessions", "gauge", "Sessions in the session store.", [({}, sessions["sessions"])]),
+            ("chatbot_session_bytes", "gauge", "Bytes held by the session store.", [({}, sessions["total_bytes"])]),
+            ("chatbot_router_decisions_total", "counter", "Routing decisions by path.",
+             [({"path": path}, counter["count"]) for path, counter in router["paths"].items()]),
+            ("chatbot_speculative_searches_total", "counter", "Speculative searches by outcome.",
+             [({"outcome": outcome}, speculation[outcome]) for outcome in ("used", "discarded")]),
+        ]
 
     def generate_thread_id(self):
         return str(uuid.uuid4())
@@ -121,18 +264,22 @@ class Chatbot:
         language: str
 
     class VectorSearchTool:
-        def __init__(self, database):
+        def __init__(self, database, filters=None, selector=None, compressor=None):
             self.name = "Vector_Search_Tool"
             self.description = "This tool performs a vector search on a user query"
             self.database = database
+            self.filters = filters
+            self.selector = selector or ContextSelector()
+            self.compressor = compressor or ContextCompressor(database.query_embeddings)
 
         def run(self, query: str = ""):
             if query == "":
                 return ""
 
-            retrieved_data = self.database.vector_search(query, top_k=4)
+            retrieved_data = self.database.vector_search(query, top_k=self.selector.fetch_k, filters=self.filters,
+                                                         with_vectors=self.selector.mmr)
             context = ""
-            for doc in retrieved_data:
+            for doc in self.compressor.compress(query, self.selector.select(retrieved_data)):
                 context += f"\n- Source: {str(doc.metadata)} \n- Content: {str(doc.page_content)} \n"
 
             return context
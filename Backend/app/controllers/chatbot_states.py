@@ -1,91 +1,372 @@
 # chatbot_states.py
+import os
+import time
+import asyncio
+import logging
+import threading
 from abc import ABC, abstractmethod
-from typing import TYPE_CHECKING
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, List, Tuple
+
+from .metrics import metrics
 
 # Import Chatbot for type checking only, to avoid circular import issues
 if TYPE_CHECKING:
     from chatbot_controller import Chatbot
 
+logger = logging.getLogger(__name__)
+
+
+class ChatContext:
+    """Per-request execution state passed through the state machine.
+
+    States only read shared configuration from the chatbot and keep everything
+    that belongs to one request here, so overlapping requests never share state.
+    """
+
+    def __init__(self, query: str, session_id: str = None, message_history: List[Tuple[str, str]] = None):
+        self.query = query
+        self.session_id = session_id
+        self.message_history = list(message_history or [])
+        self.new_messages: List[Tuple[str, str]] = []
+        self.documents = []  # Retrieved chunks, before compression
+        self.context = ""
+        self.from_cache = False  # Answered by the answer cache without running the states
+        self.searched = False  # The knowledge base was searched for this turn
+        self.retrieval_failed = False  # ...but the search failed, the answer has no context
+        self.speculative_search = None  # Future/Task of a retrieval started alongside the decision
+        self.timings = {}  # Milliseconds per stage
+
+    def record_timing(self, stage: str, start: float):
+        """Add the time elapsed since start (perf_counter) to a stage."""
+        self.timings[stage] = self.timings.get(stage, 0.0) + (time.perf_counter() - start) * 1000
+
+    def add_message(self, role: str, content: str):
+        """Record a message for this turn."""
+        message = (role, content)
+        self.message_history.append(message)
+        self.new_messages.append(message)
+
 
 class State(ABC):
     """Base class for all states in the chatbot state machine."""
 
+    progress_message = ""  # Shown to streaming clients when the state starts
+
     def __init__(self, chatbot: "Chatbot", state_name: str):
         self.chatbot = chatbot
         self.state_name = state_name
 
     @abstractmethod
-    def handle(self, query: str):
-        """Handle the state's main logic."""
+    def handle(self, query: str, ctx: ChatContext):
+        """Handle the state's main logic and return the name of the next state."""
         pass
 
+    def stream(self, query: str, ctx: ChatContext):
+        """Streaming variant of handle(): yields output tokens, returns the next state name."""
+        return self.handle(query, ctx)
+        yield  # Unreachable, makes this method a generator
+
+    async def ahandle(self, query: str, ctx: ChatContext):
+        """Async variant of handle(). States that wait on the network override it."""
+        return self.handle(query, ctx)
+
 
 class IdleState(State):
     """State when chatbot is Idle."""
 
-    def handle(self, query: str):
-        print("State: Idle")
+    def handle(self, query: str, ctx: ChatContext):
         return "user_input"  # Transition to the DecisionState
 
 class UserInputState(State):
     """State for receiving user input."""
 
-    def handle(self, query: str):
-        print("State: UserInputState")
-        self.chatbot.message_history.append(query)
+    def handle(self, query: str, ctx: ChatContext):
+        ctx.add_message("human", query)
         return "decision"  # Transition to the DecisionState
 
 
 class DecisionState(State):
     """State to decide if a vector search is needed."""
 
+    progress_message = "Thinking"
 
-    def handle(self, query: str):
-        print("State: DecisionState")
-        if self.chatbot.is_search_tool_required(query):
+    def handle(self, query: str, ctx: ChatContext):
+        if self.chatbot.router.route(query):
             return "vector_search"  # Transition to VectorSearchState
         return "response"  # Transition to ResponseState
 
+    async def ahandle(self, query: str, ctx: ChatContext):
+        if await self.chatbot.router.aroute(query):
+            return "vector_search"
+        return "response"
+
 
 class VectorSearchState(State):
     """State to perform vector search and fetch context."""
 
-    def handle(self, query: str):
-        print("State: VectorSearchState")
-        context = self.chatbot.retrieve_context(query)
-        self.chatbot.context = context  # Store context for use in response
+    progress_message = "Searching knowledge base"
+
+    def handle(self, query: str, ctx: ChatContext):
+        if ctx.speculative_search is not None:
+            # Retrieval already started during the decision, just wait for it
+            documents, failed, ctx.timings["speculative_search"] = ctx.speculative_search.result()
+            ctx.speculative_search = None
+        else:
+            documents, failed = self.retrieve(query)
+        self.record(ctx, documents, failed)
+        return "compress_context"  # Transition to ContextCompressionState
+
+    async def ahandle(self, query: str, ctx: ChatContext):
+        if ctx.speculative_search is not None:
+            documents, failed, ctx.timings["speculative_search"] = await ctx.speculative_search
+            ctx.speculative_search = None
+        else:
+            documents, failed = await self.aretrieve(query)
+        self.record(ctx, documents, failed)
+        return "compress_context"
+
+    def retrieve(self, query: str):
+        """The selected chunks and whether the search failed; a failure still lets the turn be answered."""
+        try:
+            return self.chatbot.retrieve_documents(query, raise_errors=True), False
+        except Exception as e:
+            logger.warning(f"Answering without context, retrieval failed: {e}")
+            return [], True
+
+    async def aretrieve(self, query: str):
+        try:
+            return await self.chatbot.aretrieve_documents(query, raise_errors=True), False
+        except Exception as e:
+            logger.warning(f"Answering without context, retrieval failed: {e}")
+            return [], True
+
+    @staticmethod
+    def record(ctx: ChatContext, documents: list, failed: bool):
+        ctx.documents = documents  # Stored for compression
+        ctx.searched = True
+        ctx.retrieval_failed = failed
+        metrics.record_retrieval(documents)
+
+
+class ContextCompressionState(State):
+    """State to cut the retrieved chunks down to the sentences relevant to the query."""
+
+    def handle(self, query: str, ctx: ChatContext):
+        ctx.context = self.chatbot.format_context(self.chatbot.context_compressor.compress(query, ctx.documents))
         return "response"  # Transition to ResponseState
 
+    async def ahandle(self, query: str, ctx: ChatContext):
+        documents = await self.chatbot.context_compressor.acompress(query, ctx.documents)
+        ctx.context = self.chatbot.format_context(documents)
+        return "response"
+
 
 class ResponseState(State):
     """State to generate the chatbot's response."""
 
-    def handle(self, query: str):
-        print("State: ResponseState")
-        messages = self.chatbot.construct_messages(self.chatbot.message_history, self.chatbot.context)
+    progress_message = "Writing answer"
+
+    def handle(self, query: str, ctx: ChatContext):
+        messages = self.chatbot.construct_messages(ctx.message_history, ctx.context)
         response = self.chatbot.model.invoke(messages)
-        self.chatbot.message_history.append(response.content)
+        metrics.record_usage("response", response)
+        ctx.add_message("ai", response.content)
+        return "idle"
+
+    def stream(self, query: str, ctx: ChatContext):
+        """Yield tokens as the model produces them; record the full answer once done."""
+        messages = self.chatbot.construct_messages(ctx.message_history, ctx.context)
+        parts = []
+        for chunk in self.chatbot.model.stream(messages):
+            metrics.record_usage("response", chunk)  # Usage arrives on the last chunk, if the model reports it
+            if chunk.content:
+                parts.append(chunk.content)
+                yield chunk.content
+        ctx.add_message("ai", "".join(parts))
+        return "idle"
+
+    async def ahandle(self, query: str, ctx: ChatContext):
+        messages = self.chatbot.construct_messages(ctx.message_history, ctx.context)
+        response = await self.chatbot.model.ainvoke(messages)
+        metrics.record_usage("response", response)
+        ctx.add_message("ai", response.content)
         return "idle"
 
 class StateMachine:
-    def __init__(self, chatbot: "Chatbot"):
+    """Shared, stateless driver: the current state lives in the run call, not on the instance.
+
+    In speculative mode the vector search starts at the same time as the decision
+    state; its result is used if the decision asks for retrieval and discarded
+    otherwise, so only the slower of the two stays on the critical path.
+    """
+
+    def __init__(self, chatbot: "Chatbot", speculative: bool = None):
         self.chatbot = chatbot
         self.states = {
             "idle": IdleState(self.chatbot, "idle"),
             "user_input": UserInputState(self.chatbot, "user_input"),
             "decision": DecisionState(self.chatbot, "decision"),
             "vector_search": VectorSearchState(self.chatbot, "vector_search"),
+            "compress_context": ContextCompressionState(self.chatbot, "compress_context"),
             "response": ResponseState(self.chatbot, "response")
         }
-        self.current_state = self.states["idle"]
 
-    def run(self, query: str):
-        """Execute the current state and transition to the next state."""
+        if speculative is None:
+            speculative = os.getenv("SPECULATIVE_RETRIEVAL", "false").lower() == "true"
+        self.speculative = speculative
+        self._executor = None
+        self._lock = threading.Lock()
+        self.speculation = {"used": 0, "discarded": 0, "saved_ms": 0.0}
+
+    def run(self, query: str, ctx: ChatContext = None):
+        """Execute states from idle until the machine returns to idle. Safe to call concurrently."""
+        ctx = ctx or ChatContext(query)
+        start = time.perf_counter()
+
+        try:
+            current_state = self.states["idle"]
+            next_state_name = self.handle_state(current_state, query, ctx)
+            current_state = self.states.get(next_state_name)
+
+            while current_state.state_name != "idle":
+                next_state_name = self.handle_state(current_state, query, ctx)
+                current_state = self.states.get(next_state_name)
+        finally:
+            self.finish(ctx, start, "sync")
+
+        return ctx
+
+    async def arun(self, query: str, ctx: ChatContext = None):
+        """Async variant of run(): network-bound states await instead of blocking a thread."""
+        ctx = ctx or ChatContext(query)
+        start = time.perf_counter()
+
+        try:
+            current_state = self.states["idle"]
+            next_state_name = await self.ahandle_state(current_state, query, ctx)
+            current_state = self.states.get(next_state_name)
+
+            while current_state.state_name != "idle":
+                next_state_name = await self.ahandle_state(current_state, query, ctx)
+                current_state = self.states.get(next_state_name)
+        finally:
+            self.finish(ctx, start, "async")
+
+        return ctx
+
+    def stream(self, query: str, ctx: ChatContext = None):
+        """Like run(), but yields state-transition and token events as they happen."""
+        ctx = ctx or ChatContext(query)
+        start = time.perf_counter()
+
+        try:
+            current_state = self.states["idle"]
+            next_state_name = self.handle_state(current_state, query, ctx)
+            current_state = self.states.get(next_state_name)
+
+            while current_state.state_name != "idle":
+                if current_state.progress_message:
+                    yield {"event": "state", "state": current_state.state_name, "message": current_state.progress_message}
+
+                self.start_speculation(current_state, query, ctx)
+                state_start = time.perf_counter()
+                tokens = current_state.stream(query, ctx)
+                try:
+                    while True:
+                        try:
+                            token = next(tokens)
+                        except StopIteration as stop:
+                            next_state_name = stop.value
+                            break
+                        yield {"event": "token", "content": token}
+                except Exception as e:
+                    metrics.record_error(current_state.state_name, e)
+                    raise
+                finally:
+                    # Includes the time the client took to consume the tokens
+                    self.observe_state(current_state, ctx, state_start)
+
+                current_state = self.states.get(next_state_name)
+        finally:
+            self.finish(ctx, start, "stream")
+
+    def handle_state(self, state: State, query: str, ctx: ChatContext):
+        """Run one state, timing it and starting speculative work first."""
+        self.start_speculation(state, query, ctx)
+        state_start = time.perf_counter()
+        try:
+            return state.handle(query, ctx)
+        except Exception as e:
+            metrics.record_error(state.state_name, e)
+            raise
+        finally:
+            self.observe_state(state, ctx, state_start)
+
+    async def ahandle_state(self, state: State, query: str, ctx: ChatContext):
+        """Async variant of handle_state()."""
+        self.start_speculation(state, query, ctx, asynchronous=True)
+        state_start = time.perf_counter()
+        try:
+            return await state.ahandle(query, ctx)
+        except Exception as e:
+            metrics.record_error(state.state_name, e)
+            raise
+        finally:
+            self.observe_state(state, ctx, state_start)
+
+    def observe_state(self, state: State, ctx: ChatContext, start: float):
+        """Record the state's wall time on the request and in the state histogram."""
+        seconds = time.perf_counter() - start
+        ctx.timings[state.state_name] = ctx.timings.get(state.state_name, 0.0) + seconds * 1000
+        metrics.observe_state(state.state_name, seconds)
+        logger.debug(f"State {state.state_name} took {seconds * 1000:.1f} ms")
+
+    def start_speculation(self, state: State, query: str, ctx: ChatContext, asynchronous: bool = False):
+        """Kick off the vector search in the background when the decision state begins."""
+        if not self.speculative or state.state_name != "decision":
+            return
+
+        # The search returns its duration instead of writing it to ctx: a discarded search may still be
+        # running after the request finished, and must not touch the request's state
+        search_state = self.states["vector_search"]
+        if asynchronous:
+            async def search():
+                search_start = time.perf_counter()
+                documents, failed = await search_state.aretrieve(query)
+                return documents, failed, (time.perf_counter() - search_start) * 1000
+
+            ctx.speculative_search = asyncio.ensure_future(search())
+        else:
+            def search():
+                search_start = time.perf_counter()
+                documents, failed = search_state.retrieve(query)
+                return documents, failed, (time.perf_counter() - search_start) * 1000
+
+            ctx.speculative_search = self.get_executor().submit(search)
+
+    def finish(self, ctx: ChatContext, start: float, mode: str):
+        """Discard unused speculative work and record the wall-clock time of the run."""
+        ctx.record_timing("total", start)
+        metrics.observe_run(mode, ctx.timings["total"] / 1000)
+        speculative_search = ctx.speculative_search
 
-        next_state_name = self.current_state.handle(query)
-        self.current_state = self.states.get(next_state_name)
+        with self._lock:
+            if speculative_search is not None:
+                speculative_search.cancel()  # Result is ignored even if it is already running
+                ctx.speculative_search = None
+                self.speculation["discarded"] += 1
+            elif "speculative_search" in ctx.timings:
+                # Time spent searching minus time the vector search state actually waited for it
+                saved = ctx.timings["speculative_search"] - ctx.timings.get("vector_search", 0.0)
+                ctx.timings["speculation_saved"] = saved
+                self.speculation["used"] += 1
+                self.speculation["saved_ms"] += saved
 
-        while self.current_state.state_name != "idle":
-            next_state_name = self.current_state.handle(query)
-            self.current_state = self.states.get(next_state_name)
-            # return self.current_state
\ No newline at end of file
+    def get_executor(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    workers = int(os.getenv("SPECULATIVE_WORKERS", 8))
+                    self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="speculative-search")
+        return self._executor
@@ -0,0 +1,282 @@
+"""
+PROCESS-WIDE CLIENT REGISTRY
+- ONE POOLED MONGO CLIENT (SYNC, AND ASYNC PER EVENT LOOP) PER URI AND POOL SETTINGS
+- ONE EMBEDDINGS / CHAT CLIENT PER CONFIGURATION, ALL ON SHARED HTTP CONNECTION POOLS
+- TUNABLE POOL SIZES (MONGO_MAX_POOL_SIZE, HTTP_MAX_CONNECTIONS, ...)
+- POOL UTILIZATION METRICS
+"""
+import os
+import asyncio
+import logging
+import threading
+from urllib.parse import urlparse
+from weakref import WeakKeyDictionary
+
+import httpx
+from pymongo import AsyncMongoClient
+from pymongo.mongo_client import MongoClient
+from pymongo.monitoring import ConnectionPoolListener
+from pymongo.server_api import ServerApi
+
+logger = logging.getLogger(__name__)
+
+
+class MongoPoolMetrics(ConnectionPoolListener):
+    """Connection pool events of one Mongo client, as counters."""
+
+    def __init__(self, max_pool_size: int):
+        self.max_pool_size = max_pool_size
+        self._lock = threading.Lock()
+        self.open = 0
+        self.in_use = 0
+        self.peak_in_use = 0
+        self.created = 0
+        self.checkouts = 0
+        self.checkout_failures = 0
+        self.checkout_wait_ms = 0.0
+
+    def connection_created(self, event):
+        with self._lock:
+            self.open += 1
+            self.created += 1
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.open -= 1
+
+    def connection_checked_out(self, event):
+        with self._lock:
+            self.in_use += 1
+            self.peak_in_use = max(self.peak_in_use, self.in_use)
+            self.checkouts += 1
+            self.checkout_wait_ms += (event.duration or 0.0) * 1000
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.in_use -= 1
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self.checkout_failures += 1
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def stats(self):
+        with self._lock:
+            return {
+                "open_connections": self.open,
+                "in_use": self.in_use,
+                "peak_in_use": self.peak_in_use,
+                "max_pool_size": self.max_pool_size,
+                "utilization": self.in_use / self.max_pool_size if self.max_pool_size else 0.0,
+                "connections_created": self.created,
+                "checkouts": self.checkouts,
+                "checkout_failures": self.checkout_failures,
+                "avg_checkout_wait_ms": round(self.checkout_wait_ms / self.checkouts, 3) if self.checkouts else 0.0,
+            }
+
+
+class HttpPoolMetrics:
+    """Request counters of the shared HTTP pools; a request is in flight until its response headers arrive."""
+
+    def __init__(self, max_connections: int):
+        self.max_connections = max_connections
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.requests = 0
+        self.errors = 0
+
+    def started(self):
+        with self._lock:
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            self.requests += 1
+
+    def finished(self, failed: bool = False):
+        with self._lock:
+            self.in_flight -= 1
+            self.errors += failed
+
+    def stats(self, *transports):
+        open_connections = sum(len(getattr(getattr(transport, "_pool", None), "connections", []))
+                               for transport in transports)
+        with self._lock:
+            return {
+                "open_connections": open_connections,
+                "in_flight": self.in_flight,
+                "peak_in_flight": self.peak_in_flight,
+                "max_connections": self.max_connections,
+                "utilization": self.in_flight / self.max_connections if self.max_connections else 0.0,
+                "requests": self.requests,
+                "errors": self.errors,
+            }
+
+
+class MeteredTransport(httpx.HTTPTransport):
+    def __init__(self, metrics: HttpPoolMetrics, **kwargs):
+        super().__init__(**kwargs)
+        self.metrics = metrics
+
+    def handle_request(self, request):
+        self.metrics.started()
+        try:
+            response = super().handle_request(request)
+        except Exception:
+            self.metrics.finished(failed=True)
+            raise
+        self.metrics.finished()
+        return response
+
+
+class AsyncMeteredTransport(httpx.AsyncHTTPTransport):
+    def __init__(self, metrics: HttpPoolMetrics, **kwargs):
+        super().__init__(**kwargs)
+        self.metrics = metrics
+
+    async def handle_async_request(self, request):
+        self.metrics.started()
+        try:
+            response = await super().handle_async_request(request)
+        except Exception:
+            self.metrics.finished(failed=True)
+            raise
+        self.metrics.finished()
+        return response
+
+
+class ClientRegistry:
+    def __init__(self):
+        """Clients are created on first request and then shared by every controller in the process."""
+        self.mongo_max_pool_size = int(os.getenv("MONGO_MAX_POOL_SIZE", 100))
+        self.mongo_min_pool_size = int(os.getenv("MONGO_MIN_POOL_SIZE", 0))
+        self.http_max_connections = int(os.getenv("HTTP_MAX_CONNECTIONS", 100))
+        self.http_max_keepalive = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", 20))
+        self.http_timeout = float(os.getenv("HTTP_TIMEOUT_SECONDS", 60))
+
+        self._lock = threading.Lock()
+        self._mongo = {}  # (uri, max pool, min pool) -> (client, metrics)
+        # event loop -> {(uri, max pool, min pool) -> (client, metrics)}; forgotten with the loop
+        self._async_mongo = WeakKeyDictionary()
+        self._embeddings = {}
+        self._chat_models = {}
+        self._http_client = None
+        self._http_async_client = None
+        self.http_metrics = HttpPoolMetrics(self.http_max_connections)
+
+    def mongo_client(self, uri: str = None, max_pool_size: int = None, min_pool_size: int = None) -> MongoClient:
+        """The shared MongoClient for a URI (MONGODB_URI by default) and pool settings."""
+        key = self._mongo_key(uri, max_pool_size, min_pool_size)
+        with self._lock:
+            if key not in self._mongo:
+                metrics = MongoPoolMetrics(key[1])
+                client = MongoClient(key[0], server_api=ServerApi('1'), maxPoolSize=key[1], minPoolSize=key[2],
+                                     event_listeners=[metrics])
+                self._mongo[key] = (client, metrics)
+                logger.info(f"Mongo client created for {self._host(key[0])} (pool {key[2]}-{key[1]}).")
+            return self._mongo[key][0]
+
+    def async_mongo_client(self, uri: str = None, max_pool_size: int = None,
+                           min_pool_size: int = None) -> AsyncMongoClient:
+        """The shared AsyncMongoClient of the running event loop (async clients are bound to their loop)."""
+        key = self._mongo_key(uri, max_pool_size, min_pool_size)
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            loop_clients = self._async_mongo.setdefault(loop, {})
+            if key not in loop_clients:
+                metrics = MongoPoolMetrics(key[1])
+                client = AsyncMongoClient(key[0], server_api=ServerApi('1'), maxPoolSize=key[1], minPoolSize=key[2],
+                                          event_listeners=[metrics])
+                loop_clients[key] = (client, metrics)
+            return loop_clients[key][0]
+
+    async def aclose(self):
+        """Close the async Mongo clients of the running event loop (call before the loop stops)."""
+        with self._lock:
+            loop_clients = self._async_mongo.pop(asyncio.get_running_loop(), {})
+        for client, _ in loop_clients.values():
+            await client.close()
+        if loop_clients:
+            logger.info(f"Closed {len(loop_clients)} async Mongo clients.")
+
+    def embeddings(self, **config):
+        """The shared AzureOpenAIEmbeddings for a configuration (keyword arguments of the constructor)."""
+        from langchain_openai import AzureOpenAIEmbeddings  # slow import, deferred until a client is needed
+        return self._model(self._embeddings, AzureOpenAIEmbeddings, config)
+
+    def chat_model(self, **config):
+        """The shared AzureChatOpenAI for a configuration (keyword arguments of the constructor)."""
+        from langchain_openai import AzureChatOpenAI
+        return self._model(self._chat_models, AzureChatOpenAI, config)
+
+    def _model(self, models: dict, model_class, config: dict):
+        key = tuple(sorted(config.items()))
+        with self._lock:
+            if key not in models:
+                models[key] = model_class(http_client=self.http_client(), http_async_client=self.http_async_client(),
+                                          **config)
+            return models[key]
+
+    def http_client(self) -> httpx.Client:
+        """Keep-alive HTTP pool shared by all Azure OpenAI clients (call with the lock held)."""
+        if self._http_client is None:
+            transport = MeteredTransport(self.http_metrics, limits=self._http_limits())
+            self._http_client = httpx.Client(transport=transport, timeout=self.http_timeout)
+        return self._http_client
+
+    def http_async_client(self) -> httpx.AsyncClient:
+        if self._http_async_client is None:
+            transport = AsyncMeteredTransport(self.http_metrics, limits=self._http_limits())
+            self._http_async_client = httpx.AsyncClient(transport=transport, timeout=self.http_timeout)
+        return self._http_async_client
+
+    def _http_limits(self):
+        return httpx.Limits(max_connections=self.http_max_connections,
+                            max_keepalive_connections=self.http_max_keepalive)
+
+    def _mongo_key(self, uri, max_pool_size, min_pool_size):
+        return (uri or os.getenv("MONGODB_URI"), max_pool_size or self.mongo_max_pool_size,
+                min_pool_size if min_pool_size is not None else self.mongo_min_pool_size)
+
+    @staticmethod
+    def _host(uri: str):
+        """Host part of a Mongo URI, without credentials."""
+        return urlparse(uri or "").hostname or "default"
+
+    def stats(self):
+        """Client counts and pool utilization of every shared client."""
+        with self._lock:
+            mongo = {f"{self._host(key[0])}#{i}": metrics.stats()
+                     for i, (key, (_, metrics)) in enumerate(self._mongo.items())}
+            async_clients = [(key, metrics) for loop_clients in self._async_mongo.values()
+                             for key, (_, metrics) in loop_clients.items()]
+            async_mongo = {f"{self._host(key[0])}#{i}": metrics.stats()
+                           for i, (key, metrics) in enumerate(async_clients)}
+            transports = [client._transport for client in (self._http_client, self._http_async_client) if client]
+            return {
+                "mongo": mongo,
+                "async_mongo": async_mongo,
+                "http": self.http_metrics.stats(*transports),
+                "embeddings_clients": len(self._embeddings),
+                "chat_clients": len(self._chat_models),
+            }
+
+
+# Process-wide instance used by the controllers
+clients = ClientRegistry()
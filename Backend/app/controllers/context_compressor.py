@@ -0,0 +1,145 @@
+"""
+CONTEXT COMPRESSION BETWEEN RETRIEVAL AND RESPONSE
+- CHUNKS ARE SPLIT INTO SENTENCES (LONG UNPUNCTUATED RUNS, E.G. NAVIGATION, INTO WORD WINDOWS)
+- SENTENCES ARE SCORED AGAINST THE QUERY: BM25 ("lexical") OR CACHED EMBEDDINGS ("embedding")
+- THE BEST SENTENCES ARE KEPT UP TO A TOKEN BUDGET, ADJACENT ONES MERGED BACK INTO SPANS
+- METADATA IS STRIPPED DOWN TO A WHITELIST OF FIELDS
+"""
+import os
+import re
+import logging
+from typing import List
+
+import numpy as np
+from langchain_core.documents import Document
+
+from .embedding_cache import CachedEmbeddings
+from .lexical_index import BM25Index
+from .token_counter import count_tokens
+
+logger = logging.getLogger(__name__)
+
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])\s+|\n+")
+SPAN_SEPARATOR = " … "
+
+
+class ContextCompressor:
+    def __init__(self, embeddings: CachedEmbeddings = None, mode: str = None, token_budget: int = None,
+                 metadata_fields: List[str] = None, max_sentence_words: int = None):
+        """Compress retrieved chunks for the prompt; defaults come from environment variables.
+
+        mode is "lexical", "embedding" (needs embeddings, the query embedding cache) or "none".
+        """
+        self.mode = mode or os.getenv("CONTEXT_COMPRESSION", "lexical")
+        if self.mode not in ("lexical", "embedding", "none"):
+            raise ValueError(f"Unsupported context compression: {self.mode}")
+        if self.mode == "embedding" and embeddings is None:
+            raise ValueError("Embedding context compression needs the query embeddings.")
+        self.token_budget = token_budget or int(os.getenv("CONTEXT_TOKEN_BUDGET", 600))
+        if metadata_fields is None:
+            metadata_fields = [field.strip() for field in os.getenv("CONTEXT_METADATA_FIELDS", "source,title").split(",")]
+        self.metadata_fields = [field for field in metadata_fields if field]
+        self.max_sentence_words = max_sentence_words or int(os.getenv("CONTEXT_MAX_SENTENCE_WORDS", 40))
+
+        self.query_embeddings = embeddings
+        self.sentence_embeddings = None
+        if self.mode == "embedding":
+            # Chunk sentences recur across questions, so their vectors are cached too (own namespace)
+            self.sentence_embeddings = CachedEmbeddings(embeddings.embeddings, persist_path=embeddings.persist_path,
+                                                        namespace=f"{embeddings.namespace}:sentences")
+
+    def compress(self, query: str, docs: List[Document]) -> List[Document]:
+        """Keep the sentences of the retrieved chunks that best match the query."""
+        if self.mode == "none" or not docs:
+            return [self.strip_metadata(doc, doc.page_content) for doc in docs]
+        sentences = self.split(docs)
+        if self.mode == "embedding":
+            vectors = self.sentence_embeddings.embed_many([text for _, _, text in sentences])
+            scores = self.similarities(self.query_embeddings.embed_query(query), vectors)
+        else:
+            scores = self.lexical_scores(query, sentences)
+        return self.assemble(docs, sentences, scores)
+
+    async def acompress(self, query: str, docs: List[Document]) -> List[Document]:
+        """Async variant of compress() (only the embedding mode waits on the network)."""
+        if self.mode != "embedding" or not docs:
+            return self.compress(query, docs)
+        sentences = self.split(docs)
+        vectors = await self.sentence_embeddings.aembed_many([text for _, _, text in sentences])
+        scores = self.similarities(await self.query_embeddings.aembed_query(query), vectors)
+        return self.assemble(docs, sentences, scores)
+
+    def split(self, docs: List[Document]):
+        """(doc index, position, text) for every sentence of the chunks."""
+        sentences = []
+        for doc_index, doc in enumerate(docs):
+            position = 0
+            for sentence in SENTENCE_BOUNDARY.split(doc.page_content):
+                words = sentence.split()
+                for start in range(0, len(words), self.max_sentence_words):
+                    sentences.append((doc_index, position, " ".join(words[start:start + self.max_sentence_words])))
+                    position += 1
+        return sentences
+
+    @staticmethod
+    def lexical_scores(query: str, sentences: list) -> np.ndarray:
+        """BM25 score of every sentence, the sentences being the collection."""
+        index = BM25Index()
+        index.build([{"text": text, "row": row} for row, (_, _, text) in enumerate(sentences)])
+        scores = np.zeros(len(sentences), dtype=np.float32)
+        for record, score in index.search(query, len(sentences)):
+            scores[record["row"]] = score
+        return scores
+
+    @staticmethod
+    def similarities(query_vector: List[float], vectors: List[List[float]]) -> np.ndarray:
+        if not vectors:
+            return np.zeros(0, dtype=np.float32)
+        matrix = np.asarray(vectors, dtype=np.float32)
+        query = np.asarray(query_vector, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1) * (np.linalg.norm(query) or 1.0)
+        return matrix @ query / np.where(norms, norms, 1.0)
+
+    def assemble(self, docs: List[Document], sentences: list, scores: np.ndarray) -> List[Document]:
+        """Take sentences best first until the budget is spent, then rebuild each chunk from its kept spans.
+
+        Sentences sharing nothing with the query (lexical score 0) are never kept; if no sentence
+        matches at all, the chunks are kept from the top, in order, until the budget is spent.
+        """
+        if not (scores > 0).any():
+            order = range(len(sentences))
+        else:
+            # Best score first; ties go to the better ranked chunk, then to the earlier sentence
+            order = [i for i in sorted(range(len(sentences)), key=lambda i: (-scores[i], sentences[i][:2]))
+                     if scores[i] > 0]
+
+        kept, tokens = set(), 0
+        for i in order:
+            sentence_tokens = count_tokens(sentences[i][2])
+            if tokens + sentence_tokens > self.token_budget:
+                continue
+            kept.add(i)
+            tokens += sentence_tokens
+
+        spans = [[] for _ in docs]
+        previous = None
+        for i, (doc_index, position, text) in enumerate(sentences):
+            if i not in kept:
+                continue
+            if previous is not None and previous == (doc_index, position - 1):
+                spans[doc_index][-1].append(text)
+            else:
+                spans[doc_index].append([text])
+            previous = (doc_index, position)
+
+        compressed = [
+            self.strip_metadata(doc, SPAN_SEPARATOR.join(" ".join(span) for span in doc_spans))
+            for doc, doc_spans in zip(docs, spans) if doc_spans
+        ]
+        logger.info(f"Context compressed to {tokens} tokens: {len(kept)} of {len(sentences)} sentences, "
+                    f"{len(compressed)} of {len(docs)} chunks.")
+        return compressed
+
+    def strip_metadata(self, doc: Document, text: str) -> Document:
+        return Document(page_content=text,
+                        metadata={field: doc.metadata[field] for field in self.metadata_fields if field in doc.metadata})
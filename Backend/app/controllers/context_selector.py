@@ -0,0 +1,112 @@
+"""
+SELECTION OF THE RETRIEVED CHUNKS THAT GO INTO THE PROMPT
+- MINIMUM RELEVANCE CUTOFF ON THE VECTOR SCORE
+- MAXIMAL MARGINAL RELEVANCE (MMR) SO NEAR-DUPLICATE CHUNKS DON'T CROWD OUT OTHER ONES
+- ADAPTIVE K: CHUNKS ARE ADDED UNTIL THE TOKEN BUDGET OR THE CHUNK LIMIT IS REACHED
+"""
+import os
+import re
+import logging
+from typing import List
+
+import numpy as np
+from langchain_core.documents import Document
+
+from .token_counter import count_tokens
+
+logger = logging.getLogger(__name__)
+
+
+class ContextSelector:
+    def __init__(self, min_score=None, mmr=None, mmr_lambda=None, duplicate_similarity=None, fetch_k=None,
+                 max_chunks=None, token_budget=None):
+        """Select context chunks among fetch_k scored candidates; defaults come from environment variables.
+
+        min_score is on the vector score scale, (1 + cosine) / 2. mmr_lambda weighs relevance
+        against novelty (1.0 is plain relevance order); with MMR, chunks at least duplicate_similarity
+        similar to a chosen one are dropped.
+        """
+        self.min_score = min_score if min_score is not None else float(os.getenv("RETRIEVAL_MIN_SCORE", 0.82))
+        self.mmr = mmr if mmr is not None else os.getenv("RETRIEVAL_MMR", "true").lower() == "true"
+        self.mmr_lambda = mmr_lambda if mmr_lambda is not None else float(os.getenv("RETRIEVAL_MMR_LAMBDA", 0.7))
+        self.duplicate_similarity = duplicate_similarity or float(os.getenv("RETRIEVAL_DUPLICATE_SIMILARITY", 0.97))
+        self.fetch_k = fetch_k or int(os.getenv("RETRIEVAL_FETCH_K", 12))
+        self.max_chunks = max_chunks or int(os.getenv("RETRIEVAL_MAX_CHUNKS", 6))
+        self.token_budget = token_budget or int(os.getenv("RETRIEVAL_TOKEN_BUDGET", 1200))
+
+    def select(self, docs: List[Document]) -> List[Document]:
+        """Pick the chunks for the prompt from search results (best first, optionally with embeddings).
+
+        The best chunk is always kept once it passes the cutoff; later ones only if they fit the budget.
+        """
+        vectors = [doc.metadata.pop("embedding", None) for doc in docs]
+        candidates = [(doc, vector) for doc, vector in zip(docs, vectors) if self.is_relevant(doc)]
+        order = self.mmr_order(candidates) if self.mmr and len(candidates) > 1 else range(len(candidates))
+
+        selected, tokens = [], 0
+        for i in order:
+            doc = candidates[i][0]
+            doc_tokens = count_tokens(doc.page_content)
+            if selected and tokens + doc_tokens > self.token_budget:
+                continue  # a shorter chunk further down may still fit
+            selected.append(doc)
+            tokens += doc_tokens
+            if len(selected) == self.max_chunks:
+                break
+        logger.info(f"Selected {len(selected)} of {len(docs)} retrieved chunks ({tokens} tokens).")
+        return selected
+
+    def is_relevant(self, doc: Document) -> bool:
+        """Cut off on the vector score; in hybrid search, chunks found by BM25 alone have none and stay."""
+        score = doc.metadata.get("vector_score", doc.metadata.get("score"))
+        return score is None or score >= self.min_score
+
+    def mmr_order(self, candidates: list) -> List[int]:
+        """Greedy MMR: repeatedly take the chunk maximizing lambda * relevance - (1 - lambda) * redundancy.
+
+        Relevance is the search score min-max scaled over the candidates to [0, 1], so it spans the same
+        range as redundancy (cosine similarity) whatever the score scale: vector scores ((1 + cosine) / 2)
+        all sit near 1 and would otherwise barely count. Redundancy is the highest similarity to an
+        already chosen chunk. Near-duplicates are left out.
+        """
+        scores = np.array([doc.metadata.get("score") or 0.0 for doc, _ in candidates], dtype=np.float32)
+        spread = scores.max() - scores.min()
+        relevance = (scores - scores.min()) / spread if spread else np.ones_like(scores)
+        similarity = self.similarity_matrix(candidates)
+
+        order = [int(np.argmax(relevance))]
+        redundancy = similarity[order[0]].copy()
+        remaining = np.ones(len(candidates), dtype=bool)
+        remaining[order[0]] = False
+        while remaining.any():
+            marginal = self.mmr_lambda * relevance - (1 - self.mmr_lambda) * redundancy
+            best = int(np.argmax(np.where(remaining, marginal, -np.inf)))
+            remaining[best] = False
+            if redundancy[best] >= self.duplicate_similarity:
+                continue
+            order.append(best)
+            redundancy = np.maximum(redundancy, similarity[best])
+        return order
+
+    @staticmethod
+    def similarity_matrix(candidates: list) -> np.ndarray:
+        """Cosine similarity of the chunk embeddings; word overlap (Jaccard) for chunks without one."""
+        n = len(candidates)
+        similarity = np.zeros((n, n), dtype=np.float32)
+        embedded = [i for i, (_, vector) in enumerate(candidates) if vector is not None]
+        if embedded:
+            vectors = np.vstack([np.asarray(candidates[i][1], dtype=np.float32) for i in embedded])
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            vectors = vectors / np.where(norms, norms, 1.0)
+            similarity[np.ix_(embedded, embedded)] = vectors @ vectors.T
+
+        if len(embedded) < n:
+            words = [set(re.findall(r"\w+", doc.page_content.lower())) for doc, _ in candidates]
+            embedded = set(embedded)
+            for i in range(n):
+                for j in range(i + 1, n):
+                    if i in embedded and j in embedded:
+                        continue
+                    union = len(words[i] | words[j])
+                    similarity[i, j] = similarity[j, i] = len(words[i] & words[j]) / union if union else 0.0
+        return similarity
@@ -0,0 +1,99 @@
+"""
+CONFIGURABLE EMBEDDING DIMENSIONALITY
+- TRUNCATE: KEEP THE FIRST N COMPONENTS AND RENORMALIZE (MATRYOSHKA-STYLE, text-embedding-3 MODELS)
+- PCA: FITTED PROJECTION ONTO THE TOP N PRINCIPAL COMPONENTS, SAVED TO DISK
+- THE SAME REDUCTION IS APPLIED TO CHUNKS AT INGEST AND TO QUERIES
+"""
+import os
+import logging
+from typing import List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DIMENSIONS = 1536  # text-embedding-ada-002 / text-embedding-3-small
+
+
+class DimensionReducer:
+    def __init__(self, dimensions: int = None, method: str = None, model_path: str = None):
+        """Reduce vectors to dimensions components; defaults come from environment variables."""
+        self.dimensions = dimensions or int(os.getenv("EMBEDDING_DIMENSIONS", DEFAULT_DIMENSIONS))
+        self.method = method or os.getenv("DIMENSION_REDUCTION", "truncate")
+        if self.method not in ("truncate", "pca"):
+            raise ValueError(f"Unsupported dimension reduction: {self.method}")
+        self.model_path = model_path or os.getenv("PCA_MODEL_PATH", "pca_projection.npz")
+        self.mean = None
+        self.components = None  # (dimensions, full dimensions)
+        if self.method == "pca" and os.path.exists(self.model_path):
+            self.load()
+
+    def cache_namespace(self, model_name: str) -> str:
+        """Query embedding cache namespace: reduced vectors must not mix with full-size ones."""
+        if self.dimensions == DEFAULT_DIMENSIONS:
+            return model_name
+        return f"{model_name}:{self.method}{self.dimensions}"
+
+    def reduce(self, vectors) -> np.ndarray:
+        """Reduce a batch of vectors to unit-length rows of self.dimensions components.
+
+        Vectors that already have the target size (e.g. reused ones) pass through unchanged.
+        """
+        vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        if vectors.shape[1] == self.dimensions:
+            return vectors
+        if vectors.shape[1] < self.dimensions:
+            raise ValueError(f"Cannot reduce {vectors.shape[1]}-dimensional vectors to {self.dimensions}.")
+
+        if self.method == "truncate":
+            reduced = vectors[:, :self.dimensions]
+        else:
+            if self.components is None:
+                raise RuntimeError(f"PCA projection not fitted; fit it first or provide {self.model_path}.")
+            reduced = (vectors - self.mean) @ self.components.T
+        norms = np.linalg.norm(reduced, axis=1, keepdims=True)
+        return reduced / np.where(norms, norms, 1.0)
+
+    def fit(self, vectors):
+        """Fit the PCA projection on a sample of full-size embeddings and save it."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if len(vectors) < self.dimensions:
+            raise ValueError(f"PCA to {self.dimensions} dimensions needs at least {self.dimensions} sample vectors.")
+        self.mean = vectors.mean(axis=0)
+        _, singular_values, components = np.linalg.svd(vectors - self.mean, full_matrices=False)
+        self.components = components[:self.dimensions].astype(np.float32)
+        explained = (singular_values[:self.dimensions] ** 2).sum() / (singular_values ** 2).sum()
+        logger.info(f"PCA projection fitted on {len(vectors)} vectors, {explained:.1%} of variance kept.")
+        self.save()
+        return explained
+
+    def save(self):
+        np.savez(self.model_path, mean=self.mean, components=self.components)
+
+    def load(self):
+        with np.load(self.model_path) as model:
+            self.mean, self.components = model["mean"], model["components"]
+        if self.components.shape[0] != self.dimensions:
+            raise ValueError(f"{self.model_path} projects to {self.components.shape[0]} dimensions, "
+                             f"not {self.dimensions}.")
+
+
+class ReducedEmbeddings(Embeddings):
+    """Embeddings wrapper returning reduced vectors, for queries and anything embedded through it."""
+
+    def __init__(self, embeddings: Embeddings, reducer: DimensionReducer):
+        self.embeddings = embeddings
+        self.reducer = reducer
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.reducer.reduce(self.embeddings.embed_documents(texts)).tolist() if texts else []
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.reducer.reduce(self.embeddings.embed_query(text))[0].tolist()
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.reducer.reduce(await self.embeddings.aembed_documents(texts)).tolist() if texts else []
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return self.reducer.reduce(await self.embeddings.aembed_query(text))[0].tolist()
@@ -0,0 +1,121 @@
+"""
+BATCHED EMBEDDING FOR INGESTION
+- GROUPS CHUNKS FROM MANY DOCUMENTS INTO TOKEN-BOUNDED BATCHES
+- RUNS SEVERAL BATCHES CONCURRENTLY UNDER REQUEST/TOKEN RATE LIMITS
+- REPORTS CHUNKS PER SECOND
+"""
+import os
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+from langchain_core.embeddings import Embeddings
+
+from .token_counter import count_tokens
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """Token bucket over one minute for both requests and tokens. A limit of 0 disables it."""
+
+    def __init__(self, requests_per_minute: int = 0, tokens_per_minute: int = 0):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._requests = float(requests_per_minute)
+        self._tokens = float(tokens_per_minute)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: int):
+        """Block until one request with this many tokens fits in the limits."""
+        while True:
+            with self._lock:
+                self._refill()
+                # A batch larger than the whole per-minute budget waits for a full bucket instead of forever
+                tokens_needed = min(tokens, self.tokens_per_minute) if self.tokens_per_minute else 0
+                if (not self.requests_per_minute or self._requests >= 1) and self._tokens >= tokens_needed:
+                    if self.requests_per_minute:
+                        self._requests -= 1
+                    if self.tokens_per_minute:
+                        self._tokens -= tokens_needed
+                    return
+                wait = self._wait_time(tokens_needed)
+            time.sleep(wait)
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._updated
+        self._updated = now
+        if self.requests_per_minute:
+            self._requests = min(self.requests_per_minute, self._requests + elapsed * self.requests_per_minute / 60)
+        if self.tokens_per_minute:
+            self._tokens = min(self.tokens_per_minute, self._tokens + elapsed * self.tokens_per_minute / 60)
+
+    def _wait_time(self, tokens: int):
+        wait = 0.05
+        if self.requests_per_minute and self._requests < 1:
+            wait = max(wait, (1 - self._requests) * 60 / self.requests_per_minute)
+        if self.tokens_per_minute and self._tokens < tokens:
+            wait = max(wait, (tokens - self._tokens) * 60 / self.tokens_per_minute)
+        return wait
+
+
+class BatchEmbedder:
+    def __init__(self, embeddings: Embeddings, max_batch_tokens=None, max_batch_size=None, concurrency=None,
+                 requests_per_minute=None, tokens_per_minute=None):
+        """Embed many texts with few, concurrent, rate-limited requests. Limits default to environment variables."""
+        self.embeddings = embeddings
+        self.max_batch_tokens = max_batch_tokens or int(os.getenv("EMBEDDING_BATCH_TOKENS", 8000))
+        self.max_batch_size = max_batch_size or int(os.getenv("EMBEDDING_BATCH_SIZE", 256))
+        self.concurrency = concurrency or int(os.getenv("EMBEDDING_CONCURRENCY", 4))
+        self.rate_limiter = RateLimiter(
+            requests_per_minute if requests_per_minute is not None else int(os.getenv("EMBEDDING_RPM", 0)),
+            tokens_per_minute if tokens_per_minute is not None else int(os.getenv("EMBEDDING_TPM", 0)),
+        )
+        self.last_run = {}
+
+    def make_batches(self, texts: List[str]):
+        """Split text indexes into batches bounded by token count and batch size."""
+        batches, batch, batch_tokens = [], [], 0
+        for i, text in enumerate(texts):
+            tokens = count_tokens(text)
+            if batch and (batch_tokens + tokens > self.max_batch_tokens or len(batch) >= self.max_batch_size):
+                batches.append((batch, batch_tokens))
+                batch, batch_tokens = [], 0
+            batch.append(i)
+            batch_tokens += tokens
+        if batch:
+            batches.append((batch, batch_tokens))
+        return batches
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        """Embed all texts, returning vectors in the same order."""
+        if not texts:
+            return []
+
+        start = time.perf_counter()
+        batches = self.make_batches(texts)
+        vectors: List[List[float]] = [None] * len(texts)
+
+        def embed_batch(batch):
+            indexes, tokens = batch
+            self.rate_limiter.acquire(tokens)
+            for i, vector in zip(indexes, self.embeddings.embed_documents([texts[i] for i in indexes])):
+                vectors[i] = vector
+
+        with ThreadPoolExecutor(max_workers=min(self.concurrency, len(batches))) as pool:
+            list(pool.map(embed_batch, batches))  # list() re-raises the first failure
+
+        elapsed = time.perf_counter() - start
+        self.last_run = {
+            "chunks": len(texts),
+            "batches": len(batches),
+            "seconds": elapsed,
+            "chunks_per_sec": len(texts) / elapsed if elapsed else 0.0,
+        }
+        logger.info(f"Embedded {len(texts)} chunks in {len(batches)} batches "
+                    f"({self.last_run['chunks_per_sec']:.1f} chunks/sec).")
+        return vectors
@@ -0,0 +1,153 @@
+"""
+QUERY EMBEDDING CACHE
+- NORMALIZED QUERY -> EMBEDDING, IN-MEMORY LRU
+- OPTIONAL PERSISTENT SQLITE TIER (SURVIVES RESTARTS, SHARED BY PROCESSES)
+- HIT-RATE METRICS
+"""
+import os
+import re
+import sqlite3
+import logging
+import threading
+from array import array
+from collections import OrderedDict
+from typing import List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_query(text: str) -> str:
+    """Lowercase, collapse whitespace and drop trailing punctuation."""
+    return re.sub(r"\s+", " ", text).strip().rstrip("?!. ").lower()
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper that caches query embeddings; document embeddings pass through."""
+
+    def __init__(self, embeddings: Embeddings, max_entries: int = None, persist_path: Optional[str] = None,
+                 namespace: str = None):
+        self.embeddings = embeddings
+        self.max_entries = max_entries or int(os.getenv("EMBEDDING_CACHE_SIZE", 2048))
+        self.persist_path = persist_path or os.getenv("EMBEDDING_CACHE_PATH")
+        # Vectors from different models must never be mixed up
+        self.namespace = namespace or getattr(embeddings, "deployment", None) or getattr(embeddings, "model", None) or "default"
+
+        self._memory: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+
+        self._db = None
+        if self.persist_path:
+            self._db = sqlite3.connect(self.persist_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS query_embeddings ("
+                "namespace TEXT, query TEXT, vector BLOB, PRIMARY KEY (namespace, query))"
+            )
+            self._db.commit()
+
+    def embed_query(self, text: str) -> List[float]:
+        key = normalize_query(text)
+        vector = self.lookup(key)
+        if vector is None:
+            vector = self.embeddings.embed_query(text)
+            self.store(key, vector)
+        return vector
+
+    async def aembed_query(self, text: str) -> List[float]:
+        key = normalize_query(text)
+        vector = self.lookup(key)
+        if vector is None:
+            vector = await self.embeddings.aembed_query(text)
+            self.store(key, vector)
+        return vector
+
+    def embed_many(self, texts: List[str]) -> List[List[float]]:
+        """Embed several short texts through the cache, with one API call for all the misses."""
+        keys = [normalize_query(text) for text in texts]
+        vectors = [self.lookup(key) for key in keys]
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            for i, vector in zip(missing, self.embeddings.embed_documents([texts[i] for i in missing])):
+                self.store(keys[i], vector)
+                vectors[i] = vector
+        return vectors
+
+    async def aembed_many(self, texts: List[str]) -> List[List[float]]:
+        keys = [normalize_query(text) for text in texts]
+        vectors = [self.lookup(key) for key in keys]
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            for i, vector in zip(missing, await self.embeddings.aembed_documents([texts[i] for i in missing])):
+                self.store(keys[i], vector)
+                vectors[i] = vector
+        return vectors
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await self.embeddings.aembed_documents(texts)
+
+    def lookup(self, key: str) -> Optional[List[float]]:
+        """Return the cached embedding of a normalized query, checking memory then disk."""
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+                self.counters["memory_hits"] += 1
+                return vector
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT vector FROM query_embeddings WHERE namespace = ? AND query = ?", (self.namespace, key)
+                ).fetchone()
+                if row is not None:
+                    vector = array("f", row[0]).tolist()
+                    self._remember(key, vector)
+                    self.counters["disk_hits"] += 1
+                    return vector
+
+            self.counters["misses"] += 1
+            return None
+
+    def store(self, key: str, vector: List[float]):
+        with self._lock:
+            self._remember(key, vector)
+            if self._db is not None:
+                try:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO query_embeddings (namespace, query, vector) VALUES (?, ?, ?)",
+                        (self.namespace, key, array("f", vector).tobytes()),
+                    )
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    logger.warning(f"Could not persist query embedding: {e}")
+
+    def _remember(self, key: str, vector: List[float]):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def clear(self):
+        """Forget all cached query embeddings of this namespace (e.g. after the embedding changed)."""
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM query_embeddings WHERE namespace = ?", (self.namespace,))
+                self._db.commit()
+
+    def stats(self):
+        """Return hit/miss counters and the hit rate."""
+        with self._lock:
+            lookups = sum(self.counters.values())
+            hits = self.counters["memory_hits"] + self.counters["disk_hits"]
+            return {
+                **self.counters,
+                "entries": len(self._memory),
+                "max_entries": self.max_entries,
+                "persistent": self._db is not None,
+                "hit_rate": hits / lookups if lookups else 0.0,
+            }
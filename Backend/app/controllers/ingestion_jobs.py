@@ -0,0 +1,267 @@
+"""
+BACKGROUND INGESTION JOBS
+- THE ADD ENDPOINT ENQUEUES A JOB AND RETURNS ITS ID AT ONCE
+- A BOUNDED POOL OF JOB WORKERS RUNS THE INGESTION PIPELINE
+- JOBS AND PER-SOURCE PROGRESS ARE KEPT IN SQLITE: UNFINISHED JOBS RESUME AFTER A RESTART
+- SEVERAL PROCESSES MAY SHARE THE TABLE: A JOB IS CLAIMED ATOMICALLY AND HELD BY A HEARTBEAT LEASE,
+  ONLY JOBS WHOSE LEASE EXPIRED (THEIR PROCESS DIED) ARE TAKEN OVER
+- QUEUED JOBS ARE CANCELLED AT ONCE, RUNNING ONES AT THE NEXT PIPELINE STAGE
+"""
+import os
+import json
+import time
+import uuid
+import socket
+import sqlite3
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Callable, List
+
+logger = logging.getLogger(__name__)
+
+FINAL_STATUSES = ("completed", "partial", "failed", "cancelled")
+
+
+class IngestionJobs:
+    def __init__(self, vector_store: Callable, path: str = None, workers: int = None):
+        """vector_store() returns the VectorStoreController to ingest into (called when a job starts)."""
+        self.vector_store = vector_store
+        self.path = path or os.getenv("INGEST_JOBS_PATH", "ingestion_jobs.sqlite3")
+        # Few job workers: each job already runs a multi-threaded pipeline, chat requests come first
+        self.workers = workers or int(os.getenv("INGEST_JOB_WORKERS", 1))
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="ingestion-job")
+        self._cancel_events = {}  # job id -> Event, for running jobs
+        self._lock = threading.Lock()
+        # Running jobs are refreshed every lease_seconds / 3; a lease that is not refreshed expires
+        self.lease_seconds = float(os.getenv("INGEST_JOB_LEASE_SECONDS", 60))
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._closed = threading.Event()
+
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")  # progress updates without an fsync each
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, status TEXT, sources_type TEXT, tags TEXT, cancel_requested INTEGER DEFAULT 0, "
+            "created_at TEXT, started_at TEXT, finished_at TEXT, summary TEXT, error TEXT)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS job_sources ("
+            "job_id TEXT, position INTEGER, source TEXT, state TEXT, error TEXT, updated_at TEXT, "
+            "PRIMARY KEY (job_id, position))"
+        )
+        columns = {row["name"] for row in self._db.execute("PRAGMA table_info(jobs)")}
+        for column, kind in (("owner", "TEXT"), ("heartbeat_at", "REAL")):
+            if column not in columns:  # tables created before leases
+                self._db.execute(f"ALTER TABLE jobs ADD COLUMN {column} {kind}")
+        self._db.commit()
+        self.resume()
+        threading.Thread(target=self._keep_leases, name="ingestion-job-lease", daemon=True).start()
+
+    def submit(self, sources: List[str], sources_type: str, tags: List[str] = None) -> str:
+        """Queue an ingestion job and return its id."""
+        job_id = uuid.uuid4().hex
+        now = self.now()
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO jobs (id, status, sources_type, tags, created_at) VALUES (?, 'queued', ?, ?, ?)",
+                (job_id, sources_type, json.dumps(tags or []), now),
+            )
+            self._db.executemany(
+                "INSERT INTO job_sources (job_id, position, source, state, updated_at) VALUES (?, ?, ?, 'queued', ?)",
+                [(job_id, position, source, now) for position, source in enumerate(sources)],
+            )
+            self._db.commit()
+        self._executor.submit(self.run, job_id)
+        logger.info(f"Ingestion job {job_id} queued with {len(sources)} sources.")
+        return job_id
+
+    def resume(self, queued: bool = True):
+        """Queue the jobs left queued, and those left running by a process whose lease expired.
+
+        Jobs still leased by another live process are left alone; run() claims each job atomically,
+        so processes resuming at the same time never both run it.
+        """
+        statuses = "('queued', 'running')" if queued else "('running')"
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT id, status FROM jobs WHERE status IN {statuses} ORDER BY created_at"
+            ).fetchall()
+        rows = [row for row in rows if row["status"] == "queued" or self.claimable(row["id"])]
+        for row in rows:
+            self._executor.submit(self.run, row["id"])
+        if rows:
+            logger.info(f"Resuming {len(rows)} unfinished ingestion jobs.")
+
+    def claimable(self, job_id: str):
+        with self._lock:
+            return self._db.execute(
+                "SELECT 1 FROM jobs WHERE id = ? AND status = 'running' AND (heartbeat_at IS NULL OR heartbeat_at < ?)",
+                (job_id, time.time() - self.lease_seconds),
+            ).fetchone() is not None
+
+    def run(self, job_id: str):
+        """Worker: claim the job and ingest its sources that are not finished yet."""
+        with self._lock:
+            claimed = self._db.execute(
+                "UPDATE jobs SET status = 'running', owner = ?, heartbeat_at = ?, "
+                "started_at = COALESCE(started_at, ?) WHERE id = ? AND (status = 'queued' OR "
+                "(status = 'running' AND (heartbeat_at IS NULL OR heartbeat_at < ?)))",
+                (self.owner, time.time(), self.now(), job_id, time.time() - self.lease_seconds),
+            ).rowcount
+            self._db.commit()
+            if not claimed:
+                return  # finished, cancelled, or running in another process
+            job = self._db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            cancelled = bool(job["cancel_requested"])
+            if not cancelled:
+                cancel_event = self._cancel_events[job_id] = threading.Event()
+            positions = {}  # source -> positions still to do (a source may be listed twice)
+            for row in self._db.execute(
+                "SELECT position, source FROM job_sources WHERE job_id = ? AND state NOT IN ('done', 'failed') "
+                "ORDER BY position", (job_id,)
+            ):
+                positions.setdefault(row["source"], []).append(row["position"])
+        if cancelled:
+            # Cancelled while queued (or while running before a restart); _finish takes the lock itself
+            self._finish(job_id, "cancelled")
+            return
+
+        def progress(source: str, state: str, error: str = None):
+            with self._lock:
+                self._db.executemany(
+                    "UPDATE job_sources SET state = ?, error = ?, updated_at = ? WHERE job_id = ? AND position = ?",
+                    [(state, error, self.now(), job_id, position) for position in positions.get(source, [])],
+                )
+                self._db.commit()
+
+        try:
+            summary = self.vector_store().insert_data(list(positions), job["sources_type"],
+                                                      tags=json.loads(job["tags"]) or None,
+                                                      progress=progress, cancel_event=cancel_event, run_id=job_id)
+            self._finish(job_id, self.final_status(job_id, cancel_event.is_set()), summary=summary)
+        except Exception as e:
+            logger.error(f"Ingestion job {job_id} failed: {e}")
+            self._finish(job_id, "failed", error=str(e))
+        finally:
+            with self._lock:
+                self._cancel_events.pop(job_id, None)
+
+    def cancel(self, job_id: str):
+        """Cancel a job; returns its status afterwards, or None for an unknown job.
+
+        A job running in another process stops once its owner sees the request (at its next heartbeat).
+        """
+        with self._lock:
+            job = self._db.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if job is None:
+                return None
+            if job["status"] in FINAL_STATUSES:
+                return job["status"]
+            self._db.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ?", (job_id,))
+            self._db.commit()
+            if job_id in self._cancel_events:
+                self._cancel_events[job_id].set()  # the pipeline drops its sources at their next stage
+                return "cancelling"
+        if self._finish(job_id, "cancelled", only_if="queued"):
+            return "cancelled"
+        return "cancelling"
+
+    def _finish(self, job_id: str, status: str, summary: dict = None, error: str = None, only_if: str = None):
+        """Record the final status; with only_if, only while the job still has that status. Returns whether it did."""
+        with self._lock:
+            updated = self._db.execute(
+                "UPDATE jobs SET status = ?, finished_at = ?, summary = ?, error = ? WHERE id = ?"
+                + (" AND status = ?" if only_if else ""),
+                (status, self.now(), json.dumps(summary) if summary else None, error, job_id)
+                + ((only_if,) if only_if else ()),
+            ).rowcount
+            if updated and status == "cancelled":
+                self._db.execute(
+                    "UPDATE job_sources SET state = 'cancelled', updated_at = ? "
+                    "WHERE job_id = ? AND state NOT IN ('done', 'failed')", (self.now(), job_id),
+                )
+            self._db.commit()
+        if updated:
+            logger.info(f"Ingestion job {job_id} {status}.")
+        return bool(updated)
+
+    def final_status(self, job_id: str, cancel_requested: bool):
+        """Status of a job whose pipeline returned, from the states its sources ended in."""
+        with self._lock:
+            states = [row["state"] for row in self._db.execute(
+                "SELECT state FROM job_sources WHERE job_id = ?", (job_id,)
+            )]
+        if "failed" in states:
+            return "partial" if "done" in states else "failed"
+        if all(state == "done" for state in states):
+            return "completed"  # even if cancellation came after the last source
+        if cancel_requested or "cancelled" in states:
+            return "cancelled"
+        return "partial"
+
+    def _keep_leases(self):
+        """Heartbeat thread: renew the leases of this process's jobs, pass on cancel requests made
+        through other processes, and take over jobs whose owner stopped renewing."""
+        while not self._closed.wait(self.lease_seconds / 3):
+            try:
+                with self._lock:
+                    self._db.execute("UPDATE jobs SET heartbeat_at = ? WHERE owner = ? AND status = 'running'",
+                                     (time.time(), self.owner))
+                    self._db.commit()
+                    for row in self._db.execute(
+                        "SELECT id FROM jobs WHERE owner = ? AND status = 'running' AND cancel_requested = 1",
+                        (self.owner,)
+                    ):
+                        if row["id"] in self._cancel_events:
+                            self._cancel_events[row["id"]].set()
+                self.resume(queued=False)
+            except Exception as e:
+                logger.warning(f"Ingestion job lease renewal failed: {e}")
+
+    def close(self):
+        """Stop renewing leases and wait for the running jobs."""
+        self._closed.set()
+        self._executor.shutdown(wait=True)
+
+    def status(self, job_id: str):
+        """The job with its per-source states and progress counts, or None."""
+        with self._lock:
+            job = self._db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if job is None:
+                return None
+            sources = self._db.execute(
+                "SELECT source, state, error, updated_at FROM job_sources WHERE job_id = ? ORDER BY position", (job_id,)
+            ).fetchall()
+        result = self.to_dict(job)
+        result["sources"] = [dict(source) for source in sources]
+        states = [source["state"] for source in sources]
+        result["progress"] = {
+            "total": len(states),
+            "done": states.count("done"),
+            "failed": states.count("failed"),
+            "cancelled": states.count("cancelled"),
+            "pending": sum(1 for state in states if state not in ("done", "failed", "cancelled")),
+        }
+        return result
+
+    def list(self, limit: int = 20):
+        """Most recent jobs, without their sources."""
+        with self._lock:
+            jobs = self._db.execute("SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,)).fetchall()
+        return [self.to_dict(job) for job in jobs]
+
+    @staticmethod
+    def to_dict(job: sqlite3.Row):
+        result = dict(job)
+        result["tags"] = json.loads(result["tags"] or "[]")
+        result["summary"] = json.loads(result["summary"]) if result["summary"] else None
+        result["cancel_requested"] = bool(result["cancel_requested"])
+        return result
+
+    @staticmethod
+    def now():
+        return datetime.now(timezone.utc).isoformat()
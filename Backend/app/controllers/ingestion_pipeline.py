@@ -0,0 +1,224 @@
+"""
+STAGED INGESTION PIPELINE
+- EACH STAGE HAS ITS OWN WORKER THREADS AND A BOUNDED INPUT QUEUE
+- I/O STAGES (FETCH, EMBED, WRITE) OVERLAP WITH CPU STAGES (PARSE, CHUNK)
+- OPTIONAL MICRO-BATCHING PER STAGE (E.G. EMBED CHUNKS OF SEVERAL SOURCES AT ONCE)
+- CHECKPOINT FILE PER RUN ID SO A CRASHED RUN RESUMES WITHOUT REDOING FINISHED SOURCES
+- PER-SOURCE PROGRESS CALLBACK AND COOPERATIVE CANCELLATION BETWEEN STAGES
+"""
+import os
+import json
+import time
+import queue
+import logging
+import threading
+from typing import Callable, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()  # end-of-stream marker passed between stages
+
+
+class SourceTask:
+    """One source moving through the pipeline; stages fill in its fields."""
+
+    def __init__(self, source: str, source_type: str, tags: List[str] = None):
+        self.source = source
+        self.source_type = source_type
+        self.tags = tags or []  # stored on every chunk, for filtered search
+        self.raw = None  # fetched bytes/text
+        self.documents = []  # parsed documents
+        self.chunks = []  # chunk documents ready for writing
+        self.vectors = []  # one vector (or None) per chunk
+        self.inserted = 0
+        self.content_hash = None
+        self.unchanged = False  # content matches the manifest, nothing to do
+        self.chunk_hashes = []  # hashes of all current chunks of the source
+        self.removed_hashes = []  # stored chunks no longer in the source
+
+
+class Stage:
+    def __init__(self, name: str, func: Callable, workers: int = 1, batch_size: int = 1):
+        """func takes one task (or a list of tasks when batch_size > 1) and returns the same."""
+        self.name = name
+        self.func = func
+        self.workers = workers
+        self.batch_size = batch_size
+
+
+class Checkpoint:
+    """Append-only JSON lines file of the sources one run has finished.
+
+    Each run has its own file, <path>.<run_id>, so concurrent runs never touch each other's; the same
+    run started again after a crash resumes from it. Without a run id nothing could resume the run,
+    so no file is kept.
+    """
+
+    def __init__(self, path: Optional[str], run_id: str = None):
+        self.run_id = run_id
+        self.path = f"{path}.{run_id}" if path and run_id else None
+        self._lock = threading.Lock()
+        self.finished = set()
+        if self.path and os.path.exists(self.path):
+            with open(self.path) as f:
+                self.finished = {json.loads(line)["source"] for line in f if line.strip()}
+
+    def is_finished(self, source: str):
+        return source in self.finished
+
+    def clear(self):
+        """Remove the file once the run has finished."""
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+        self.finished = set()
+
+    def mark_finished(self, source: str):
+        if not self.path:
+            return
+        with self._lock:
+            self.finished.add(source)
+            with open(self.path, "a") as f:
+                f.write(json.dumps({"source": source, "finished_at": time.time()}) + "\n")
+
+
+class IngestionPipeline:
+    def __init__(self, stages: List[Stage], queue_size: int = None, checkpoint_path: str = None,
+                 progress: Callable[[str, str, Optional[str]], None] = None, cancel_event: threading.Event = None,
+                 run_id: str = None):
+        """progress(source, state, error) is called after each stage a source passes (state is the stage name),
+        and with "done", "failed" or "cancelled". Once cancel_event is set, sources stop at their next stage.
+        With a checkpoint path, a run crashed midway resumes when started again with the same run_id.
+        """
+        self.stages = stages
+        self.queue_size = queue_size or int(os.getenv("INGEST_QUEUE_SIZE", 16))
+        self.checkpoint = Checkpoint(checkpoint_path, run_id)
+        self.progress = progress
+        self.cancel_event = cancel_event
+        self.failed = {}  # source -> error message
+        self.cancelled = []  # sources dropped after cancellation
+        self.stage_seconds = {stage.name: 0.0 for stage in stages}
+        self._lock = threading.Lock()
+
+    def run(self, tasks: Iterable[SourceTask]) -> List[SourceTask]:
+        """Push tasks through all stages and return the tasks that made it to the end."""
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in range(len(self.stages) + 1)]
+        completed = []
+        threads = []
+
+        for i, stage in enumerate(self.stages):
+            remaining = [stage.workers]  # workers still running in this stage
+            for n in range(stage.workers):
+                thread = threading.Thread(
+                    target=self._worker, args=(stage, queues[i], queues[i + 1], remaining, self._next_workers(i)),
+                    name=f"ingest-{stage.name}-{n}", daemon=True,
+                )
+                thread.start()
+                threads.append(thread)
+
+        def collect():
+            while True:
+                task = queues[-1].get()
+                if task is _DONE:
+                    return
+                self.checkpoint.mark_finished(task.source)
+                completed.append(task)
+                self.report(task.source, "done")
+
+        collector = threading.Thread(target=collect, name="ingest-collect", daemon=True)
+        collector.start()
+
+        skipped = 0
+        for task in tasks:
+            if self.checkpoint.is_finished(task.source):
+                skipped += 1
+                continue
+            if self.is_cancelled():
+                self.drop(task)
+                continue
+            queues[0].put(task)  # blocks while the first stage is saturated
+        for _ in range(self.stages[0].workers):
+            queues[0].put(_DONE)
+
+        for thread in threads:
+            thread.join()
+        collector.join()
+
+        if skipped:
+            logger.info(f"Skipped {skipped} sources already finished in checkpoint.")
+        self.checkpoint.clear()
+        return completed
+
+    def is_cancelled(self):
+        return self.cancel_event is not None and self.cancel_event.is_set()
+
+    def drop(self, task: SourceTask):
+        with self._lock:
+            self.cancelled.append(task.source)
+        self.report(task.source, "cancelled")
+
+    def report(self, source: str, state: str, error: str = None):
+        if self.progress is None:
+            return
+        try:
+            self.progress(source, state, error)
+        except Exception as e:
+            logger.warning(f"Progress callback failed for '{source}': {e}")
+
+    def _next_workers(self, i: int):
+        return self.stages[i + 1].workers if i + 1 < len(self.stages) else 1
+
+    def _worker(self, stage: Stage, in_queue: queue.Queue, out_queue: queue.Queue, remaining: list, next_workers: int):
+        finished = False
+        while not finished:
+            batch = [in_queue.get()]
+            if batch[0] is _DONE:
+                break
+            # Opportunistically take more waiting tasks, up to the stage's batch size
+            while len(batch) < stage.batch_size:
+                try:
+                    task = in_queue.get_nowait()
+                except queue.Empty:
+                    break
+                if task is _DONE:
+                    finished = True
+                    break
+                batch.append(task)
+
+            for task in self._process(stage, batch):
+                out_queue.put(task)
+
+        with self._lock:
+            remaining[0] -= 1
+            last = remaining[0] == 0
+        if last:
+            # Last worker of this stage closes the next stage
+            for _ in range(next_workers):
+                out_queue.put(_DONE)
+
+    def _process(self, stage: Stage, batch: List[SourceTask]) -> List[SourceTask]:
+        if self.is_cancelled():
+            for task in batch:
+                self.drop(task)
+            return []
+        start = time.perf_counter()
+        try:
+            if stage.batch_size > 1:
+                results = stage.func(batch)
+            else:
+                results = [stage.func(batch[0])]
+        except Exception as e:
+            # Retry a failed batch one task at a time so one bad source doesn't sink the others
+            if len(batch) > 1:
+                return [result for task in batch for result in self._process(stage, [task])]
+            source = batch[0].source
+            logger.error(f"Error in {stage.name} stage for source '{source}': {e}")
+            with self._lock:
+                self.failed[source] = f"{stage.name}: {e}"
+            self.report(source, "failed", self.failed[source])
+            return []
+        finally:
+            with self._lock:
+                self.stage_seconds[stage.name] += time.perf_counter() - start
+        for task in results:
+            self.report(task.source, stage.name)
+        return results
@@ -0,0 +1,86 @@
+"""
+BM25 LEXICAL INDEX OVER KNOWLEDGE BASE CHUNKS
+- INVERTED INDEX: TERM -> (CHUNK ROWS, TERM FREQUENCIES) AS NUMPY ARRAYS
+- OKAPI BM25 SCORING, VECTORIZED PER QUERY TERM
+- RECIPROCAL RANK FUSION OF SEVERAL RANKINGS (HYBRID SEARCH)
+"""
+import re
+import math
+from collections import Counter, defaultdict
+from typing import Callable, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word tokens; digits are kept so phone numbers and product codes match exactly."""
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class BM25Index:
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.records: List[dict] = []  # row -> chunk record (text and metadata, no embedding)
+        self.postings: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self.idf: Dict[str, float] = {}
+        self.length_norm = np.zeros(0, dtype=np.float32)  # k1 * (1 - b + b * dl / avgdl) per row
+
+    def __len__(self):
+        return len(self.records)
+
+    def build(self, records: Sequence[dict]):
+        """(Re)build the index from chunk records with a "text" field."""
+        postings = defaultdict(lambda: ([], []))
+        lengths = np.zeros(len(records), dtype=np.float32)
+        for row, record in enumerate(records):
+            terms = Counter(tokenize(record.get("text", "")))
+            lengths[row] = sum(terms.values())
+            for term, frequency in terms.items():
+                rows, frequencies = postings[term]
+                rows.append(row)
+                frequencies.append(frequency)
+
+        count = len(records)
+        self.records = list(records)
+        self.postings = {
+            term: (np.asarray(rows, dtype=np.int32), np.asarray(frequencies, dtype=np.float32))
+            for term, (rows, frequencies) in postings.items()
+        }
+        self.idf = {
+            term: math.log(1 + (count - len(rows) + 0.5) / (len(rows) + 0.5))
+            for term, (rows, _) in self.postings.items()
+        }
+        average_length = float(lengths.mean()) if count else 0.0
+        self.length_norm = self.k1 * (1 - self.b + self.b * lengths / (average_length or 1.0))
+
+    def search(self, query: str, k: int, predicate: Callable[[dict], bool] = None) -> List[Tuple[dict, float]]:
+        """Top k (record, BM25 score) pairs; chunks sharing no term with the query are left out.
+
+        predicate restricts the candidates (metadata filters) before ranking.
+        """
+        scores = np.zeros(len(self.records), dtype=np.float32)
+        for term in set(tokenize(query)):
+            if term not in self.postings:
+                continue
+            rows, frequencies = self.postings[term]
+            scores[rows] += self.idf[term] * frequencies * (self.k1 + 1) / (frequencies + self.length_norm[rows])
+
+        candidates = np.flatnonzero(scores)
+        if predicate is not None:
+            candidates = candidates[np.array([predicate(self.records[row]) for row in candidates], dtype=bool)]
+        if len(candidates) > k:
+            candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        candidates = candidates[np.argsort(-scores[candidates])]
+        return [(self.records[row], float(scores[row])) for row in candidates]
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[str]], k: int = 60) -> Dict[str, float]:
+    """Fuse ranked id lists: each id scores sum(1 / (k + rank)) over the lists it appears in."""
+    scores = defaultdict(float)
+    for ranking in rankings:
+        for rank, key in enumerate(ranking, start=1):
+            scores[key] += 1.0 / (k + rank)
+    return dict(sorted(scores.items(), key=lambda item: item[1], reverse=True))
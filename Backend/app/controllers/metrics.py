@@ -0,0 +1,185 @@
+"""
+PROCESS-WIDE METRICS IN PROMETHEUS TEXT FORMAT
+- COUNTERS AND HISTOGRAMS WITH LABELS, UPDATED IN PLACE ON THE REQUEST PATH (A LOCK AND A FEW ADDITIONS)
+- NOTHING IS FORMATTED UNTIL /metrics IS SCRAPED
+- COLLECTORS READ EXISTING stats() COUNTERS (CACHES, SESSIONS, ROUTER) AT SCRAPE TIME ONLY
+- METRICS_ENABLED=false TURNS RECORDING OFF
+"""
+import os
+import bisect
+import logging
+import threading
+from typing import Callable, Dict, Iterable, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Seconds; chat states range from sub-millisecond transitions to multi-second LLM calls
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.values = {}  # label values -> total
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount: float = 1):
+        with self._lock:
+            self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, label_values, value) for label_values, value in self.values.items()]
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = (), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self.values = {}  # label values -> [count per bucket (+Inf last), sum]
+        self._lock = threading.Lock()
+
+    def observe(self, *label_values, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self.values.get(label_values)
+            if series is None:
+                series = self.values[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def samples(self):
+        """Cumulative bucket counts, as the exposition format expects."""
+        with self._lock:
+            values = [(label_values, list(counts), total) for label_values, (counts, total) in self.values.items()]
+        samples = []
+        for label_values, counts, total in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                samples.append((f"{self.name}_bucket", label_values + (format_value(bound),), cumulative))
+            samples.append((f"{self.name}_count", label_values, cumulative))
+            samples.append((f"{self.name}_sum", label_values, total))
+        return samples
+
+
+class MetricsRegistry:
+    def __init__(self, enabled: bool = None):
+        if enabled is None:
+            enabled = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+        self.enabled = enabled
+        self.metrics = []
+        self.collectors = {}  # name -> callable returning (name, type, documentation, [(labels dict, value)])
+        self._lock = threading.Lock()
+
+        self.state_seconds = self.histogram("chatbot_state_seconds", "Wall time of each state machine state.",
+                                            ("state",))
+        self.run_seconds = self.histogram("chatbot_run_seconds", "Wall time of a state machine run.", ("mode",))
+        self.errors = self.counter("chatbot_errors_total", "Exceptions raised by a state.", ("state", "error"))
+        self.llm_tokens = self.counter("chatbot_llm_tokens_total", "Tokens reported by the chat model.",
+                                       ("call", "kind"))
+        self.retrievals = self.counter("chatbot_retrievals_total", "Retrievals, by whether any chunk was kept.",
+                                       ("result",))
+        self.retrieved_chunks = self.histogram("chatbot_retrieved_chunks", "Chunks kept per retrieval.",
+                                               buckets=(0, 1, 2, 3, 4, 6, 8, 12, 16))
+
+    def counter(self, name: str, documentation: str, labels: Tuple[str, ...] = ()) -> Counter:
+        return self._add(Counter(name, documentation, labels))
+
+    def histogram(self, name: str, documentation: str, labels: Tuple[str, ...] = (), buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(name, documentation, labels, buckets))
+
+    def _add(self, metric):
+        with self._lock:
+            self.metrics.append(metric)
+        return metric
+
+    def register_collector(self, name: str, collect: Callable[[], Iterable[Tuple[str, str, str, List]]]):
+        """collect() returns (metric name, "counter"|"gauge", documentation, [(labels dict, value), ...]) tuples.
+        Registering again under the same name replaces the previous collector."""
+        with self._lock:
+            self.collectors[name] = collect
+
+    def observe_state(self, state: str, seconds: float):
+        if self.enabled:
+            self.state_seconds.observe(state, value=seconds)
+
+    def observe_run(self, mode: str, seconds: float):
+        if self.enabled:
+            self.run_seconds.observe(mode, value=seconds)
+
+    def record_error(self, state: str, error: BaseException):
+        if self.enabled:
+            self.errors.inc(state, type(error).__name__)
+
+    def record_usage(self, call: str, message):
+        """Add the token usage an LLM response (or one of its stream chunks) reports, if any."""
+        usage = getattr(message, "usage_metadata", None)
+        if not self.enabled or not usage:
+            return
+        self.llm_tokens.inc(call, "prompt", amount=usage.get("input_tokens", 0))
+        self.llm_tokens.inc(call, "completion", amount=usage.get("output_tokens", 0))
+
+    def record_retrieval(self, documents: list):
+        if self.enabled:
+            self.retrievals.inc("hit" if documents else "empty")
+            self.retrieved_chunks.observe(value=len(documents))
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        with self._lock:
+            metrics = list(self.metrics)
+            collectors = list(self.collectors.items())
+        for metric in metrics:
+            samples = metric.samples()
+            if not samples:
+                continue
+            kind = "histogram" if isinstance(metric, Histogram) else "counter"
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {kind}")
+            label_names = metric.labels + ("le",) if kind == "histogram" else metric.labels
+            for name, label_values, value in samples:
+                lines.append(f"{name}{format_labels(dict(zip(label_names, label_values)))} {format_value(value)}")
+
+        for collector_name, collect in collectors:
+            try:
+                families = list(collect())
+            except Exception as e:
+                logger.warning(f"Metrics collector '{collector_name}' failed: {e}")
+                continue
+            for name, kind, documentation, samples in families:
+                if not samples:
+                    continue
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    lines.append(f"{name}{format_labels(labels)} {format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{escape_label(value)}"' for key, value in labels.items()) + "}"
+
+
+def escape_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_value(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, bool):
+        return str(int(value))
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value)) if abs(value) < 1e15 else repr(value)
+    return str(value)
+
+
+metrics = MetricsRegistry()
@@ -0,0 +1,130 @@
+"""
+LOCAL QUERY ROUTER FOR THE DECISION STATE
+- SMALL-TALK PATTERNS NEVER NEED RETRIEVAL
+- KNOWLEDGE BASE SIMILARITY DECIDES CONFIDENT CASES
+- LLM TOOL SELECTOR ONLY FOR LOW-CONFIDENCE QUERIES
+- ACCURACY (SHADOW-SAMPLED AGAINST THE LLM) AND LATENCY COUNTERS
+"""
+import os
+import re
+import time
+import random
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .chatbot_controller import Chatbot
+
+logger = logging.getLogger(__name__)
+
+SMALL_TALK_PATTERN = re.compile(
+    r"^\s*(hi|hello|hey|bonjour|salut|good (morning|afternoon|evening)|thanks?( you)?|merci|ok(ay)?|bye|goodbye"
+    r"|how are you|who are you|what('s| is) your name)\b[\s!.?]*$",
+    re.IGNORECASE,
+)
+
+
+class QueryRouter:
+    def __init__(self, chatbot: "Chatbot", high_threshold=None, low_threshold=None, shadow_rate=None, mode=None):
+        """Route queries locally; thresholds are knowledge base relevance scores in [0, 1]."""
+        self.chatbot = chatbot
+        self.mode = mode or os.getenv("ROUTER_MODE", "local")  # "local" or "llm"
+        # An explicit 0 is a valid threshold, only None falls back to the setting
+        self.high_threshold = (high_threshold if high_threshold is not None
+                               else float(os.getenv("ROUTER_HIGH_THRESHOLD", 0.90)))
+        self.low_threshold = (low_threshold if low_threshold is not None
+                              else float(os.getenv("ROUTER_LOW_THRESHOLD", 0.85)))
+        self.shadow_rate = shadow_rate if shadow_rate is not None else float(os.getenv("ROUTER_SHADOW_RATE", 0.05))
+
+        self._lock = threading.Lock()
+        self._shadow_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="router-shadow")
+        self.counters = {
+            path: {"count": 0, "search": 0, "total_ms": 0.0, "max_ms": 0.0}
+            for path in ("small_talk", "similarity_high", "similarity_low", "llm_fallback", "llm")
+        }
+        self.shadow = {"agree": 0, "disagree": 0, "errors": 0}
+
+    def route(self, query: str) -> bool:
+        """Return True if the query needs a knowledge base search."""
+        start = time.perf_counter()
+        if self.mode == "llm":
+            return self._record("llm", self.chatbot.is_search_tool_required(query), start)
+
+        if SMALL_TALK_PATTERN.match(query):
+            return self._record("small_talk", False, start, query)
+
+        score = self.chatbot.vectorStore.relevance_score(query, self.chatbot.search_filters)
+        confident = self._confident_decision(score)
+        if confident is not None:
+            return self._record(*confident, start, query)
+
+        return self._record("llm_fallback", self.chatbot.is_search_tool_required(query), start)
+
+    async def aroute(self, query: str) -> bool:
+        """Async variant of route()."""
+        start = time.perf_counter()
+        if self.mode == "llm":
+            return self._record("llm", await self.chatbot.ais_search_tool_required(query), start)
+
+        if SMALL_TALK_PATTERN.match(query):
+            return self._record("small_talk", False, start, query)
+
+        score = await self.chatbot.vectorStore.arelevance_score(query, self.chatbot.search_filters)
+        confident = self._confident_decision(score)
+        if confident is not None:
+            return self._record(*confident, start, query)
+
+        return self._record("llm_fallback", await self.chatbot.ais_search_tool_required(query), start)
+
+    def _confident_decision(self, score):
+        if score is None:
+            return None
+        if score >= self.high_threshold:
+            return "similarity_high", True
+        if score <= self.low_threshold:
+            return "similarity_low", False
+        return None
+
+    def _record(self, path: str, decision: bool, start: float, shadow_query: str = None):
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        with self._lock:
+            counter = self.counters[path]
+            counter["count"] += 1
+            counter["search"] += int(decision)
+            counter["total_ms"] += elapsed_ms
+            counter["max_ms"] = max(counter["max_ms"], elapsed_ms)
+
+        # Occasionally ask the LLM as well (off the request path) to measure local accuracy
+        if shadow_query is not None and self.shadow_rate and random.random() < self.shadow_rate:
+            self._shadow_pool.submit(self._shadow_check, shadow_query, decision)
+        return decision
+
+    def _shadow_check(self, query: str, decision: bool):
+        try:
+            agree = self.chatbot.is_search_tool_required(query) == decision
+        except Exception as e:
+            logger.warning(f"Router shadow check failed: {e}")
+            with self._lock:
+                self.shadow["errors"] += 1
+            return
+        with self._lock:
+            self.shadow["agree" if agree else "disagree"] += 1
+
+    def stats(self):
+        """Return per-path counts and latencies plus the shadow-sampled accuracy."""
+        with self._lock:
+            paths = {
+                path: {**counter, "avg_ms": counter["total_ms"] / counter["count"] if counter["count"] else 0.0}
+                for path, counter in self.counters.items()
+            }
+            checked = self.shadow["agree"] + self.shadow["disagree"]
+            return {
+                "mode": self.mode,
+                "high_threshold": self.high_threshold,
+                "low_threshold": self.low_threshold,
+                "paths": paths,
+                "shadow": dict(self.shadow),
+                "accuracy": self.shadow["agree"] / checked if checked else None,
+            }
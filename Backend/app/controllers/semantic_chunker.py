@@ -0,0 +1,62 @@
+"""
+SEMANTIC CHUNKER THAT KEEPS ITS SENTENCE EMBEDDINGS
+SemanticChunker embeds every sentence window to find breakpoints and then
+throws those vectors away, so every chunk gets embedded a second time on
+insert. This subclass returns a vector for each chunk built from the
+breakpoint pass:
+- exact: the chunk text is one of the embedded sentence windows
+- derived: normalized mean of the chunk's sentence-window embeddings
+"""
+import re
+from typing import List, Optional, Tuple
+
+import numpy as np
+from langchain_experimental.text_splitter import SemanticChunker
+
+
+class ReusingSemanticChunker(SemanticChunker):
+    """SemanticChunker whose split also returns chunk embeddings (None when none could be reused)."""
+
+    def split_text_with_embeddings(self, text: str) -> List[Tuple[str, Optional[List[float]]]]:
+        single_sentences_list = re.split(self.sentence_split_regex, text)
+
+        # Same early exits as SemanticChunker.split_text: nothing was embedded
+        if len(single_sentences_list) == 1:
+            return [(single_sentences_list[0], None)]
+        if self.breakpoint_threshold_type == "gradient" and len(single_sentences_list) == 2:
+            return [(sentence, None) for sentence in single_sentences_list]
+
+        distances, sentences = self._calculate_sentence_distances(single_sentences_list)
+        if self.number_of_chunks is not None:
+            threshold = self._threshold_from_clusters(distances)
+            breakpoint_array = distances
+        else:
+            threshold, breakpoint_array = self._calculate_breakpoint_threshold(distances)
+
+        groups = []
+        start_index = 0
+        for index in (i for i, distance in enumerate(breakpoint_array) if distance > threshold):
+            group = sentences[start_index:index + 1]
+            # Small chunks are merged into the next one, as SemanticChunker does
+            if self.min_chunk_size is not None and len(" ".join(d["sentence"] for d in group)) < self.min_chunk_size:
+                continue
+            groups.append(group)
+            start_index = index + 1
+        if start_index < len(sentences):
+            groups.append(sentences[start_index:])
+
+        windows = {d["combined_sentence"]: d["combined_sentence_embedding"] for d in sentences}
+        chunks = []
+        for group in groups:
+            chunk_text = " ".join(d["sentence"] for d in group)
+            vector = windows.get(chunk_text)
+            if vector is None:
+                vector = self.mean_embedding([d["combined_sentence_embedding"] for d in group])
+            chunks.append((chunk_text, vector))
+        return chunks
+
+    @staticmethod
+    def mean_embedding(vectors: List[List[float]]) -> List[float]:
+        mean = np.mean(np.asarray(vectors, dtype=np.float32), axis=0)
+        norm = np.linalg.norm(mean)
+        return (mean / norm if norm else mean).tolist()
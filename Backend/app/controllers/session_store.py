@@ -0,0 +1,181 @@
+"""
+SESSION STORE FOR CHAT CONVERSATIONS
+- ONE COMPACT HISTORY PER CLIENT SESSION
+- TOKEN-BUDGETED PROMPT WINDOW PER SESSION
+- BOUNDED BY SESSION COUNT, MEMORY AND TTL (LRU EVICTION)
+- EVICTION COUNTERS FOR MONITORING
+"""
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from .token_counter import count_message_tokens
+
+logger = logging.getLogger(__name__)
+
+Message = Tuple[str, str]  # (role, content), e.g. ("human", "hello")
+
+
+class ConversationHistory:
+    """Compact message history of a single chat session.
+
+    Token counts are computed once when a message is appended. The prompt window
+    (the most recent messages that fit in the token budget) is kept up to date on
+    every append, so reading it never rescans the whole history.
+    """
+
+    __slots__ = ("messages", "token_counts", "size_bytes", "last_access", "max_messages",
+                 "token_budget", "window_start", "window_tokens")
+
+    def __init__(self, max_messages: Optional[int] = None, token_budget: Optional[int] = None):
+        self.messages: List[Message] = []
+        self.token_counts: List[int] = []
+        self.size_bytes = 0
+        self.last_access = time.monotonic()
+        self.max_messages = max_messages
+        self.token_budget = token_budget
+        self.window_start = 0
+        self.window_tokens = 0
+
+    def append(self, role: str, content: str):
+        """Append a message and return the change in stored bytes."""
+        added = self.message_size(role, content)
+        tokens = count_message_tokens(role, content)
+        self.messages.append((role, content))
+        self.token_counts.append(tokens)
+        self.size_bytes += added
+        self.window_tokens += tokens
+
+        # Slide the window start forward until it fits the budget (always keep the newest message)
+        if self.token_budget:
+            while self.window_tokens > self.token_budget and self.window_start < len(self.messages) - 1:
+                self.window_tokens -= self.token_counts[self.window_start]
+                self.window_start += 1
+
+        removed = 0
+        if self.max_messages and len(self.messages) > self.max_messages:
+            overflow = len(self.messages) - self.max_messages
+            removed = sum(self.message_size(*message) for message in self.messages[:overflow])
+            if overflow > self.window_start:
+                self.window_tokens -= sum(self.token_counts[self.window_start:overflow])
+            self.window_start = max(0, self.window_start - overflow)
+            del self.messages[:overflow]
+            del self.token_counts[:overflow]
+            self.size_bytes -= removed
+
+        return added - removed
+
+    def window(self) -> List[Message]:
+        """Return the most recent messages that fit in the token budget."""
+        return self.messages[self.window_start:]
+
+    @staticmethod
+    def message_size(role: str, content: str):
+        return len(role) + len(content.encode("utf-8"))
+
+    def __len__(self):
+        return len(self.messages)
+
+
+class SessionStore:
+    def __init__(self, max_sessions=None, max_bytes=None, ttl_seconds=None, max_messages_per_session=None,
+                 history_token_budget=None):
+        """Initialize the session store. Limits default to environment variables."""
+        self.max_sessions = max_sessions or int(os.getenv("SESSION_MAX_COUNT", 1000))
+        self.max_bytes = max_bytes or int(os.getenv("SESSION_MAX_BYTES", 50 * 1024 * 1024))
+        self.ttl_seconds = ttl_seconds or float(os.getenv("SESSION_TTL_SECONDS", 3600))
+        self.max_messages_per_session = max_messages_per_session or int(os.getenv("SESSION_MAX_MESSAGES", 50))
+        self.history_token_budget = history_token_budget or int(os.getenv("HISTORY_TOKEN_BUDGET", 3000))
+
+        self._sessions: "OrderedDict[str, ConversationHistory]" = OrderedDict()  # least recently used first
+        self._lock = threading.Lock()
+        self.total_bytes = 0
+        self.evictions = {"lru": 0, "ttl": 0, "memory": 0}
+
+    def history(self, session_id: str) -> List[Message]:
+        """Return a copy of the session's messages, creating the session if needed."""
+        with self._lock:
+            return list(self._touch(session_id).messages)
+
+    def window(self, session_id: str) -> List[Message]:
+        """Return the session's most recent messages that fit in the history token budget."""
+        with self._lock:
+            return self._touch(session_id).window()
+
+    def append(self, session_id: str, role: str, content: str):
+        """Append one message to the session's history."""
+        self.extend(session_id, [(role, content)])
+
+    def extend(self, session_id: str, messages: List[Message]):
+        """Append several messages to the session's history and enforce the store limits."""
+        with self._lock:
+            session = self._touch(session_id)
+            for role, content in messages:
+                self.total_bytes += session.append(role, content)
+            self._evict_over_memory(keep=session_id)
+
+    def remove(self, session_id: str):
+        """Drop a session and its history."""
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+            if session is not None:
+                self.total_bytes -= session.size_bytes
+
+    def stats(self):
+        """Return current size and eviction counters."""
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "total_bytes": self.total_bytes,
+                "max_sessions": self.max_sessions,
+                "max_bytes": self.max_bytes,
+                "evictions": dict(self.evictions),
+            }
+
+    def __contains__(self, session_id: str):
+        with self._lock:
+            return session_id in self._sessions
+
+    def __len__(self):
+        with self._lock:
+            return len(self._sessions)
+
+    def _touch(self, session_id: str) -> ConversationHistory:
+        """Fetch (or create) a session and mark it as most recently used. Caller holds the lock."""
+        now = time.monotonic()
+        self._evict_expired(now)
+
+        session = self._sessions.get(session_id)
+        if session is None:
+            session = ConversationHistory(self.max_messages_per_session, self.history_token_budget)
+            self._sessions[session_id] = session
+            while len(self._sessions) > self.max_sessions:
+                self._pop_oldest("lru")
+        else:
+            self._sessions.move_to_end(session_id)
+
+        session.last_access = now
+        return session
+
+    def _evict_expired(self, now: float):
+        """Sessions are ordered by last access, so expired ones sit at the front."""
+        while self._sessions:
+            oldest = next(iter(self._sessions.values()))
+            if now - oldest.last_access < self.ttl_seconds:
+                break
+            self._pop_oldest("ttl")
+
+    def _evict_over_memory(self, keep: str):
+        while self.total_bytes > self.max_bytes and len(self._sessions) > 1:
+            if next(iter(self._sessions)) == keep:
+                break
+            self._pop_oldest("memory")
+
+    def _pop_oldest(self, reason: str):
+        session_id, session = self._sessions.popitem(last=False)
+        self.total_bytes -= session.size_bytes
+        self.evictions[reason] += 1
+        logger.debug(f"Evicted session '{session_id}' ({reason}).")
@@ -0,0 +1,32 @@
+"""
+TOKEN COUNTING HELPERS
+- SHARED TIKTOKEN ENCODER (LOADED ONCE)
+- CHARACTER-BASED ESTIMATE WHEN TIKTOKEN IS NOT AVAILABLE
+"""
+import os
+from functools import lru_cache
+
+MESSAGE_OVERHEAD_TOKENS = 4  # role and separators added by the chat format
+
+
+@lru_cache(maxsize=1)
+def get_encoder():
+    """Return the tiktoken encoder, or None if tiktoken cannot be loaded."""
+    try:
+        import tiktoken
+        return tiktoken.get_encoding(os.getenv("TOKEN_ENCODING", "cl100k_base"))
+    except Exception:
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """Count the tokens of a text."""
+    encoder = get_encoder()
+    if encoder is None:
+        return max(1, len(text) // 4)
+    return len(encoder.encode(text, disallowed_special=()))
+
+
+def count_message_tokens(role: str, content: str) -> int:
+    """Count the tokens a chat message takes in a prompt."""
+    return count_tokens(content) + MESSAGE_OVERHEAD_TOKENS
@@ -0,0 +1,578 @@
+"""
+VECTOR SEARCH BACKENDS
+- ATLAS: $vectorSearch AGGREGATION ON THE MONGO COLLECTION (DEFAULT)
+- LOCAL: IN-PROCESS FLOAT32 MATRIX WITH VECTORIZED COSINE TOP-K, PERSISTED TO DISK
+- OPTIONAL HNSW INDEX (hnswlib) FOR LARGE LOCAL COLLECTIONS
+- LOCAL COLLECTIONS ANSWER THE SUBSET OF THE MONGO API THE CONTROLLER USES
+- ONE LOCAL COLLECTION PER PATH AND PROCESS; FILE WRITES BATCHED DURING BULK WORK
+- LOCAL VECTOR FILES ARE WRITTEN AS ONE GENERATION, COMMITTED BY A SINGLE STATE FILE
+"""
+import os
+import glob
+import json
+import time
+import uuid
+import asyncio
+import logging
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, List
+
+import numpy as np
+from bson.binary import Binary
+from pymongo.results import DeleteResult, InsertManyResult
+
+from .vector_quantization import QuantizedVectors, rescore
+
+try:
+    import hnswlib  # shipped by chroma-hnswlib
+except ImportError:
+    hnswlib = None
+
+logger = logging.getLogger(__name__)
+
+
+class VectorBackend(ABC):
+    """Nearest neighbour search over stored chunk records.
+
+    Results are records (text and metadata, no embedding unless with_vectors) with a "score" in [0, 1],
+    the same scale Atlas uses for cosine similarity: (1 + cosine) / 2. pre_filter is a Mongo
+    query on metadata fields, applied inside the search so only matching chunks are candidates.
+    """
+
+    @abstractmethod
+    def search(self, vector: List[float], k: int, pre_filter: dict = None, with_vectors: bool = False) -> List[dict]:
+        pass
+
+    async def asearch(self, vector: List[float], k: int, pre_filter: dict = None,
+                      with_vectors: bool = False) -> List[dict]:
+        """In-process backends scan in a worker thread: the scan is CPU-bound and waits on the lock
+        that ingestion holds while it flushes, neither of which may stall the event loop."""
+        return await asyncio.to_thread(self.search, vector, k, pre_filter, with_vectors)
+
+
+def atlas_index_definition(dimensions: int, quantization: str = "none", filter_fields: List[str] = ()):
+    """Atlas Vector Search index definition for the "embedding" field, generated from the settings."""
+    vector_field = {
+        "type": "vector",
+        "path": "embedding",
+        "numDimensions": dimensions,
+        "similarity": "cosine"
+    }
+    if quantization != "none":
+        vector_field["quantization"] = quantization
+    return {"fields": [vector_field, *({"type": "filter", "path": path} for path in filter_fields)]}
+
+
+def to_array(embedding) -> np.ndarray:
+    """Stored embedding (BSON array of doubles or packed float32 binary vector) as a float32 array."""
+    if isinstance(embedding, Binary):
+        return np.frombuffer(embedding, dtype="<f4", offset=2)  # 2 header bytes: dtype and padding
+    return np.asarray(embedding, dtype=np.float32)
+
+
+class AtlasVectorBackend(VectorBackend):
+    def __init__(self, collection, index_name: str, async_collection: Callable = None, rescore_factor: int = 0):
+        """async_collection() returns the async driver's collection (it must be opened inside the event loop).
+
+        With a rescore_factor (for quantized indexes), rescore_factor * k candidates are fetched with their
+        full-precision vectors and re-ranked by exact cosine similarity.
+        """
+        self.collection = collection
+        self.index_name = index_name
+        self.async_collection = async_collection
+        self.rescore_factor = rescore_factor
+
+    def pipeline(self, vector: List[float], k: int, pre_filter: dict = None, with_vectors: bool = False):
+        limit = k * self.rescore_factor if self.rescore_factor else k
+        vector_search = {
+            "index": self.index_name,
+            "path": "embedding",
+            "queryVector": vector,
+            "numCandidates": limit * 10,
+            "limit": limit,
+        }
+        if pre_filter:
+            vector_search["filter"] = pre_filter  # fields must be declared as filter fields in the index
+        pipeline = [
+            {"$vectorSearch": vector_search},
+            {"$set": {"score": {"$meta": "vectorSearchScore"}}},
+        ]
+        if not (self.rescore_factor or with_vectors):
+            pipeline.append({"$project": {"embedding": 0}})
+        return pipeline
+
+    def search(self, vector: List[float], k: int, pre_filter: dict = None, with_vectors: bool = False) -> List[dict]:
+        records = list(self.collection.aggregate(self.pipeline(vector, k, pre_filter, with_vectors)))
+        return self.rescore(vector, records, k, with_vectors) if self.rescore_factor else records
+
+    async def asearch(self, vector: List[float], k: int, pre_filter: dict = None,
+                      with_vectors: bool = False) -> List[dict]:
+        cursor = await self.async_collection().aggregate(self.pipeline(vector, k, pre_filter, with_vectors))
+        records = [record async for record in cursor]
+        return self.rescore(vector, records, k, with_vectors) if self.rescore_factor else records
+
+    @staticmethod
+    def rescore(vector: List[float], records: List[dict], k: int, with_vectors: bool = False) -> List[dict]:
+        """Re-rank candidates by exact cosine similarity with their stored vectors."""
+        if not records:
+            return []
+        query = np.asarray(vector, dtype=np.float32)
+        if with_vectors:
+            vectors = np.vstack([to_array(record["embedding"]) for record in records])
+        else:
+            vectors = np.vstack([to_array(record.pop("embedding")) for record in records])
+        norms = np.linalg.norm(vectors, axis=1) * (np.linalg.norm(query) or 1.0)
+        similarities = vectors @ query / np.where(norms, norms, 1.0)
+        for record, similarity in zip(records, similarities):
+            record["score"] = float((1 + similarity) / 2)
+        return sorted(records, key=lambda record: record["score"], reverse=True)[:k]
+
+
+def matches(doc: dict, query: dict) -> bool:
+    """Evaluate the Mongo query operators the controller uses against one document."""
+    for key, condition in query.items():
+        if key == "$or":
+            if not any(matches(doc, sub) for sub in condition):
+                return False
+        elif key == "$and":
+            if not all(matches(doc, sub) for sub in condition):
+                return False
+        elif isinstance(condition, dict) and any(op.startswith("$") for op in condition):
+            if not all(_compare(doc, key, op, operand) for op, operand in condition.items()):
+                return False
+        elif not _equals(doc.get(key), condition):
+            return False
+    return True
+
+
+def _equals(value, operand) -> bool:
+    """Like Mongo, an array field matches when any of its elements does."""
+    if isinstance(value, list) and not isinstance(operand, list):
+        return operand in value
+    return value == operand
+
+
+def _compare(doc: dict, key: str, op: str, operand) -> bool:
+    if op == "$exists":
+        return (key in doc) == bool(operand)
+    value = doc.get(key)
+    if op == "$eq":
+        return _equals(value, operand)
+    if op == "$ne":
+        return not _equals(value, operand)
+    if op == "$in":
+        return any(_equals(value, item) for item in operand)
+    if op == "$nin":
+        return not any(_equals(value, item) for item in operand)
+    if value is None:
+        return False
+    if op == "$gte":
+        return value >= operand
+    if op == "$gt":
+        return value > operand
+    if op == "$lte":
+        return value <= operand
+    if op == "$lt":
+        return value < operand
+    raise ValueError(f"Unsupported query operator: {op}")
+
+
+def _encode(value):
+    if isinstance(value, datetime):
+        return {"$date": value.isoformat()}
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+def _decode(obj: dict):
+    if len(obj) == 1 and "$date" in obj:
+        return datetime.fromisoformat(obj["$date"])
+    return obj
+
+
+def _write_atomic(path: str, write: Callable):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        write(f)
+    os.replace(tmp_path, path)
+
+
+_local_collections = {}  # absolute path -> collection
+_local_collections_lock = threading.Lock()
+
+
+def open_local(collection_class: type, path: str, **options):
+    """The process-wide instance of the local collection stored at path.
+
+    Every controller on the same LOCAL_VECTOR_PATH shares it, so an ingestion through one is seen
+    by the others (new chunks, kb version) and two instances never overwrite each other's files.
+    """
+    key = os.path.abspath(path)
+    with _local_collections_lock:
+        collection = _local_collections.get(key)
+        if collection is None:
+            collection = _local_collections[key] = collection_class(path, **options)
+        return collection
+
+
+class LocalCollection:
+    """Small JSON-file document store standing in for a Mongo collection (manifest, kb_meta)."""
+
+    def __init__(self, path: str, flush_seconds: float = None):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.RLock()
+        self._docs = {}  # _id -> document
+        # Inside deferred_writes() files are rewritten at most every flush_seconds, and once at the end
+        self.flush_seconds = flush_seconds if flush_seconds is not None else float(os.getenv("LOCAL_FLUSH_SECONDS", 5))
+        self._deferred = 0
+        self._dirty = False
+        self._flushed_at = time.monotonic()
+        if os.path.exists(path):
+            with open(path) as f:
+                self._docs = {doc["_id"]: doc for doc in json.load(f, object_hook=_decode)}
+
+    def find_one(self, query: dict = None):
+        with self._lock:
+            return next((dict(doc) for doc in self._docs.values() if matches(doc, query or {})), None)
+
+    def find(self, query: dict = None, projection: dict = None):
+        """Projection only excludes fields ({"field": 0})."""
+        excluded = {key for key, value in (projection or {}).items() if not value}
+        with self._lock:
+            return [
+                {key: value for key, value in doc.items() if key not in excluded}
+                for doc in self._docs.values() if matches(doc, query or {})
+            ]
+
+    def replace_one(self, query: dict, replacement: dict, upsert: bool = False):
+        with self._lock:
+            current = self.find_one(query)
+            if current is None and not upsert:
+                return
+            _id = current["_id"] if current else query.get("_id", uuid.uuid4().hex)
+            self._docs[_id] = {**replacement, "_id": _id}
+            self.save()
+
+    def find_one_and_update(self, query: dict, update: dict, upsert: bool = False, return_document: bool = False):
+        """Supports $inc and $set updates."""
+        with self._lock:
+            current = self.find_one(query)
+            if current is None and not upsert:
+                return None
+            doc = current or {"_id": query.get("_id", uuid.uuid4().hex)}
+            before = dict(doc)
+            for key, amount in update.get("$inc", {}).items():
+                doc[key] = doc.get(key, 0) + amount
+            doc.update(update.get("$set", {}))
+            self._docs[doc["_id"]] = doc
+            self.save()
+            return dict(doc) if return_document else (before if current else None)
+
+    def update_one(self, query: dict, update: dict):
+        """Supports $set, $unset and $pull with an $in list."""
+        with self._lock:
+            current = self.find_one(query)
+            if current is None:
+                return
+            current.update(update.get("$set", {}))
+            for key in update.get("$unset", {}):
+                current.pop(key, None)
+            for key, condition in update.get("$pull", {}).items():
+                pulled = set(condition["$in"])
+                current[key] = [value for value in current.get(key, []) if value not in pulled]
+            self._docs[current["_id"]] = current
+            self.save()
+
+    def distinct(self, key: str, query: dict = None):
+        with self._lock:
+            return list({doc[key] for doc in self._docs.values() if key in doc and matches(doc, query or {})})
+
+    def delete_many(self, query: dict):
+        with self._lock:
+            ids = [_id for _id, doc in self._docs.items() if matches(doc, query)]
+            self._remove(ids)
+            return DeleteResult({"n": len(ids)}, True)
+
+    def _remove(self, ids: list):
+        for _id in ids:
+            del self._docs[_id]
+        if ids:
+            self.save()
+
+    @contextmanager
+    def deferred_writes(self):
+        """Batch the file writes of many updates (an ingestion run) instead of rewriting the files on each."""
+        with self._lock:
+            self._deferred += 1
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._deferred -= 1
+                if not self._deferred and self._dirty:
+                    self.flush()
+
+    def save(self):
+        """Persist a change now, or soon when writes are deferred."""
+        with self._lock:
+            self._dirty = True
+            if not self._deferred or time.monotonic() - self._flushed_at >= self.flush_seconds:
+                self.flush()
+
+    def flush(self):
+        with self._lock:
+            self._write()
+            self._dirty = False
+            self._flushed_at = time.monotonic()
+
+    def _write(self):
+        _write_atomic(self.path, self._dump)
+
+    def _dump(self, f):
+        f.write(json.dumps(list(self._docs.values()), default=_encode).encode())
+
+
+class LocalVectorBackend(LocalCollection, VectorBackend):
+    """Chunk records on disk plus their unit-normalized vectors in one contiguous float32 matrix.
+
+    Exact search is a single matrix-vector product and a partial sort. With quantization "scalar" (int8)
+    or "binary", the scan runs over compact codes and the best rescore_factor * k candidates are
+    rescored with the float32 vectors. With index="hnsw" (and hnswlib installed), collections of at
+    least hnsw_min_vectors rows are searched through an HNSW graph instead.
+
+    Records, vectors and HNSW files are written under a new generation number, then state.json is
+    replaced to point at it: a crash mid-write leaves the previous generation in use, never records
+    from one write next to vectors from another.
+    """
+
+    def __init__(self, path: str, index: str = None, hnsw_min_vectors: int = None, quantization: str = None,
+                 rescore_factor: int = None, flush_seconds: float = None):
+        os.makedirs(path, exist_ok=True)
+        self.directory = path
+        self.index = index or os.getenv("LOCAL_VECTOR_INDEX", "flat")
+        self.hnsw_min_vectors = hnsw_min_vectors or int(os.getenv("LOCAL_HNSW_MIN_VECTORS", 10000))
+        self.quantization = quantization or os.getenv("VECTOR_QUANTIZATION", "none")
+        self.rescore_factor = rescore_factor or int(os.getenv("RESCORE_FACTOR", 4))
+        if self.index == "hnsw" and hnswlib is None:
+            logger.warning("hnswlib is not installed, falling back to exact search.")
+            self.index = "flat"
+        state_path = os.path.join(path, "state.json")
+        state = None
+        if os.path.exists(state_path):
+            with open(state_path) as f:
+                state = json.load(f)
+        self._generation = state["generation"] if state else None  # None: files of earlier versions
+        super().__init__(self._file("records", "json"), flush_seconds)
+
+        # Row i of the matrix belongs to self._ids[i]; labels are stable ids for the HNSW graph
+        self._ids = list(self._docs)
+        self._labels = np.arange(len(self._ids), dtype=np.int64)
+        self._next_label = len(self._ids)
+        self._size = len(self._ids)
+        self._matrix = np.zeros((max(self._size, 16), 0), dtype=np.float32)
+        self._hnsw = None
+        self._row_of = None  # HNSW label -> matrix row, kept up to date on insert and rebuilt after deletes
+        vectors_path = self._file("vectors", "npy")
+        if self._size and os.path.exists(vectors_path):
+            self._matrix = np.ascontiguousarray(np.load(vectors_path), dtype=np.float32)
+            self._load_hnsw()
+        rows = len(self._matrix) if self._matrix.shape[1] else 0
+        if rows != self._size or (state and state["rows"] != self._size):
+            raise ValueError(f"Local vector store '{path}' is inconsistent: {self._size} records, {rows} vectors. "
+                             f"Re-ingest it into an empty directory.")
+        self._codes = None
+        if self.quantization != "none":
+            self._codes = QuantizedVectors(self.quantization)
+            if self._size:
+                self._codes.add(self.vectors)
+        self._unique_keys = {(doc.get("source"), doc.get("chunk_hash")) for doc in self._docs.values()}
+
+    @property
+    def vectors(self) -> np.ndarray:
+        return self._matrix[:self._size]
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def nbytes(self) -> int:
+        """Resident bytes of the search data: the float32 matrix (kept for rescoring too) plus any codes."""
+        return self._matrix.nbytes + (self._codes.nbytes if self._codes is not None else 0)
+
+    def insert_many(self, records: List[dict], ordered: bool = True):
+        """Add records with an "embedding" field. Duplicates of a stored (source, chunk_hash) are skipped."""
+        with self._lock:
+            new_records, new_vectors = [], []
+            for record in records:
+                key = (record.get("source"), record.get("chunk_hash"))
+                if key[1] is not None and key in self._unique_keys:
+                    continue
+                self._unique_keys.add(key)
+                record = dict(record)
+                vector = np.asarray(record.pop("embedding"), dtype=np.float32)
+                norm = np.linalg.norm(vector)
+                new_vectors.append(vector / norm if norm else vector)
+                record["_id"] = record.get("_id") or uuid.uuid4().hex
+                new_records.append(record)
+            if new_records:
+                self._append(new_records, np.vstack(new_vectors))
+                self.save()
+            return InsertManyResult([record["_id"] for record in new_records], True)
+
+    def _append(self, records: List[dict], vectors: np.ndarray):
+        """Grow the matrix geometrically so inserts stay amortized O(rows added)."""
+        count = len(records)
+        if self._matrix.shape[1] != vectors.shape[1]:
+            if self._size:
+                raise ValueError(f"Vector dimension {vectors.shape[1]} does not match the index ({self._matrix.shape[1]}).")
+            self._matrix = np.zeros((max(count, 16), vectors.shape[1]), dtype=np.float32)
+        if self._size + count > self._matrix.shape[0]:
+            grown = np.zeros((max(self._size + count, 2 * self._matrix.shape[0]), self._matrix.shape[1]), dtype=np.float32)
+            grown[:self._size] = self.vectors
+            self._matrix = grown
+        self._matrix[self._size:self._size + count] = vectors
+        if self._codes is not None:
+            self._codes.add(vectors)
+
+        labels = np.arange(self._next_label, self._next_label + count, dtype=np.int64)
+        self._next_label += count
+        self._labels = np.concatenate([self._labels[:self._size], labels])
+        for record in records:
+            self._docs[record["_id"]] = record
+            self._ids.append(record["_id"])
+        if self._row_of is not None:
+            self._row_of.update(zip(labels.tolist(), range(self._size, self._size + count)))
+        self._size += count
+
+        if self._hnsw is not None:
+            if self._hnsw.get_current_count() + count > self._hnsw.get_max_elements():
+                self._hnsw.resize_index(2 * (self._hnsw.get_current_count() + count))
+            self._hnsw.add_items(vectors, labels)
+
+    def _remove(self, ids: list):
+        """Compact the matrix in one pass; the HNSW graph only marks the rows deleted."""
+        if not ids:
+            return
+        removed = set(ids)
+        keep = np.fromiter((_id not in removed for _id in self._ids), dtype=bool, count=self._size)
+        if self._hnsw is not None:
+            for label in self._labels[:self._size][~keep]:
+                self._hnsw.mark_deleted(int(label))
+        for _id in ids:
+            doc = self._docs.pop(_id)
+            self._unique_keys.discard((doc.get("source"), doc.get("chunk_hash")))
+        kept = self.vectors[keep]
+        self._matrix[:len(kept)] = kept
+        if self._codes is not None:
+            self._codes.keep(keep)
+        self._labels = self._labels[:self._size][keep]
+        self._ids = [_id for _id, kept_row in zip(self._ids, keep) if kept_row]
+        self._size = len(self._ids)
+        self._row_of = None  # rows shifted
+        self.save()
+
+    def search(self, vector: List[float], k: int, pre_filter: dict = None, with_vectors: bool = False) -> List[dict]:
+        query = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm:
+            query = query / norm
+        with self._lock:
+            # Rows allowed by the filter; the similarity scan only touches these
+            allowed = None
+            if pre_filter:
+                allowed = np.fromiter((matches(self._docs[_id], pre_filter) for _id in self._ids),
+                                      dtype=bool, count=self._size).nonzero()[0]
+            candidates = self._size if allowed is None else len(allowed)
+            if not candidates:
+                return []
+            k = min(k, candidates)
+            if self.index == "hnsw" and candidates >= self.hnsw_min_vectors:
+                rows, similarities = self._search_hnsw(query, k, allowed)
+            elif self._codes is not None:
+                rows, similarities = self._search_quantized(query, k, allowed)
+            else:
+                rows, similarities = self._search_flat(query, k, allowed)
+            results = [
+                {**self._docs[self._ids[row]], "score": float((1 + similarity) / 2)}
+                for row, similarity in zip(rows, similarities)
+            ]
+            if with_vectors:
+                for result, row in zip(results, rows):
+                    result["embedding"] = self.vectors[row].copy()
+            return results
+
+    def _search_flat(self, query: np.ndarray, k: int, allowed: np.ndarray = None):
+        vectors = self.vectors if allowed is None else self.vectors[allowed]
+        similarities = vectors @ query
+        rows = self._top(similarities, k)
+        return (rows if allowed is None else allowed[rows]), similarities[rows]
+
+    def _search_quantized(self, query: np.ndarray, k: int, allowed: np.ndarray = None):
+        """First pass over the codes, then exact rescoring of the best candidates."""
+        approximate = self._codes.scores(query, allowed)
+        candidates = self._top(approximate, k * self.rescore_factor)
+        return rescore(self.vectors, query, candidates if allowed is None else allowed[candidates], k)
+
+    @staticmethod
+    def _top(scores: np.ndarray, k: int):
+        """Indexes of the k highest scores, best first."""
+        rows = np.argpartition(-scores, k - 1)[:k] if k < len(scores) else np.arange(len(scores))
+        return rows[np.argsort(-scores[rows])]
+
+    def _search_hnsw(self, query: np.ndarray, k: int, allowed: np.ndarray = None):
+        if self._hnsw is None:
+            self._build_hnsw()
+        self._hnsw.set_ef(max(k * 10, 50))
+        label_filter = None
+        if allowed is not None:
+            allowed_labels = set(self._labels[allowed].tolist())
+            label_filter = allowed_labels.__contains__
+        labels, distances = self._hnsw.knn_query(query, k=k, filter=label_filter)
+        if self._row_of is None:
+            self._row_of = {label: row for row, label in enumerate(self._labels[:self._size].tolist())}
+        return np.array([self._row_of[label] for label in labels[0].tolist()]), 1 - distances[0]
+
+    def _build_hnsw(self):
+        self._hnsw = hnswlib.Index(space="cosine", dim=self._matrix.shape[1])
+        self._hnsw.init_index(max_elements=2 * self._size, ef_construction=200, M=16, allow_replace_deleted=True)
+        self._hnsw.add_items(self.vectors, self._labels[:self._size])
+        logger.info(f"Built HNSW index over {self._size} vectors.")
+
+    def _load_hnsw(self):
+        path = self._file("hnsw", "bin")
+        if self.index != "hnsw" or not os.path.exists(path):
+            return
+        self._labels = np.load(self._file("labels", "npy"))
+        self._hnsw = hnswlib.Index(space="cosine", dim=self._matrix.shape[1])
+        self._hnsw.load_index(path, allow_replace_deleted=True)
+        # Deleted rows keep their labels in the graph, so new labels start after all of them
+        self._next_label = max(self._hnsw.get_ids_list(), default=-1) + 1
+
+    def _file(self, name: str, extension: str, generation: int = None) -> str:
+        generation = self._generation if generation is None else generation
+        suffix = "" if generation is None else f".{generation}"
+        return os.path.join(self.directory, f"{name}{suffix}.{extension}")
+
+    def _write(self):
+        """Write a new generation (records in row order, so they line up with the vectors), commit it
+        by replacing state.json, then remove the files of older generations."""
+        generation = (self._generation or 0) + 1
+        _write_atomic(self._file("records", "json", generation), self._dump)
+        _write_atomic(self._file("vectors", "npy", generation), lambda f: np.save(f, self.vectors))
+        if self._hnsw is not None:
+            _write_atomic(self._file("labels", "npy", generation), lambda f: np.save(f, self._labels[:self._size]))
+            self._hnsw.save_index(self._file("hnsw", "bin", generation))
+        state = {"generation": generation, "rows": self._size}
+        _write_atomic(os.path.join(self.directory, "state.json"), lambda f: f.write(json.dumps(state).encode()))
+        self._generation = generation
+        self.path = self._file("records", "json")
+
+        current = {self._file(name, extension) for name, extension in
+                   (("records", "json"), ("vectors", "npy"), ("labels", "npy"), ("hnsw", "bin"))}
+        for pattern in ("records*.json", "vectors*.npy", "labels*.npy", "hnsw*.bin", "*.tmp"):
+            for stale in glob.glob(os.path.join(glob.escape(self.directory), pattern)):
+                if stale not in current:
+                    os.remove(stale)
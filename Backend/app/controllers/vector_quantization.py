@@ -0,0 +1,91 @@
+"""
+QUANTIZED VECTOR CODES FOR A FIRST-PASS SCAN
+- SCALAR: INT8 PER COMPONENT WITH ONE FLOAT32 SCALE PER VECTOR (4X SMALLER THAN FLOAT32)
+- BINARY: ONE SIGN BIT PER COMPONENT, HAMMING DISTANCE (32X SMALLER)
+- CANDIDATES FROM THE CODES ARE RESCORED WITH THE FULL-PRECISION VECTORS
+"""
+import numpy as np
+
+# Constants of the bit-parallel popcount over 64-bit words
+_M1, _M2, _M4 = np.uint64(0x5555555555555555), np.uint64(0x3333333333333333), np.uint64(0x0F0F0F0F0F0F0F0F)
+_H01 = np.uint64(0x0101010101010101)
+
+QUANTIZATION_MODES = ("none", "scalar", "binary")
+
+
+class QuantizedVectors:
+    """Codes for the rows of a vector matrix, kept row-aligned with it."""
+
+    def __init__(self, mode: str, block_rows: int = 8192):
+        if mode not in ("scalar", "binary"):
+            raise ValueError(f"Unsupported quantization: {mode}")
+        self.mode = mode
+        self.block_rows = block_rows  # bounds the float32 scratch space of a scalar scan
+        self.codes = None
+        self.scales = np.zeros(0, dtype=np.float32)
+
+    def __len__(self):
+        return 0 if self.codes is None else len(self.codes)
+
+    @property
+    def nbytes(self):
+        return (0 if self.codes is None else self.codes.nbytes) + self.scales.nbytes
+
+    def encode(self, vectors: np.ndarray):
+        if self.mode == "binary":
+            return self.pack_signs(vectors), np.zeros(0, dtype=np.float32)
+        peaks = np.abs(vectors).max(axis=1)
+        peaks[peaks == 0] = 1.0
+        codes = np.round(vectors / peaks[:, None] * 127).astype(np.int8)
+        return codes, (peaks / 127).astype(np.float32)
+
+    def add(self, vectors: np.ndarray):
+        codes, scales = self.encode(vectors)
+        self.codes = codes if self.codes is None else np.concatenate([self.codes, codes])
+        self.scales = np.concatenate([self.scales, scales])
+
+    def keep(self, mask: np.ndarray):
+        """Drop the rows deleted from the vector matrix."""
+        if self.codes is not None:
+            self.codes = self.codes[mask]
+            if self.mode == "scalar":
+                self.scales = self.scales[mask]
+
+    def scores(self, query: np.ndarray, rows: np.ndarray = None) -> np.ndarray:
+        """Approximate similarity of the query to every row (or the given rows); higher is closer."""
+        codes = self.codes if rows is None else self.codes[rows]
+        if self.mode == "binary":
+            differing = np.bitwise_xor(codes, self.pack_signs(query[None, :]))
+            return -popcount(differing).sum(axis=1, dtype=np.int32)
+
+        scales = self.scales if rows is None else self.scales[rows]
+        scores = np.empty(len(codes), dtype=np.float32)
+        for start in range(0, len(codes), self.block_rows):
+            block = slice(start, start + self.block_rows)
+            scores[block] = codes[block].astype(np.float32) @ query
+        return scores * scales
+
+
+    @staticmethod
+    def pack_signs(vectors: np.ndarray) -> np.ndarray:
+        """One bit per component, packed into 64-bit words (padded with zero bits)."""
+        bits = np.packbits(vectors > 0, axis=1)
+        padding = -bits.shape[1] % 8
+        if padding:
+            bits = np.pad(bits, ((0, 0), (0, padding)))
+        return np.ascontiguousarray(bits).view(np.uint64)
+
+
+def popcount(words: np.ndarray) -> np.ndarray:
+    """Set bits per 64-bit word (SWAR), without a per-byte lookup table."""
+    words = words - ((words >> np.uint64(1)) & _M1)
+    words = (words & _M2) + ((words >> np.uint64(2)) & _M2)
+    words = (words + (words >> np.uint64(4))) & _M4
+    return (words * _H01) >> np.uint64(56)
+
+
+def rescore(vectors: np.ndarray, query: np.ndarray, candidates: np.ndarray, k: int):
+    """Exact similarities for the candidate rows; returns the best k as (rows, similarities)."""
+    similarities = vectors[candidates] @ query
+    order = np.argsort(-similarities)[:k]
+    return candidates[order], similarities[order]
@@ -5,125 +5,686 @@ CUSTOM CLASS TO PERFORM OPERATIONS ON VECTOR STORE
 - QUERY SEARCH
 """
 import os
+import time
+import asyncio
+import hashlib
 import logging
+import threading
+from contextlib import ExitStack
 from datetime import datetime, timezone
 from dotenv import load_dotenv
-from typing import List, Literal
+from typing import Callable, List, Literal, Optional
+from urllib.parse import unquote, urlparse
 
-from langchain_openai import AzureOpenAIEmbeddings
-from langchain_experimental.text_splitter import SemanticChunker
-from langchain_community.document_loaders import BSHTMLLoader, PyPDFLoader, WebBaseLoader
-from langchain_mongodb.vectorstores import MongoDBAtlasVectorSearch
+import requests
+from bs4 import BeautifulSoup
 from langchain_core.documents import Document
-from pymongo.errors import DuplicateKeyError
+from bson.binary import Binary, BinaryVectorDtype
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 from pymongo.operations import SearchIndexModel
 
-from pymongo.mongo_client import MongoClient
-from pymongo.server_api import ServerApi
+from .client_registry import clients
+from .embedding_batcher import BatchEmbedder
+from .dimension_reduction import DimensionReducer, ReducedEmbeddings
+from .embedding_cache import CachedEmbeddings
+from .ingestion_pipeline import IngestionPipeline, SourceTask, Stage
+from .lexical_index import BM25Index, reciprocal_rank_fusion
+from .metrics import metrics
+from .vector_backends import (AtlasVectorBackend, LocalCollection, LocalVectorBackend, atlas_index_definition,
+                              matches, open_local, to_array)
 
 load_dotenv()  # Load environment variables
 
+# Metadata fields declared as filter fields in the vector search index
+FILTER_FIELDS = ["source", "content_type", "upload_date", "tags"]
+
+# (database, collection, search index) whose indexes were already checked by this process
+_ensured_indexes = set()
+_ensured_indexes_lock = threading.Lock()
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class VectorStoreController:
-    def __init__(self, database_name=None, collection_name=None, search_index_name=None):
-        """Initialize the vector store controller."""
+    def __init__(self, database_name=None, collection_name=None, search_index_name=None, backend=None,
+                 create_indexes=True):
+        """Initialize the vector store controller.
+
+        backend is "atlas" (MongoDB Atlas Vector Search) or "local" (in-process index persisted
+        under LOCAL_VECTOR_PATH, no database needed); it defaults to the VECTOR_BACKEND variable.
+        With create_indexes=False the caller runs ensure_indexes() itself (e.g. in the background).
+        """
         # Environment variables
         self.database_name = database_name or os.getenv("DB_NAME")
         self.collection_name = collection_name or os.getenv("QC_COLLECTION")
         self.search_index_name = search_index_name or os.getenv("SEARCH_INDEX_NAME")
         self.unique_index_name = "unique_source_text_index"
+        self.chunk_hash_index_name = "unique_source_chunk_hash_index"
 
-        # MongoDB setup
-        self.client = MongoClient(os.getenv("MONGODB_URI"), server_api=ServerApi('1'))
-        self.db = self.client[self.database_name]
-        self.collection = self.db[self.collection_name]
+        self.backend_type = backend or os.getenv("VECTOR_BACKEND", "atlas")
+        # "array" stores embeddings as BSON arrays of doubles, "float32" as packed binary vectors (~4x smaller)
+        self.vector_storage = os.getenv("VECTOR_STORAGE", "array")
+        # "scalar" (int8) or "binary" quantized index; results are rescored with the full-precision vectors
+        self.vector_quantization = os.getenv("VECTOR_QUANTIZATION", "none")
+        rescore_factor = int(os.getenv("RESCORE_FACTOR", 4)) if self.vector_quantization != "none" else 0
+        if self.backend_type == "local":
+            # Same collections as below, kept in files next to the in-process vector index (one instance
+            # per path, shared with every other controller of the process)
+            local_path = os.getenv("LOCAL_VECTOR_PATH", "local_vector_store")
+            self.client = None
+            self.collection = open_local(LocalVectorBackend, os.path.join(local_path, self.collection_name))
+            self.meta_collection = open_local(LocalCollection, os.path.join(local_path, "kb_meta.json"))
+            self.manifest_collection = open_local(LocalCollection,
+                                                  os.path.join(local_path, f"{self.collection_name}_manifest.json"))
+            self.backend = self.collection
+        else:
+            # MongoDB setup: one pooled client per process, shared by every knowledge base
+            self.client = clients.mongo_client()
+            self.db = self.client[self.database_name]
+            self.collection = self.db[self.collection_name]
+            self.meta_collection = self.db["kb_meta"]  # one version counter per knowledge base collection
+            # Per-source content hash and chunk hashes, so unchanged sources are never re-embedded
+            self.manifest_collection = self.db[f"{self.collection_name}_manifest"]
+            self.backend = AtlasVectorBackend(self.collection, self.search_index_name, self.get_async_collection,
+                                              rescore_factor)
+        self.kb_version_refresh_seconds = float(os.getenv("KB_VERSION_REFRESH_SECONDS", 5))
+        self._kb_version = None
+        self._kb_version_checked = 0.0
 
-        # Embeddings model
-        self.embeddings_model = AzureOpenAIEmbeddings(
+        # Embeddings model (shared with every controller using the same endpoint)
+        self.embeddings_model = clients.embeddings(
             azure_endpoint=os.getenv("AZURE_OPENAI_EMBEDDING_ENDPOINT")
         )
+        # EMBEDDING_DIMENSIONS / DIMENSION_REDUCTION: chunks are reduced on write, queries when embedded
+        self.reducer = DimensionReducer()
+        self.embedding_model_name = (getattr(self.embeddings_model, "deployment", None)
+                                     or getattr(self.embeddings_model, "model", None))
+        # Repeated questions reuse their query embedding instead of calling the API again
+        self.query_embeddings = CachedEmbeddings(ReducedEmbeddings(self.embeddings_model, self.reducer),
+                                                 namespace=self.reducer.cache_namespace(self.embedding_model_name))
+        self.batch_embedder = BatchEmbedder(self.embeddings_model)
 
-        # Vector store
-        self.vector_store = MongoDBAtlasVectorSearch(
-            collection=self.collection,
-            embedding=self.embeddings_model,
-            index_name=self.search_index_name,
-            relevance_score_fn="cosine"
-        )
+        # Semantic chunker, built once on first ingestion. In "exact" mode (default) every chunk is embedded
+        # on insert; "reuse" takes chunk vectors from the chunker's sentence-window embeddings instead (a
+        # mean of windows for most chunks: fewer embedding calls, slightly different vectors)
+        self.chunk_embedding_mode = os.getenv("CHUNK_EMBEDDING_MODE", "exact")
+        if self.chunk_embedding_mode == "embed":  # earlier name of "exact"
+            self.chunk_embedding_mode = "exact"
+        self._text_splitter = None
+        self._text_splitter_lock = threading.Lock()
 
-        # Ensure indices exist
-        self.create_unique_index()
-        self.create_vector_search_index()
+        # Search mode: "vector" (dense only) or "hybrid" (dense + BM25, fused with reciprocal rank fusion)
+        self.search_mode = os.getenv("SEARCH_MODE", "vector")
+        self.hybrid_candidates = int(os.getenv("HYBRID_CANDIDATES", 20))  # depth of each leg before fusion
+        self.rrf_k = int(os.getenv("RRF_K", 60))
+        # BM25 index over the chunk texts (hybrid search only), rebuilt in the background whenever the
+        # knowledge base version changes; queries keep using the previous index until it is ready
+        self.lexical_index = BM25Index()
+        self._lexical_version = None
+        self._lexical_lock = threading.Lock()
+        self._lexical_refreshing = False
+        self.search_latency = {}  # leg -> count, total and last milliseconds
+        self._latency_lock = threading.Lock()
 
-    def vector_search(self, query: str, top_k: int = 3):
-        """Perform vector search using the query."""
+        # Ensure indices exist (the local backend needs none)
+        if create_indexes:
+            self.ensure_indexes()
+        if self.search_mode == "hybrid":
+            self.schedule_lexical_refresh()
+
+    @property
+    def text_splitter(self):
+        """The semantic chunker; langchain_experimental is only imported when something is ingested."""
+        if self._text_splitter is None:
+            with self._text_splitter_lock:
+                if self._text_splitter is None:
+                    from .semantic_chunker import ReusingSemanticChunker
+                    self._text_splitter = ReusingSemanticChunker(
+                        embeddings=self.embeddings_model,
+                        breakpoint_threshold_amount=95
+                    )
+        return self._text_splitter
+
+    def ensure_indexes(self):
+        """Create missing indexes, checked once per process and collection (each check is an Atlas round-trip)."""
+        if self.backend_type == "local":
+            return
+        key = (self.database_name, self.collection_name, self.search_index_name)
+        with _ensured_indexes_lock:
+            if key in _ensured_indexes:
+                return
+            _ensured_indexes.add(key)
+        start = time.perf_counter()
         try:
-            results = self.vector_store.similarity_search(query, k=top_k)
+            self.create_unique_index()
+            self.create_secondary_indexes()
+            self.create_vector_search_index()
+            logger.info(f"Indexes of '{self.collection_name}' checked in {time.perf_counter() - start:.2f}s.")
+        except Exception as e:
+            logger.error(f"Error checking indexes of '{self.collection_name}': {e}")
+            with _ensured_indexes_lock:
+                _ensured_indexes.discard(key)  # try again on the next call
+
+    def vector_search(self, query: str, top_k: int = 3, mode: str = None, filters: dict = None,
+                      with_vectors: bool = False, raise_errors: bool = False):
+        """Perform vector search using the query. mode overrides SEARCH_MODE ("vector" or "hybrid").
+
+        filters restricts the search to matching chunks, see build_filter() for the keys. with_vectors
+        keeps the chunk embeddings in the metadata ("embedding"), e.g. for MMR selection. A failed search
+        returns no results, or raises with raise_errors (after logging and counting the error either way).
+        """
+        try:
+            pre_filter = self.build_filter(**(filters or {}))
+            start = time.perf_counter()
+            query_embedding = self.query_embeddings.embed_query(query)
+            self.record_latency("embed", start)
+            if (mode or self.search_mode) == "hybrid":
+                results = self.hybrid_search(query, query_embedding, top_k, pre_filter, with_vectors)
+            else:
+                start = time.perf_counter()
+                dense = self.backend.search(query_embedding, top_k, pre_filter, with_vectors)
+                results = [self.to_document(result) for result in dense]
+                self.record_latency("vector", start)
             logger.info(f"Vector search completed. Results: {len(results)} documents found.")
             return results
         except Exception as e:
+            # Degrades to an answer without context, but still counted in chatbot_errors_total
             logger.error(f"Error during vector search: {e}")
+            metrics.record_error("vector_search", e)
+            if raise_errors:
+                raise
+            return []
+
+    def relevance_score(self, query: str, filters: dict = None):
+        """Return the relevance score of the best matching chunk, 0.0 when nothing matches (no search needed)
+        or None if the search failed (the router then asks the LLM)."""
+        try:
+            results = self.backend.search(self.query_embeddings.embed_query(query), 1, self.build_filter(**(filters or {})))
+            return results[0]["score"] if results else 0.0
+        except Exception as e:
+            logger.error(f"Error during relevance scoring: {e}")
+            metrics.record_error("relevance_score", e)
+            return None
+
+    async def arelevance_score(self, query: str, filters: dict = None):
+        """Async variant of relevance_score(): 0.0 when nothing matches, None only when the search failed."""
+        try:
+            vector = await self.query_embeddings.aembed_query(query)
+            results = await self.backend.asearch(vector, 1, self.build_filter(**(filters or {})))
+            return results[0]["score"] if results else 0.0
+        except Exception as e:
+            logger.error(f"Error during relevance scoring: {e}")
+            metrics.record_error("relevance_score", e)
+            return None
+
+    async def avector_search(self, query: str, top_k: int = 3, mode: str = None, filters: dict = None,
+                             with_vectors: bool = False, raise_errors: bool = False):
+        """Async vector search: async embedding call and async Mongo driver (or the local index), no blocked threads."""
+        try:
+            pre_filter = self.build_filter(**(filters or {}))
+            start = time.perf_counter()
+            query_embedding = await self.query_embeddings.aembed_query(query)
+            self.record_latency("embed", start)
+            hybrid = (mode or self.search_mode) == "hybrid"
+            start = time.perf_counter()
+            depth = max(top_k, self.hybrid_candidates) if hybrid else top_k
+            dense = await self.backend.asearch(query_embedding, depth, pre_filter, with_vectors)
+            self.record_latency("vector", start)
+            if hybrid:
+                results = self.fuse(query, dense, top_k, pre_filter, await self.aget_kb_version())
+            else:
+                results = [self.to_document(result) for result in dense]
+            logger.info(f"Async vector search completed. Results: {len(results)} documents found.")
+            return results
+        except Exception as e:
+            logger.error(f"Error during async vector search: {e}")
+            metrics.record_error("vector_search", e)
+            if raise_errors:
+                raise
             return []
 
-    def insert_data(self, sources: List[str], sources_type: Literal['html', 'url', 'pdf']):
-        """Insert data into the vector store from various sources."""
-        docs = []
-        for source in sources:
+    def hybrid_search(self, query: str, query_embedding: List[float], top_k: int, pre_filter: dict = None,
+                      with_vectors: bool = False):
+        """Dense and BM25 legs, each ranked to HYBRID_CANDIDATES deep, fused with reciprocal rank fusion."""
+        start = time.perf_counter()
+        dense = self.backend.search(query_embedding, max(top_k, self.hybrid_candidates), pre_filter, with_vectors)
+        self.record_latency("vector", start)
+        return self.fuse(query, dense, top_k, pre_filter)
+
+    def fuse(self, query: str, dense: List[dict], top_k: int, pre_filter: dict = None, kb_version: int = None):
+        """Run the lexical leg and fuse it with the dense results into the top_k Documents.
+
+        Each Document's score is its fused score; vector_score and lexical_score keep the leg scores.
+        """
+        start = time.perf_counter()
+        predicate = (lambda record: matches(record, pre_filter)) if pre_filter else None
+        lexical = self.get_lexical_index(kb_version).search(query, max(top_k, self.hybrid_candidates), predicate)
+        self.record_latency("lexical", start)
+
+        start = time.perf_counter()
+        records, vector_scores, lexical_scores = {}, {}, {}
+        for record in dense:
+            key = str(record["_id"])
+            records[key], vector_scores[key] = record, record.get("score")
+        for record, score in lexical:
+            key = str(record["_id"])
+            records.setdefault(key, record)
+            lexical_scores[key] = score
+        fused = reciprocal_rank_fusion([list(vector_scores), list(lexical_scores)], k=self.rrf_k)
+
+        results = []
+        for key, score in list(fused.items())[:top_k]:
+            result = {**records[key], "score": score}
+            result["vector_score"] = vector_scores.get(key)
+            result["lexical_score"] = lexical_scores.get(key)
+            results.append(self.to_document(result))
+        self.record_latency("fusion", start)
+        return results
+
+    @staticmethod
+    def build_filter(sources: List[str] = None, content_types: List[str] = None, tags: List[str] = None,
+                     date_from: datetime = None, date_to: datetime = None):
+        """Translate filter arguments into a pre-filter on the index's filter fields (None when unfiltered).
+
+        content_types are source types ('html', 'url', 'pdf'); a chunk matches tags if it has any of them;
+        the upload date range is [date_from, date_to).
+        """
+        conditions = []
+        if sources:
+            conditions.append({"source": {"$in": list(sources)}})
+        if content_types:
+            conditions.append({"content_type": {"$in": list(content_types)}})
+        if tags:
+            conditions.append({"tags": {"$in": list(tags)}})
+        if date_from or date_to:
+            date_range = {}
+            if date_from:
+                date_range["$gte"] = date_from
+            if date_to:
+                date_range["$lt"] = date_to
+            conditions.append({"upload_date": date_range})
+        if not conditions:
+            return None
+        return conditions[0] if len(conditions) == 1 else {"$and": conditions}
+
+    def get_lexical_index(self, kb_version: int = None):
+        """Return the BM25 index. When the knowledge base version moved, a rebuild starts in the background
+        and the current index keeps answering (the dense leg alone until the first build is done)."""
+        version = self.get_kb_version() if kb_version is None else kb_version
+        if version != self._lexical_version:
+            self.schedule_lexical_refresh()
+        return self.lexical_index
+
+    def schedule_lexical_refresh(self):
+        """Rebuild the BM25 index in a background thread, one rebuild at a time."""
+        with self._lexical_lock:
+            if self._lexical_refreshing:
+                return
+            self._lexical_refreshing = True
+
+        def refresh():
             try:
-                if sources_type == 'html':
-                    data = self.extract_from_html_doc(source)
-                elif sources_type == 'url':
-                    data = self.extract_from_url(source)
-                elif sources_type == 'pdf':
-                    data = self.extract_from_pdf(source)
-                else:
-                    logger.warning(f"Unsupported source type: {sources_type}")
-                    continue
-
-                for doc in data:
-                    doc.page_content = self.sanitize_text(doc.page_content)
-                    text_splitter = SemanticChunker(
-                        embeddings=self.embeddings_model,
-                        breakpoint_threshold_amount=95
-                    )
-                    chunks = text_splitter.split_documents([doc])
-                    meta_data = doc.metadata
-                    self.add_docs_to_mongo(chunks, meta_data)
-            except Exception as e:
-                logger.error(f"Error processing source '{source}': {e}")
+                self.refresh_lexical_index()
+            finally:
+                with self._lexical_lock:
+                    self._lexical_refreshing = False
+
+        threading.Thread(target=refresh, name="lexical-index", daemon=True).start()
+
+    def refresh_lexical_index(self):
+        """Rebuild the BM25 index over all chunks of the collection (blocking, see schedule_lexical_refresh)."""
+        start = time.perf_counter()
+        version = self.get_kb_version()  # read first: a change during the scan triggers another rebuild
+        try:
+            records = list(self.collection.find({}, {"embedding": 0}))
+        except Exception as e:
+            logger.error(f"Error loading chunks for the lexical index: {e}")
+            return
+        lexical_index = BM25Index()
+        lexical_index.build(records)
+        self.lexical_index = lexical_index
+        self._lexical_version = version
+        logger.info(f"Lexical index built over {len(records)} chunks in {time.perf_counter() - start:.2f}s.")
+
+    def record_latency(self, leg: str, start: float):
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        with self._latency_lock:
+            latency = self.search_latency.setdefault(leg, {"count": 0, "total_ms": 0.0, "last_ms": 0.0})
+            latency["count"] += 1
+            latency["total_ms"] += elapsed_ms
+            latency["last_ms"] = elapsed_ms
+
+    def search_stats(self):
+        """Latency of each search leg (embed, vector, lexical, fusion) and the lexical index size."""
+        with self._latency_lock:
+            legs = {
+                leg: {
+                    "count": latency["count"],
+                    "avg_ms": round(latency["total_ms"] / latency["count"], 3),
+                    "last_ms": round(latency["last_ms"], 3),
+                }
+                for leg, latency in self.search_latency.items()
+            }
+        return {"mode": self.search_mode, "lexical_chunks": len(self.lexical_index), "legs": legs}
+
+    def get_async_collection(self):
+        """Collection on the shared async Mongo client of the running event loop (opened on first use)."""
+        return clients.async_mongo_client()[self.database_name][self.collection_name]
+
+    @staticmethod
+    def to_document(result: dict):
+        """Convert a raw vector store record into a Document, like MongoDBAtlasVectorSearch does."""
+        result = dict(result)
+        text = result.pop("text", "")
+        result["_id"] = str(result["_id"])
+        if "embedding" in result:
+            result["embedding"] = to_array(result["embedding"])
+        return Document(page_content=text, metadata=result)
+
+    def insert_data(self, sources: List[str], sources_type: Literal['html', 'url', 'pdf'], checkpoint_path: str = None,
+                    tags: List[str] = None, progress: Callable = None, cancel_event: threading.Event = None,
+                    run_id: str = None):
+        """Insert data into the vector store from various sources.
+
+        Sources flow through a staged pipeline (fetch -> parse -> chunk -> embed -> write), each stage
+        with its own workers, so network fetches and embedding calls overlap with parsing and chunking.
+        With a checkpoint path (one file per run_id, removed when the run finishes), a crashed run resumes
+        without redoing finished sources when it is started again with the same run_id. progress and
+        cancel_event are passed to the pipeline (see IngestionPipeline).
+        """
+        start = time.perf_counter()
+        pipeline = IngestionPipeline(
+            [
+                Stage("fetch", self.fetch_source, workers=int(os.getenv("INGEST_FETCH_WORKERS", 8))),
+                Stage("parse", self.parse_source, workers=int(os.getenv("INGEST_PARSE_WORKERS", 2))),
+                Stage("chunk", self.chunk_source, workers=int(os.getenv("INGEST_CHUNK_WORKERS", 4))),
+                Stage("embed", self.embed_sources, workers=int(os.getenv("INGEST_EMBED_WORKERS", 2)),
+                      batch_size=int(os.getenv("INGEST_EMBED_SOURCES_PER_BATCH", 8))),
+                Stage("write", self.write_source, workers=int(os.getenv("INGEST_WRITE_WORKERS", 2))),
+            ],
+            checkpoint_path=checkpoint_path or os.getenv("INGEST_CHECKPOINT_PATH"),
+            progress=progress,
+            cancel_event=cancel_event,
+            run_id=run_id,
+        )
+        with ExitStack() as batched:
+            if self.backend_type == "local":
+                # Rewrite the local files every few seconds and once at the end, not after every source
+                batched.enter_context(self.collection.deferred_writes())
+                batched.enter_context(self.manifest_collection.deferred_writes())
+            completed = pipeline.run(SourceTask(source, sources_type, tags) for source in sources)
+
+        elapsed = time.perf_counter() - start
+        chunks = sum(len(task.chunks) for task in completed)
+        summary = {
+            "sources": len(sources),
+            "completed": len(completed),
+            "failed": pipeline.failed,
+            "cancelled": len(pipeline.cancelled),
+            "unchanged": sum(1 for task in completed if task.unchanged),
+            "chunks": chunks,
+            "inserted": sum(task.inserted for task in completed),
+            "removed": sum(len(task.removed_hashes) for task in completed),
+            "seconds": round(elapsed, 2),
+            "chunks_per_sec": round(chunks / elapsed, 2) if elapsed else 0.0,
+            "stage_seconds": {name: round(seconds, 2) for name, seconds in pipeline.stage_seconds.items()},
+        }
+        if (summary["inserted"] or summary["removed"]) and self.search_mode == "hybrid":
+            self.schedule_lexical_refresh()
+        logger.info(f"Ingestion finished: {summary}")
+        return summary
+
+    def load_source(self, source: str, sources_type: str) -> List[Document]:
+        """Load the raw documents of one source."""
+        return self.parse_source(self.fetch_source(SourceTask(source, sources_type))).documents
+
+    def fetch_source(self, task: SourceTask):
+        """I/O stage: download the page or read the file."""
+        if task.source_type == 'url':
+            headers = {"User-Agent": os.getenv("USER_AGENT")}
+            response = requests.get(task.source, headers=headers, timeout=30)
+            response.raise_for_status()
+            task.raw = response.text
+        elif task.source_type == 'html':
+            with open(task.source, "r") as f:
+                task.raw = f.read()
+        elif task.source_type != 'pdf':  # PDFs are read by the parser itself
+            raise ValueError(f"Unsupported source type: {task.source_type}")
+        return task
+
+    def parse_source(self, task: SourceTask):
+        """CPU stage: turn the fetched content into documents (same text and metadata as the LangChain loaders)."""
+        if task.source_type == 'pdf':
+            from langchain_community.document_loaders import PyPDFLoader  # slow import, only needed for PDFs
+            task.documents = PyPDFLoader(task.source).load_and_split()
+            blob_name = self.blob_name_of(task.source)
+            if blob_name:
+                for doc in task.documents:
+                    doc.metadata["blob_name"] = blob_name
+        elif task.source_type == 'url':
+            soup = BeautifulSoup(task.raw, "html.parser")
+            metadata = {"source": task.source}
+            if title := soup.find("title"):
+                metadata["title"] = title.get_text()
+            if description := soup.find("meta", attrs={"name": "description"}):
+                metadata["description"] = description.get("content", "No description found.")
+            if html := soup.find("html"):
+                metadata["language"] = html.get("lang", "No language found.")
+            task.documents = [Document(page_content=soup.get_text(), metadata=metadata)]
+        else:
+            soup = BeautifulSoup(task.raw, "lxml")
+            title = str(soup.title.string) if soup.title else ""
+            task.documents = [Document(page_content=soup.get_text(""), metadata={"source": task.source, "title": title})]
+        task.raw = None  # free the raw page as soon as it is parsed
+        for doc in task.documents:
+            doc.metadata["content_type"] = task.source_type
+            if task.tags:
+                doc.metadata["tags"] = list(task.tags)
+        return task
+
+    def chunk_source(self, task: SourceTask):
+        """Chunk stage: semantic chunks (and reusable vectors) for every document of the source.
+
+        Sources whose content hash matches the manifest stop here, before any embedding. For changed
+        sources only chunks that are not stored yet continue; chunks that disappeared are removed on write.
+        """
+        task.content_hash = self.content_hash("\n".join(doc.page_content for doc in task.documents))
+        manifest = self.manifest_collection.find_one({"_id": task.source}) or {}
+        same_embeddings = manifest.get("embedding_config") == self.embedding_config()
+        if same_embeddings and manifest.get("content_hash") == task.content_hash:
+            task.unchanged = True
+            task.documents = []
+            return task
+
+        stored_hashes = set(manifest.get("chunk_hashes", []))
+        if not same_embeddings:
+            # Vectors written with another model, size or format: replace every chunk of the source
+            task.removed_hashes = list(stored_hashes)
+            stored_hashes = set()
+        for doc in task.documents:
+            chunks, vectors = self.chunk_document(doc)
+            for chunk, vector in zip(chunks, vectors):
+                chunk_hash = chunk.metadata["chunk_hash"]
+                if chunk_hash in task.chunk_hashes:
+                    continue  # same text twice in one source
+                task.chunk_hashes.append(chunk_hash)
+                if chunk_hash not in stored_hashes:
+                    task.chunks.append(chunk)
+                    task.vectors.append(vector)
+        task.removed_hashes += list(stored_hashes - set(task.chunk_hashes))
+        task.documents = []
+        return task
+
+    def embedding_config(self):
+        """Everything that decides what a stored chunk vector looks like; recorded per source in the manifest."""
+        return (f"{self.embedding_model_name}:{self.reducer.method}{self.reducer.dimensions}:"
+                f"{self.chunk_embedding_mode}:{self.vector_storage}")
+
+    def embed_sources(self, tasks: List[SourceTask]):
+        """Embed stage: embed the chunks still missing a vector, across several sources in one go."""
+        missing = [(task, i) for task in tasks for i, vector in enumerate(task.vectors) if vector is None]
+        if missing:
+            vectors = self.batch_embedder.embed([task.chunks[i].page_content for task, i in missing])
+            for (task, i), vector in zip(missing, vectors):
+                task.vectors[i] = vector
+        return tasks
+
+    def write_source(self, task: SourceTask):
+        """Write stage: store new chunks, drop stale ones and record the source in the manifest."""
+        if task.unchanged:
+            return task
+
+        # Stale chunks, plus chunks written before the manifest existed (they have no hash). Removed
+        # before inserting: a new chunk with the text of a hash-less one would otherwise be rejected
+        # by the unique (source, text) index, and the delete would then take the content with it.
+        result = self.collection.delete_many({
+            "source": task.source,
+            "$or": [{"chunk_hash": {"$in": task.removed_hashes}}, {"chunk_hash": {"$exists": False}}],
+        })
+        if result.deleted_count:
+            logger.info(f"Removed {result.deleted_count} outdated chunks of '{task.source}'.")
+            self.bump_kb_version()
+
+        if task.chunks:
+            # Raises unless every chunk is stored: the source then fails and keeps its old manifest
+            # entry, so the next run sees changed content and writes the missing chunks again
+            task.inserted = self.write_chunks(task.chunks, task.vectors)
+
+        self.manifest_collection.replace_one(
+            {"_id": task.source},
+            {
+                "content_hash": task.content_hash,
+                "chunk_hashes": task.chunk_hashes,
+                "embedding_config": self.embedding_config(),
+                "source_type": task.source_type,
+                "updated_at": datetime.now(timezone.utc),
+            },
+            upsert=True,
+        )
+        return task
+
+    @staticmethod
+    def blob_name_of(source: str):
+        """Return the blob name if the source is an Azure Storage blob URL, else None."""
+        url = urlparse(source)
+        if not url.netloc.endswith(".blob.core.windows.net"):
+            return None
+        parts = url.path.lstrip("/").split("/", 1)  # container/blob
+        return unquote(parts[1]) if len(parts) == 2 else None
+
+    @staticmethod
+    def content_hash(text: str):
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def chunk_document(self, doc: Document):
+        """Sanitize and semantically chunk one loaded document.
+
+        Returns the chunks and their precomputed vectors (None where a chunk still needs embedding).
+        """
+        doc.page_content = self.sanitize_text(doc.page_content)
+        chunks = self.text_splitter.split_text_with_embeddings(doc.page_content)
+        documents = self.prepare_documents([Document(page_content=text) for text, _ in chunks], doc.metadata)
+        if self.chunk_embedding_mode == "reuse":
+            return documents, [vector for _, vector in chunks]
+        return documents, [None] * len(documents)
+
+    def prepare_documents(self, docs: List[Document], meta_data: dict) -> List[Document]:
+        """Attach chunk ids, upload date and source metadata to chunks."""
+        return [
+            Document(
+                page_content=doc.page_content,
+                metadata={
+                    "chunk_id": i + 1,
+                    "chunk_hash": self.content_hash(doc.page_content),
+                    "upload_date": datetime.now(timezone.utc),
+                    **meta_data
+                }
+            )
+            for i, doc in enumerate(docs)
+        ]
 
     def add_docs_to_mongo(self, docs: List[Document], meta_data: dict):
         """Add documents to the MongoDB vector store."""
+        return self.embed_and_write(self.prepare_documents(docs, meta_data))
+
+    def embed_and_write(self, documents: List[Document], vectors: List[Optional[List[float]]] = None):
+        """Embed chunks in batches and write them to the vector store. Returns the number inserted.
+
+        Precomputed vectors are written as they are; only chunks without one are embedded.
+        """
+        if not documents:
+            return 0
+        vectors = list(vectors or [None] * len(documents))
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
         try:
-            documents = [
-                Document(
-                    page_content=doc.page_content,
-                    metadata={"chunk_id": i + 1, "upload_date": datetime.now(timezone.utc), **meta_data}
-                )
-                for i, doc in enumerate(docs)
-            ]
-            self.vector_store.add_documents(documents)
-            logger.info(f"Successfully added {len(documents)} documents to the vector store.")
-        except DuplicateKeyError as e:
-            logger.warning(f"Duplicate document skipped: {e}")
+            for i, vector in zip(missing, self.batch_embedder.embed([documents[i].page_content for i in missing])):
+                vectors[i] = vector
+        except Exception as e:
+            logger.error(f"Error embedding documents: {e}")
+            return 0
+        logger.info(f"Reused {len(documents) - len(missing)} of {len(documents)} chunk embeddings.")
+        try:
+            return self.write_chunks(documents, vectors)
         except Exception as e:
             logger.error(f"Error adding documents to MongoDB: {e}")
+            return 0
+
+    def write_chunks(self, documents: List[Document], vectors: List[List[float]]):
+        """Write embedded chunks in the same layout MongoDBAtlasVectorSearch uses (text, embedding, metadata).
+
+        Returns the number inserted. Duplicates of stored chunks are skipped; any other write error is raised.
+        """
+        records = [
+            {"text": doc.page_content, "embedding": self.pack_vector(vector.tolist()), **doc.metadata}
+            for doc, vector in zip(documents, self.reducer.reduce(vectors))
+        ]
+        try:
+            inserted = len(self.collection.insert_many(records, ordered=False).inserted_ids)
+        except BulkWriteError as e:
+            inserted = e.details.get("nInserted", 0)
+            duplicates = sum(1 for error in e.details.get("writeErrors", []) if error.get("code") == 11000)
+            if duplicates:
+                logger.warning(f"Duplicate documents skipped: {duplicates}")
+            if duplicates < len(e.details.get("writeErrors", [])):
+                if inserted:
+                    self.bump_kb_version()
+                raise
+
+        logger.info(f"Successfully added {inserted} documents to the vector store.")
+        if inserted:
+            self.bump_kb_version()
+        return inserted
+
+    def pack_vector(self, vector: List[float]):
+        """Vector in the configured storage format (the local backend keeps its own float32 matrix)."""
+        if self.vector_storage == "float32" and self.backend_type != "local":
+            return Binary.from_vector([float(value) for value in vector], BinaryVectorDtype.FLOAT32)
+        return vector
+
+    def fit_dimension_reduction(self, texts: List[str] = None, sample_size: int = None):
+        """Fit the PCA projection (DIMENSION_REDUCTION=pca) on full-size embeddings of sample texts.
+
+        Without texts, up to sample_size stored chunk texts are used. Fit before ingesting: stored
+        vectors are only comparable to queries reduced with the same projection.
+        """
+        if texts is None:
+            sample_size = sample_size or max(4 * self.reducer.dimensions, 1000)
+            texts = [doc["text"] for doc in self.collection.find({}, {"text": 1})][:sample_size]
+        explained = self.reducer.fit(self.batch_embedder.embed(texts))
+        self.query_embeddings.clear()
+        return explained
 
     def extract_from_html_doc(self, file_path):
         """Extract text from HTML documents."""
-        loader = BSHTMLLoader(file_path)
-        return loader.load()
+        return self.load_source(file_path, 'html')
 
     def extract_from_url(self, url):
         """Extract text from web pages."""
-        headers = {"User-Agent": os.getenv("USER_AGENT")}
-        loader = WebBaseLoader(url, header_template=headers)
-        return loader.load()
+        return self.load_source(url, 'url')
 
     def extract_from_pdf(self, file_path):
         """Extract text from PDF files."""
+        from langchain_community.document_loaders import PyPDFLoader
         loader = PyPDFLoader(file_path)
         return loader.load_and_split()
 
@@ -132,38 +693,144 @@ class VectorStoreController:
         return text.replace("\r", "").replace("\t", "").replace("\n\n", "")
 
     def create_vector_search_index(self):
-        """Create a vector search index in MongoDB."""
-        if self.search_index_exists(self.search_index_name):
-            logger.info(f"Search index '{self.search_index_name}' already exists.")
+        """Create a vector search index in MongoDB, or add the filter fields to an existing one."""
+        definition = self.vector_index_definition()
+        existing = self.get_search_index(self.search_index_name)
+        if existing:
+            fields = existing.get("latestDefinition", {}).get("fields", [])
+            declared = {field["path"] for field in fields if field.get("type") == "filter"}
+            vector_field = next((field for field in fields if field.get("type") == "vector"), {})
+            if (set(FILTER_FIELDS) <= declared and vector_field.get("quantization", "none") == self.vector_quantization
+                    and vector_field.get("numDimensions") == self.reducer.dimensions):
+                logger.info(f"Search index '{self.search_index_name}' already exists.")
+                return
+            if vector_field.get("numDimensions") != self.reducer.dimensions:
+                logger.warning(f"Search index '{self.search_index_name}' changes to {self.reducer.dimensions} "
+                               f"dimensions; re-ingest the knowledge base so stored vectors match (sources "
+                               f"embedded at another size are re-embedded).")
+            try:
+                self.collection.update_search_index(self.search_index_name, definition)
+                logger.info(f"Search index '{self.search_index_name}' updated (filter fields, quantization, dimensions).")
+            except Exception as e:
+                logger.error(f"Error updating search index '{self.search_index_name}': {e}")
             return
 
         try:
             search_index_model = SearchIndexModel(
-                definition={
-                    "fields": [
-                        {
-                            "type": "vector",
-                            "path": "embedding",
-                            "numDimensions": 1536,
-                            "similarity": "cosine"
-                        },
-                    ]
-                },
-                name=self.search_index_name
+                definition=definition,
+                name=self.search_index_name,
+                type="vectorSearch"
             )
             self.collection.create_search_index(model=search_index_model)
             logger.info(f"Search index '{self.search_index_name}' created successfully.")
         except Exception as e:
             logger.error(f"Error creating search index '{self.search_index_name}': {e}")
 
+    def vector_index_definition(self):
+        """Vector field (EMBEDDING_DIMENSIONS wide) plus the metadata fields $vectorSearch may pre-filter on."""
+        return atlas_index_definition(self.reducer.dimensions, self.vector_quantization, FILTER_FIELDS)
+
     def delete_all_documents(self):
         """Delete all documents from the collection."""
         try:
             result = self.collection.delete_many({})
+            self.manifest_collection.delete_many({})
             logger.info(f"Deleted {result.deleted_count} documents from the collection.")
+            self.bump_kb_version()
         except Exception as e:
             logger.error(f"Error while deleting documents: {e}")
 
+    def delete_by_source(self, source: str):
+        """Delete all chunks of one source."""
+        return self.remove_documents(sources=[source])
+
+    def delete_by_blob_name(self, blob_name: str):
+        """Delete all chunks ingested from one Azure Storage blob."""
+        return self.remove_documents(blob_names=[blob_name])
+
+    def delete_by_upload_date(self, date_from: datetime = None, date_to: datetime = None):
+        """Delete all chunks uploaded in [date_from, date_to)."""
+        return self.remove_documents(date_from=date_from, date_to=date_to)
+
+    def remove_documents(self, sources: List[str] = None, blob_names: List[str] = None,
+                         date_from: datetime = None, date_to: datetime = None):
+        """Bulk removal of the chunks matching every given criterion (they are ANDed into one filter).
+
+        Returns the number of deleted chunks. A source that loses all its chunks also loses its manifest
+        entry; one that loses only some keeps the entry minus the deleted chunk hashes, and no longer
+        counts as unchanged, so a later ingestion writes the missing chunks again.
+        """
+        query = {}
+        if sources:
+            query["source"] = {"$in": list(sources)}
+        if blob_names:
+            query["blob_name"] = {"$in": list(blob_names)}
+        if date_from or date_to:
+            date_range = {}
+            if date_from:
+                date_range["$gte"] = date_from
+            if date_to:
+                date_range["$lt"] = date_to
+            query["upload_date"] = date_range
+        if not query:
+            return 0
+
+        try:
+            removed_hashes = {}  # source -> hashes of its deleted chunks
+            for doc in self.collection.find(query, {"text": 0, "embedding": 0}):
+                hashes = removed_hashes.setdefault(doc.get("source"), set())
+                if doc.get("chunk_hash"):
+                    hashes.add(doc["chunk_hash"])
+            result = self.collection.delete_many(query)
+
+            affected_sources = [source for source in removed_hashes if source is not None]
+            remaining = set(self.collection.distinct("source", {"source": {"$in": affected_sources}}))
+            emptied = [source for source in affected_sources if source not in remaining]
+            if emptied:
+                self.manifest_collection.delete_many({"_id": {"$in": emptied}})
+            for source in remaining:
+                self.manifest_collection.update_one(
+                    {"_id": source},
+                    {"$pull": {"chunk_hashes": {"$in": list(removed_hashes[source])}}, "$unset": {"content_hash": ""}},
+                )
+            logger.info(f"Deleted {result.deleted_count} documents from {len(affected_sources)} sources.")
+            if result.deleted_count:
+                self.bump_kb_version()
+            return result.deleted_count
+        except Exception as e:
+            logger.error(f"Error while removing documents: {e}")
+            return 0
+
+    def get_kb_version(self):
+        """Return the knowledge base version, re-read from Mongo at most every few seconds."""
+        now = time.monotonic()
+        if self._kb_version is None or now - self._kb_version_checked > self.kb_version_refresh_seconds:
+            try:
+                meta = self.meta_collection.find_one({"_id": self.collection_name}) or {}
+                self._kb_version = meta.get("version", 0)
+            except Exception as e:
+                logger.error(f"Error reading knowledge base version: {e}")
+                self._kb_version = self._kb_version or 0
+            self._kb_version_checked = now
+        return self._kb_version
+
+    async def aget_kb_version(self):
+        """Async variant of get_kb_version(): the periodic re-read runs in a worker thread, off the event loop."""
+        if self._kb_version is not None and time.monotonic() - self._kb_version_checked <= self.kb_version_refresh_seconds:
+            return self._kb_version
+        return await asyncio.to_thread(self.get_kb_version)
+
+    def bump_kb_version(self):
+        """Mark the knowledge base as changed, invalidating answers cached against it."""
+        try:
+            meta = self.meta_collection.find_one_and_update(
+                {"_id": self.collection_name}, {"$inc": {"version": 1}}, upsert=True, return_document=True
+            )
+            self._kb_version = meta["version"]
+            self._kb_version_checked = time.monotonic()
+        except Exception as e:
+            logger.error(f"Error updating knowledge base version: {e}")
+
     def create_unique_index(self):
         """Create a unique index to prevent duplicate documents."""
         if self.unique_index_exists(self.unique_index_name):
@@ -182,9 +849,55 @@ class VectorStoreController:
         except Exception as e:
             logger.error(f"Error creating unique index: {e}")
 
+        self.create_chunk_hash_index()
+
+    def create_chunk_hash_index(self):
+        """Create a unique index on source + chunk hash (chunks written before hashing are left out)."""
+        if self.unique_index_exists(self.chunk_hash_index_name):
+            return
+
+        try:
+            self.collection.create_index(
+                [("source", 1), ("chunk_hash", 1)],
+                unique=True,
+                partialFilterExpression={"chunk_hash": {"$exists": True}},
+                name=self.chunk_hash_index_name
+            )
+            logger.info(f"Unique index '{self.chunk_hash_index_name}' created successfully.")
+        except Exception as e:
+            logger.error(f"Error creating chunk hash index: {e}")
+
+    def create_secondary_indexes(self):
+        """Indexes behind targeted removal by blob name and by upload date (removal by source uses the
+        unique indexes, which start with source)."""
+        indexes = [
+            ("blob_name_index", [("blob_name", 1)], {"sparse": True}),
+            ("upload_date_index", [("upload_date", 1)], {}),
+        ]
+        existing = self.collection.index_information()
+        if "source_index" in existing:
+            # Created by earlier versions; redundant with the compound indexes and only costs writes
+            try:
+                self.collection.drop_index("source_index")
+                logger.info("Redundant index 'source_index' dropped.")
+            except Exception as e:
+                logger.error(f"Error dropping index 'source_index': {e}")
+        for name, keys, options in indexes:
+            if name in existing:
+                continue
+            try:
+                self.collection.create_index(keys, name=name, **options)
+                logger.info(f"Index '{name}' created successfully.")
+            except Exception as e:
+                logger.error(f"Error creating index '{name}': {e}")
+
     def search_index_exists(self, index_name: str):
         """Check if a search index exists."""
-        return any(index.get("name") == index_name for index in self.collection.list_search_indexes())
+        return self.get_search_index(index_name) is not None
+
+    def get_search_index(self, index_name: str):
+        """Return the search index description, or None."""
+        return next((index for index in self.collection.list_search_indexes() if index.get("name") == index_name), None)
 
     def unique_index_exists(self, index_name: str):
         """Check if a unique index exists."""
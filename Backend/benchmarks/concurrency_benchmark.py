@@ -0,0 +1,86 @@
+"""
+BENCHMARK: CHAT THROUGHPUT VS WORKER THREADS
+Runs Chatbot.send_message from a thread pool against a stubbed model and
+vector store (fixed network-like latency), so the numbers show how well one
+process scales once the state machine is reentrant.
+
+usage: python benchmarks/concurrency_benchmark.py [--requests 200] [--latency 0.05]
+"""
+import os
+import sys
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+os.environ.setdefault("ANSWER_CACHE_ENABLED", "false")  # measure the pipeline, not cache hits
+
+from controllers.chatbot_controller import Chatbot  # noqa: E402
+
+
+class StubResponse:
+    def __init__(self, content):
+        self.content = content
+
+
+class StubModel:
+    """Answers after a fixed delay, like a remote chat completion."""
+
+    def __init__(self, latency):
+        self.latency = latency
+
+    def invoke(self, messages):
+        time.sleep(self.latency)
+        if "tool selector" in messages[0][1]:
+            return StubResponse("yes")
+        return StubResponse(f"echo: {messages[-1][1]}")
+
+
+class StubVectorStore:
+    query_embeddings = None  # only needed by embedding-based context compression
+
+    def __init__(self, latency):
+        self.latency = latency
+
+    def vector_search(self, query, top_k=3, **kwargs):
+        time.sleep(self.latency)
+        return []
+
+    def relevance_score(self, query, filters=None):
+        time.sleep(self.latency)
+        return 1.0
+
+
+def run(chatbot, workers, total_requests):
+    def one_chat(i):
+        session_id = f"session-{i % (workers * 2)}"
+        response = chatbot.send_message(f"question {i}?", session_id=session_id)
+        # every turn must answer its own question, otherwise state leaked between requests
+        assert response["ai_message"] == f"echo: question {i}?", response["ai_message"]
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(one_chat, range(total_requests)))
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per stubbed network call")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    args = parser.parse_args()
+
+    chatbot = Chatbot(model=StubModel(args.latency), vector_store=StubVectorStore(args.latency))
+
+    baseline = None
+    print(f"{'workers':>8} {'seconds':>9} {'req/s':>9} {'speedup':>8}")
+    for workers in args.workers:
+        elapsed = run(chatbot, workers, args.requests)
+        throughput = args.requests / elapsed
+        baseline = baseline or throughput
+        print(f"{workers:>8} {elapsed:>9.2f} {throughput:>9.1f} {throughput / baseline:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+BENCHMARK: COLD START OF THE FLASK APP
+Each run is a fresh Python process (nothing cached in sys.modules) that measures:
+- import: importing app.py, i.e. create_app() (controllers are lazy, nothing is built)
+- first request: a route that needs no controller (/api/clients/stats)
+- build chatbot: first /api/chatbot/sessions, which builds the chatbot and its vector store
+- eager total: import plus building every controller, what importing app.py used to cost
+
+Runs offline: VECTOR_BACKEND=local, placeholder Azure settings (clients connect lazily)
+and INDEX_SETUP=cli, so no index check goes to Atlas.
+
+usage: python benchmarks/startup_benchmark.py [--runs 5]
+"""
+import os
+import sys
+import json
+import argparse
+import tempfile
+import subprocess
+
+import numpy as np
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app")
+
+CHILD = """
+import json, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+client = app.app.test_client()
+assert client.get('/api/clients/stats').status_code == 200
+first_request = time.perf_counter()
+assert client.get('/api/chatbot/sessions').status_code == 200
+chatbot_built = time.perf_counter()
+app.app.extensions['controllers'].vector_store
+everything_built = time.perf_counter()
+print(json.dumps({
+    "import_s": imported - start,
+    "first_request_ms": (first_request - imported) * 1000,
+    "build_chatbot_s": chatbot_built - first_request,
+    "eager_total_s": (imported - start) + (everything_built - first_request),
+}))
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        env = {
+            **os.environ,
+            "VECTOR_BACKEND": "local",
+            "LOCAL_VECTOR_PATH": directory,
+            "QC_COLLECTION": "startup_benchmark",
+            "INDEX_SETUP": "cli",
+            "WARM_UP_CONTROLLERS": "false",
+            "ANSWER_CACHE_ENABLED": "false",
+            "AZURE_OPENAI_API_KEY": os.getenv("AZURE_OPENAI_API_KEY", "placeholder"),
+            "AZURE_OPENAI_ENDPOINT": os.getenv("AZURE_OPENAI_ENDPOINT", "https://placeholder.openai.azure.com"),
+            "OPENAI_API_VERSION": os.getenv("OPENAI_API_VERSION", "2024-02-01"),
+        }
+        runs = []
+        for _ in range(args.runs):
+            output = subprocess.run([sys.executable, "-c", CHILD], cwd=APP_DIR, env=env, check=True,
+                                    capture_output=True, text=True).stdout
+            runs.append(json.loads(output.strip().splitlines()[-1]))
+
+    print(f"{'metric':<18} {'median':>9} {'min':>9} {'max':>9}")
+    for metric in runs[0]:
+        values = [run[metric] for run in runs]
+        print(f"{metric:<18} {np.median(values):>9.3f} {min(values):>9.3f} {max(values):>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+BENCHMARK: VECTOR STORAGE FORMAT, QUANTIZATION AND DIMENSIONALITY
+Chunks the Test-Documents corpus, embeds it and compares, for the local vector
+backend, exact float32 search against int8 (scalar) and binary quantized scans
+with full-precision rescoring, at full and reduced (--dimensions) sizes:
+- bytes per chunk stored in Mongo (BSON array of doubles vs packed float32)
+- resident memory (quantized codes plus the float32 matrix kept for rescoring),
+  query latency and recall@k against exact full-size search
+
+Embeddings come from Azure OpenAI with --azure; otherwise a deterministic offline
+embedding (sum of per-token random unit vectors) stands in, so the benchmark
+runs without network access. --copies replicates the corpus with small noise
+to reach a collection size where scan costs show.
+
+usage: python benchmarks/vector_storage_benchmark.py [--copies 50] [--k 4] [--dimensions 1536 512 256] [--reduction truncate|pca] [--azure]
+"""
+import os
+import re
+import sys
+import glob
+import time
+import zlib
+import argparse
+import tempfile
+
+import numpy as np
+from bs4 import BeautifulSoup
+from bson import encode
+from bson.binary import Binary, BinaryVectorDtype
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from controllers.dimension_reduction import DimensionReducer  # noqa: E402
+from controllers.vector_backends import LocalVectorBackend  # noqa: E402
+
+DOCUMENTS = os.path.join(os.path.dirname(__file__), "..", "Test-Documents")
+
+
+class TokenProjectionEmbeddings:
+    """Offline stand-in: texts sharing words get similar dense vectors."""
+
+    def __init__(self, dimensions=1536):
+        self.dimensions = dimensions
+        self._tokens = {}
+
+    def token_vector(self, token):
+        if token not in self._tokens:
+            rng = np.random.default_rng(zlib.crc32(token.encode()))
+            self._tokens[token] = rng.standard_normal(self.dimensions).astype(np.float32)
+        return self._tokens[token]
+
+    def embed_documents(self, texts):
+        vectors = []
+        for text in texts:
+            tokens = re.findall(r"\w+", text.lower()) or ["<empty>"]
+            vector = np.sum([self.token_vector(token) for token in tokens], axis=0)
+            vectors.append((vector / np.linalg.norm(vector)).tolist())
+        return vectors
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def load_chunks(sentences_per_chunk=3):
+    texts = []
+    for path in sorted(glob.glob(os.path.join(DOCUMENTS, "**", "*.html"), recursive=True)):
+        with open(path) as f:
+            texts.append(BeautifulSoup(f.read(), "lxml").get_text(" "))
+    for path in sorted(glob.glob(os.path.join(DOCUMENTS, "**", "*.pdf"), recursive=True)):
+        from pypdf import PdfReader
+        texts.append(" ".join(page.extract_text() or "" for page in PdfReader(path).pages))
+
+    chunks = []
+    for text in texts:
+        sentences = [s.strip() for s in re.split(r"(?<=[.?!])\s+|\n+", text) if len(s.strip()) > 20]
+        for i in range(0, len(sentences), sentences_per_chunk):
+            chunks.append(" ".join(sentences[i:i + sentences_per_chunk]))
+    return chunks
+
+
+def bson_bytes(vector):
+    array = len(encode({"embedding": [float(value) for value in vector]}))
+    packed = len(encode({"embedding": Binary.from_vector([float(value) for value in vector], BinaryVectorDtype.FLOAT32)}))
+    return array, packed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--copies", type=int, default=50, help="noisy copies of the corpus")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--rescore-factor", type=int, default=4)
+    parser.add_argument("--dimensions", type=int, nargs="+", default=[1536])
+    parser.add_argument("--reduction", choices=["truncate", "pca"], default="truncate")
+    parser.add_argument("--azure", action="store_true", help="embed with Azure OpenAI instead of offline")
+    args = parser.parse_args()
+
+    if args.azure:
+        from langchain_openai import AzureOpenAIEmbeddings
+        embeddings = AzureOpenAIEmbeddings(azure_endpoint=os.getenv("AZURE_OPENAI_EMBEDDING_ENDPOINT"))
+    else:
+        embeddings = TokenProjectionEmbeddings()
+
+    chunks = load_chunks()
+    base = np.asarray(embeddings.embed_documents(chunks), dtype=np.float32)
+    rng = np.random.default_rng(0)
+    vectors = np.vstack([base] + [base + rng.normal(0, 0.02, base.shape).astype(np.float32)
+                                  for _ in range(args.copies - 1)])
+    query_texts = [chunks[i].split(". ")[0] for i in rng.integers(0, len(chunks), args.queries)]
+    queries = np.asarray([embeddings.embed_query(text) for text in query_texts], dtype=np.float32)
+
+    array_bytes, packed_bytes = bson_bytes(base[0])
+    print(f"corpus: {len(chunks)} chunks x {args.copies} copies = {len(vectors)} vectors of {vectors.shape[1]} dims")
+    print(f"BSON embedding per chunk: array of doubles {array_bytes} B, packed float32 {packed_bytes} B "
+          f"({array_bytes / packed_bytes:.1f}x smaller)\n")
+
+    # Ground truth: exact search over the full-size vectors
+    unit = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    exact = [set(map(str, np.argsort(-(unit @ query))[:args.k])) for query in queries]
+
+    modes = [("float32 exact", "none", 1), ("int8 + rescore", "scalar", args.rescore_factor),
+             ("binary + rescore", "binary", args.rescore_factor), ("binary, no rescore", "binary", 1)]
+    print(f"{'dims':>5} {'mode':<20} {'codes MB':>9} {'total MB':>9} {'p50 us':>8} {'p95 us':>8} {f'recall@{args.k}':>10}")
+    for dimensions in args.dimensions:
+        with tempfile.TemporaryDirectory() as directory:
+            reducer = DimensionReducer(dimensions, args.reduction, os.path.join(directory, "pca.npz"))
+            if args.reduction == "pca" and dimensions < vectors.shape[1]:
+                reducer.fit(vectors[rng.choice(len(vectors), min(len(vectors), 4 * dimensions), replace=False)])
+            reduced_vectors, reduced_queries = reducer.reduce(vectors), reducer.reduce(queries)
+
+            for name, quantization, rescore_factor in modes:
+                backend = LocalVectorBackend(os.path.join(directory, quantization + str(rescore_factor)), index="flat",
+                                             quantization=quantization, rescore_factor=rescore_factor)
+                backend.insert_many([{"_id": str(i), "text": "", "embedding": vector}
+                                     for i, vector in enumerate(reduced_vectors)])
+
+                latencies, results = [], []
+                for query in reduced_queries:
+                    start = time.perf_counter()
+                    hits = backend.search(query, args.k)
+                    latencies.append((time.perf_counter() - start) * 1e6)
+                    results.append({hit["_id"] for hit in hits})
+
+                # The float32 matrix stays resident next to the codes: rescoring reads it
+                code_bytes = backend._codes.nbytes if backend._codes is not None else 0
+                recall = np.mean([len(found & truth) / len(truth) for found, truth in zip(results, exact)])
+                print(f"{dimensions:>5} {name:<20} {code_bytes / 1e6:>9.2f} {backend.nbytes / 1e6:>9.2f} {np.percentile(latencies, 50):>8.0f} "
+                      f"{np.percentile(latencies, 95):>8.0f} {recall:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
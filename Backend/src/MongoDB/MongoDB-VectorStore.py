@@ -5,6 +5,7 @@ CUSTOM CLASS TO PERFORM OPERATIONS ON VECTOR STORE
 - QUERY SEARCH
 """
 import os
+import sys
 import time
 
 from datetime import datetime, timezone
@@ -24,6 +25,12 @@ from langchain_text_splitters import CharacterTextSplitter
 from pymongo.mongo_client import MongoClient
 from pymongo.server_api import ServerApi
 
+# Share the query embedding cache with the app's controllers
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "app"))
+from controllers.dimension_reduction import DimensionReducer, ReducedEmbeddings
+from controllers.embedding_cache import CachedEmbeddings
+from controllers.vector_backends import atlas_index_definition
+
 load_dotenv()  # Load .env variables
 
 class MongoDBVectorStore:
@@ -37,11 +44,15 @@ class MongoDBVectorStore:
 
         # Setup for MongoDB Atlas Vector Search
         self.embeddings_model = AzureOpenAIEmbeddings(azure_endpoint=os.getenv("AZURE_OPENAI_EMBEDDING_ENDPOINT"))
+        # Documents and queries are both embedded through the reducer (EMBEDDING_DIMENSIONS)
+        self.reducer = DimensionReducer()
+        self.query_embeddings = CachedEmbeddings(ReducedEmbeddings(self.embeddings_model, self.reducer),
+                                                 namespace=self.reducer.cache_namespace(self.embeddings_model.deployment))
 
         self.search_index_name = search_index_name
         self.vector_store = MongoDBAtlasVectorSearch(
             collection=self.collection,
-            embedding=self.embeddings_model,
+            embedding=self.query_embeddings,
             index_name=self.search_index_name,  # The name of the index you set up in MongoDB Atlas
             relevance_score_fn="cosine"  # or "euclidean", depending on your use case
         )
@@ -51,12 +62,9 @@ class MongoDBVectorStore:
 
     # Perform vector search
     def vector_search(self, query, top_k=3):
-        # Generate embedding for the query using the same embedding model
-        query_embedding = self.embeddings_model.embed_documents([query])[0]
-
         # self.create_vector_search_index()
         try:
-            # Perform similarity search in MongoDB Atlas vector store
+            # Perform similarity search in MongoDB Atlas vector store (query embedding is cached)
             results = self.vector_store.similarity_search(query, k=top_k)
 
             return results
@@ -157,34 +165,9 @@ class MongoDBVectorStore:
         if self.search_index_name not in indexes:
             while True:
                 try:
-                    # Define the vector search index
-                    index = {
-                        "name": self.search_index_name,  # The index name
-                        "type": "vectorSearch",
-                        "definition": {
-                            "fields": [
-                                {
-                                    "type": "vector",
-                                    "numDimensions": 1536,
-                                    # Adjust this to match the dimensionality of your embeddings (e.g., OpenAI embeddings have 1536 dimensions)
-                                    "path": "embedding",  # Path to the vector field in your documents
-                                    "similarity": "cosine"  # Similarity metric (can be "cosine", "euclidean", or "dotProduct")
-                                }
-                            ]
-                        }
-                    }
-                    # Create your index model, then create the search index
+                    # Index definition generated from EMBEDDING_DIMENSIONS
                     search_index_model = SearchIndexModel(
-                        definition={
-                            "fields": [
-                                {
-                                    "type": "vector",
-                                    "path": "embedding",
-                                    "numDimensions": 1536,
-                                    "similarity": "cosine"
-                                },
-                            ]
-                        },
+                        definition=atlas_index_definition(self.reducer.dimensions),
                         name="vector_query_index",
                         type="vectorSearch"
                     )
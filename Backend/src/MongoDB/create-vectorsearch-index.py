@@ -1,8 +1,13 @@
 from pymongo import MongoClient
 import os
+import sys
 from dotenv import load_dotenv
 from pymongo.operations import SearchIndexModel
 
+# Index definition shared with the app's controllers
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "app"))
+from controllers.vector_backends import atlas_index_definition
+
 # Load environment variables
 load_dotenv()
 
@@ -13,6 +18,7 @@ MONGODB_ATLAS_URI = os.getenv("MONGODB_URI")
 DATABASE_NAME = "Chatbot-Test"  # Your database name
 COLLECTION_NAME = "QC_Life_Docs"  # Your collection name
 INDEX_NAME = "vector_query_index"  # The name of your index
+EMBEDDING_DIMENSIONS = int(os.getenv("EMBEDDING_DIMENSIONS", 1536))  # must match the stored (reduced) embeddings
 
 # Initialize MongoDB client
 client = MongoClient(MONGODB_ATLAS_URI)
@@ -23,34 +29,10 @@ collection = db[COLLECTION_NAME]
 
 def create_vector_search_index():
     try:
-        # Define the vector search index
-        index = {
-            "name": INDEX_NAME,  # The index name
-            "type": "vectorSearch",
-            "definition": {
-                "fields": [
-                    {
-                        "type": "vector",
-                        "numDimensions": 1536,  # Adjust this to match the dimensionality of your embeddings (e.g., OpenAI embeddings have 1536 dimensions)
-                        "path": "embedding",  # Path to the vector field in your documents
-                        "similarity": "cosine"  # Similarity metric (can be "cosine", "euclidean", or "dotProduct")
-                    }
-                ]
-            }
-        }
         # Create your index model, then create the search index
         search_index_model = SearchIndexModel(
-            definition={
-                "fields": [
-                    {
-                        "type": "vector",
-                        "path": "embedding",
-                        "numDimensions": 1536,
-                        "similarity": "cosine"
-                    },
-                ]
-            },
-            name="vector_query_index",
+            definition=atlas_index_definition(EMBEDDING_DIMENSIONS),
+            name=INDEX_NAME,
             type="vectorSearch"
         )
 
@@ -21,6 +21,10 @@ import asyncio
 from pymongo.mongo_client import MongoClient
 from pymongo.server_api import ServerApi
 import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "app"))
+from controllers.embedding_batcher import BatchEmbedder
 
 
 load_dotenv() #load .env variables
@@ -75,12 +79,14 @@ def extract_from_html_doc(file_path):
 
 def embed_docs(docs):
     embeddings_model = AzureOpenAIEmbeddings(azure_endpoint=os.getenv("AZURE_OPENAI_EMBEDDING_ENDPOINT"))
+    # one request per token-bounded batch instead of one per chunk
+    embeddings = BatchEmbedder(embeddings_model).embed([doc.page_content for doc in docs])
     chunks = []
     for i in range(len(docs)):
         chunks.append({
             "chunk_id": i+1,
             "chunk_content": docs[i].page_content,
-            "chunk_embedding": embeddings_model.embed_documents([docs[i].page_content])[0]
+            "chunk_embedding": embeddings[i]
         })
 
     print("----Chunks Embedding Finished----")
@@ -0,0 +1,40 @@
+import os
+import sys
+
+import pytest
+
+# Tests import the controllers the way the apps do, from Backend/app
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+
+@pytest.fixture
+def local_store(tmp_path, monkeypatch):
+    """VectorStoreController on the local backend, offline (the Azure clients connect lazily)."""
+    monkeypatch.setenv("VECTOR_BACKEND", "local")
+    monkeypatch.setenv("LOCAL_VECTOR_PATH", str(tmp_path / "kb"))
+    monkeypatch.setenv("QC_COLLECTION", "test_kb")
+    monkeypatch.setenv("AZURE_OPENAI_API_KEY", "placeholder")
+    monkeypatch.setenv("AZURE_OPENAI_ENDPOINT", "https://placeholder.openai.azure.com")
+    monkeypatch.setenv("OPENAI_API_VERSION", "2024-02-01")
+    monkeypatch.setenv("EMBEDDING_CACHE_PATH", "")
+    monkeypatch.setenv("EMBEDDING_DIMENSIONS", "2")  # tests use tiny hand-written vectors
+    from controllers.vector_store_controller import VectorStoreController
+    return VectorStoreController(create_indexes=False)
+
+
+@pytest.fixture
+def chatbot(local_store, monkeypatch):
+    """Chatbot over local_store with a scripted chat model and keyword query embeddings, all offline."""
+    from langchain_core.language_models import FakeListChatModel
+
+    from controllers.chatbot_controller import Chatbot
+
+    def embed_query(text):
+        return [1.0, 0.0] if "hours" in text.lower() else [0.0, 1.0]
+
+    async def aembed_query(text):
+        return embed_query(text)
+
+    monkeypatch.setattr(local_store.query_embeddings, "embed_query", embed_query)
+    monkeypatch.setattr(local_store.query_embeddings, "aembed_query", aembed_query)
+    return Chatbot(model=FakeListChatModel(responses=["We open at 9."]), vector_store=local_store)
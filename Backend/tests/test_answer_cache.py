@@ -0,0 +1,52 @@
+import asyncio
+import threading
+
+from controllers.answer_cache import AnswerCache
+
+
+class AsyncOnlyEmbeddings:
+    """Fails if the async path falls back to a blocking call."""
+
+    def embed_query(self, text):
+        raise AssertionError("sync embed_query called on the event loop")
+
+    async def aembed_query(self, text):
+        return [1.0, 0.0] if "hours" in text else [0.0, 1.0]
+
+
+def blocking_kb_version():
+    raise AssertionError("sync kb_version called on the event loop")
+
+
+async def kb_version():
+    return 3
+
+
+def test_async_get_and_put_never_block():
+    cache = AnswerCache(AsyncOnlyEmbeddings(), blocking_kb_version, capacity=4, akb_version=kb_version)
+
+    async def scenario():
+        assert await cache.aget("Opening hours?") is None
+        await cache.aput("Opening hours?", "9 to 5")
+        assert await cache.aget("opening hours?") == "9 to 5"  # exact tier
+        assert await cache.aget("What are the hours") == "9 to 5"  # semantic tier
+
+    asyncio.run(scenario())
+    assert cache.counters["exact_hits"] == 1 and cache.counters["semantic_hits"] == 1
+
+
+def test_sync_kb_version_runs_in_a_thread_without_async_variant():
+    callers = []
+
+    def kb_version_sync():
+        callers.append(threading.current_thread())
+        return 1
+
+    cache = AnswerCache(AsyncOnlyEmbeddings(), kb_version_sync, capacity=4)
+
+    async def scenario():
+        await cache.aput("Opening hours?", "9 to 5")
+        return await cache.aget("Opening hours?")
+
+    assert asyncio.run(scenario()) == "9 to 5"
+    assert callers and threading.main_thread() not in callers  # the event loop runs on the main thread
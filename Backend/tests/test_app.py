@@ -0,0 +1,65 @@
+from datetime import datetime, timezone
+
+import pytest
+
+
+class Controllers:
+    def __init__(self, vector_store):
+        self.vector_store = vector_store
+
+
+@pytest.fixture
+def client(local_store, monkeypatch):
+    monkeypatch.setenv("WARM_UP_CONTROLLERS", "false")
+    monkeypatch.setenv("INDEX_SETUP", "cli")
+    import app
+    return app.create_app(Controllers(local_store), warm_up=False).test_client()
+
+
+def test_remove_by_upload_date_range(client, local_store):
+    def record(text, uploaded):
+        return {"text": text, "source": text, "chunk_hash": text, "embedding": [1.0, 0.0], "upload_date": uploaded}
+
+    local_store.collection.insert_many([
+        record("old", datetime(2023, 6, 1, tzinfo=timezone.utc)),
+        record("new", datetime(2024, 6, 1, tzinfo=timezone.utc)),
+    ])
+
+    response = client.post("/api/knowledge-base/remove",
+                           json={"upload_date_from": "2024-01-01", "upload_date_to": "2025-01-01"})
+    assert response.status_code == 200
+    assert response.json["deleted"] == 1
+    assert [doc["text"] for doc in local_store.collection.find({})] == ["old"]
+
+
+def test_removal_criteria_are_combined(client, local_store):
+    def record(text, source, uploaded):
+        return {"text": text, "source": source, "chunk_hash": text, "embedding": [1.0, 0.0], "upload_date": uploaded}
+
+    local_store.collection.insert_many([
+        record("a-old", "a", datetime(2023, 6, 1, tzinfo=timezone.utc)),
+        record("a-new", "a", datetime(2024, 6, 1, tzinfo=timezone.utc)),
+        record("b-new", "b", datetime(2024, 6, 1, tzinfo=timezone.utc)),
+    ])
+    for source, hashes in (("a", ["a-old", "a-new"]), ("b", ["b-new"])):
+        local_store.manifest_collection.replace_one(
+            {"_id": source}, {"content_hash": source, "chunk_hashes": hashes}, upsert=True)
+
+    response = client.post("/api/knowledge-base/remove", json={"sources": ["a"], "upload_date_from": "2024-01-01"})
+    assert response.json["deleted"] == 1
+    assert sorted(doc["text"] for doc in local_store.collection.find({})) == ["a-old", "b-new"]
+
+    # Only the deleted chunk leaves the manifest, and the source is no longer taken as unchanged
+    manifest = local_store.manifest_collection.find_one({"_id": "a"})
+    assert manifest["chunk_hashes"] == ["a-old"]
+    assert "content_hash" not in manifest
+    assert local_store.manifest_collection.find_one({"_id": "b"})["chunk_hashes"] == ["b-new"]
+
+    client.post("/api/knowledge-base/remove", json={"sources": ["a"]})
+    assert local_store.manifest_collection.find_one({"_id": "a"}) is None
+
+
+def test_malformed_removal_date_is_a_bad_request(client):
+    response = client.post("/api/knowledge-base/remove", json={"upload_date_from": "last tuesday"})
+    assert response.status_code == 400
+    assert "ISO 8601" in response.json["error"]
@@ -0,0 +1,67 @@
+import asyncio
+
+
+def store_opening_hours(store):
+    store.collection.insert_many([{"text": "Opening hours are 9 to 5.", "source": "page", "chunk_hash": "h",
+                                   "embedding": [1.0, 0.0]}])
+
+
+def test_answer_after_a_failed_search_is_not_cached(chatbot, monkeypatch):
+    store_opening_hours(chatbot.vectorStore)
+
+    def unreachable(*args, **kwargs):
+        raise ConnectionError("search service down")
+
+    monkeypatch.setattr(chatbot.vectorStore.backend, "search", unreachable)
+    monkeypatch.setattr(chatbot.router, "route", lambda query: True)
+    output = chatbot.send_message("What are the opening hours?")
+
+    assert output["ai_message"] == "We open at 9."
+    assert chatbot.answer_cache.get("What are the opening hours?") is None
+
+
+def test_search_routed_question_without_documents_is_not_cached(chatbot, monkeypatch):
+    async def route(query):
+        return True
+
+    monkeypatch.setattr(chatbot.router, "aroute", route)
+    asyncio.run(chatbot.asend_message("What are the opening hours?"))
+
+    assert asyncio.run(chatbot.answer_cache.aget("What are the opening hours?")) is None
+
+
+def test_answer_with_context_is_cached(chatbot, monkeypatch):
+    store_opening_hours(chatbot.vectorStore)
+    monkeypatch.setattr(chatbot.router, "route", lambda query: True)
+    chatbot.send_message("What are the opening hours?")
+
+    assert chatbot.answer_cache.get("What are the opening hours?") == "We open at 9."
+
+
+def test_stream_yields_state_events_then_tokens_then_done(chatbot, monkeypatch):
+    store_opening_hours(chatbot.vectorStore)
+    monkeypatch.setattr(chatbot.router, "route", lambda query: True)
+    events = list(chatbot.stream_message("What are the opening hours?", session_id="s1"))
+
+    states = [event["state"] for event in events if event["event"] == "state"]
+    assert states == ["decision", "vector_search", "response"]
+    assert events[0]["event"] == "state" and events[-1]["event"] == "done"
+
+    # Tokens only follow the response state and add up to the answer
+    first_token = next(i for i, event in enumerate(events) if event["event"] == "token")
+    assert events[first_token - 1]["state"] == "response"
+    tokens = events[first_token:-1]
+    assert all(event["event"] == "token" for event in tokens)
+    assert "".join(event["content"] for event in tokens) == "We open at 9."
+
+    done = events[-1]
+    assert done["session_id"] == "s1" and done["ai_message"] == "We open at 9."
+    assert chatbot.sessions.history("s1") == [("human", "What are the opening hours?"), ("ai", "We open at 9.")]
+
+
+def test_stream_of_a_cached_answer_is_one_token_then_done(chatbot, monkeypatch):
+    chatbot.answer_cache.put("What are the opening hours?", "We open at 9.")
+    events = list(chatbot.stream_message("What are the opening hours?", session_id="s1"))
+
+    assert [event["event"] for event in events] == ["token", "done"]
+    assert events[0]["content"] == events[1]["ai_message"] == "We open at 9."
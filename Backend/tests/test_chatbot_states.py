@@ -0,0 +1,44 @@
+import time
+from types import SimpleNamespace
+
+from controllers.chatbot_states import ChatContext, StateMachine
+
+
+class Chatbot:
+    """Just enough of Chatbot for the state machine: a slow search and an instant model."""
+
+    def __init__(self, needs_search):
+        self.router = SimpleNamespace(route=lambda query: needs_search)
+        self.context_compressor = SimpleNamespace(compress=lambda query, documents: documents)
+        self.model = SimpleNamespace(invoke=lambda messages: SimpleNamespace(content="answer"))
+
+    def retrieve_documents(self, query, raise_errors=False):
+        time.sleep(0.2)
+        return ["chunk"]
+
+    def format_context(self, documents):
+        return "\n".join(documents)
+
+    def construct_messages(self, history, context):
+        return list(history)
+
+
+def test_discarded_speculative_search_does_not_touch_the_request():
+    machine = StateMachine(Chatbot(needs_search=False), speculative=True)
+    ctx = machine.run("hello", ChatContext("hello"))
+    timings = dict(ctx.timings)
+
+    time.sleep(0.3)  # the search thread finishes after the request
+    assert ctx.timings == timings
+    assert "speculative_search" not in ctx.timings
+    assert machine.speculation["discarded"] == 1
+
+
+def test_used_speculative_search_is_timed_by_the_request():
+    machine = StateMachine(Chatbot(needs_search=True), speculative=True)
+    ctx = machine.run("opening hours?", ChatContext("opening hours?"))
+
+    assert ctx.documents == ["chunk"]
+    assert ctx.timings["speculative_search"] >= 200
+    assert "speculation_saved" in ctx.timings
+    assert machine.speculation["used"] == 1
@@ -0,0 +1,30 @@
+import asyncio
+import gc
+
+from controllers.client_registry import ClientRegistry
+
+
+def test_async_mongo_clients_are_per_loop_and_closed_on_shutdown():
+    registry = ClientRegistry()
+
+    async def serve():
+        client = registry.async_mongo_client("mongodb://localhost:27017")
+        assert registry.async_mongo_client("mongodb://localhost:27017") is client
+        await registry.aclose()
+        assert registry.stats()["async_mongo"] == {}
+        return client
+
+    first = asyncio.run(serve())
+    second = asyncio.run(serve())
+    assert first is not second
+
+
+def test_client_of_a_finished_loop_is_forgotten():
+    registry = ClientRegistry()
+
+    async def use():
+        registry.async_mongo_client("mongodb://localhost:27017")
+
+    asyncio.run(use())
+    gc.collect()
+    assert len(registry._async_mongo) == 0
@@ -0,0 +1,65 @@
+from langchain_core.documents import Document
+
+from controllers.context_compressor import SPAN_SEPARATOR, ContextCompressor
+from controllers.token_counter import count_tokens
+
+
+def doc(text, **metadata):
+    return Document(page_content=text, metadata={"source": "faq.html", **metadata})
+
+
+def test_lexical_mode_keeps_matching_sentences_and_whitelisted_metadata():
+    compressor = ContextCompressor(mode="lexical", token_budget=200, metadata_fields=["source"])
+    docs = [
+        doc("Welcome to our shop. Refunds are issued within 14 days. Shipping is free.", title="FAQ", tags=["x"]),
+        doc("Cookies help us improve the site."),
+    ]
+    compressed = compressor.compress("how long do refunds take", docs)
+
+    assert [d.page_content for d in compressed] == ["Refunds are issued within 14 days."]
+    assert compressed[0].metadata == {"source": "faq.html"}
+
+
+def test_adjacent_sentences_are_merged_and_gaps_marked():
+    compressor = ContextCompressor(mode="lexical", token_budget=200)
+    docs = [doc("Refunds take 14 days. Refunds go to the card. Our office is in Paris. Refunds need a receipt.")]
+    compressed = compressor.compress("refunds", docs)
+
+    assert compressed[0].page_content == (
+        "Refunds take 14 days. Refunds go to the card." + SPAN_SEPARATOR + "Refunds need a receipt."
+    )
+
+
+def test_budget_keeps_the_best_sentences_and_drops_emptied_chunks():
+    best = "Refund refund refund policy."
+    weaker = "The refund window is short but the store is open late on most days of the week."
+    compressor = ContextCompressor(mode="lexical", token_budget=count_tokens(best))
+    compressed = compressor.compress("refund policy", [doc(weaker), doc(best, source="policy.html")])
+
+    assert [(d.page_content, d.metadata["source"]) for d in compressed] == [(best, "policy.html")]
+
+
+def test_without_any_match_chunks_are_kept_from_the_top_within_budget():
+    first, second = "Opening hours are nine to five.", "Parking is behind the building."
+    compressor = ContextCompressor(mode="lexical", token_budget=count_tokens(first))
+    compressed = compressor.compress("zzz", [doc(first), doc(second)])
+
+    assert [d.page_content for d in compressed] == [first]
+
+
+def test_long_unpunctuated_runs_are_split_into_word_windows():
+    compressor = ContextCompressor(mode="lexical", token_budget=200, max_sentence_words=5)
+    navigation = " ".join(f"link{i}" for i in range(12))
+    sentences = compressor.split([doc(navigation)])
+
+    assert [text for _, _, text in sentences] == [
+        "link0 link1 link2 link3 link4", "link5 link6 link7 link8 link9", "link10 link11"]
+    assert [d.page_content for d in compressor.compress("link7", [doc(navigation)])] == [sentences[1][2]]
+
+
+def test_none_mode_only_strips_metadata():
+    compressor = ContextCompressor(mode="none", metadata_fields=["title"])
+    compressed = compressor.compress("anything", [doc("Full text. Kept as is.", title="T")])
+
+    assert compressed[0].page_content == "Full text. Kept as is."
+    assert compressed[0].metadata == {"title": "T"}
@@ -0,0 +1,45 @@
+import numpy as np
+from langchain_core.documents import Document
+
+from controllers.context_selector import ContextSelector
+
+
+def candidate(text, score, vector):
+    return Document(page_content=text, metadata={"score": score, "embedding": np.asarray(vector, dtype=np.float32)})
+
+
+def test_mmr_weighs_relevance_on_the_same_scale_as_redundancy():
+    # Vector scores are (1 + cosine) / 2: a clearly better chunk is only a few hundredths ahead
+    docs = [
+        candidate("opening hours of the main office", 0.95, [1.0, 0.0, 0.0]),
+        candidate("opening hours of the main office on weekdays", 0.94, [0.8, 0.6, 0.0]),
+        candidate("parking near the office", 0.86, [0.0, 0.0, 1.0]),
+    ]
+    selector = ContextSelector(min_score=0.8, mmr=True, mmr_lambda=0.7, max_chunks=2, token_budget=1000)
+    # The second chunk is relevant enough to beat an unrelated one despite overlapping with the first
+    assert [doc.page_content for doc in selector.select(docs)] == [
+        "opening hours of the main office", "opening hours of the main office on weekdays"]
+
+
+def test_mmr_drops_near_duplicates_and_prefers_novel_chunks():
+    docs = [
+        candidate("a", 0.95, [1.0, 0.0]),
+        candidate("a again", 0.94, [1.0, 0.001]),
+        candidate("b", 0.90, [0.6, 0.8]),
+    ]
+    selector = ContextSelector(min_score=0.8, mmr=True, mmr_lambda=0.5, max_chunks=3, token_budget=1000)
+    assert [doc.page_content for doc in selector.select(docs)] == ["a", "b"]
+
+
+def test_cutoff_budget_and_chunk_limit():
+    long_text = "word " * 300
+    docs = [
+        Document(page_content="first", metadata={"score": 0.95}),
+        Document(page_content=long_text, metadata={"score": 0.93}),
+        Document(page_content="third", metadata={"score": 0.90}),
+        Document(page_content="irrelevant", metadata={"score": 0.5}),
+        Document(page_content="bm25 only", metadata={}),
+    ]
+    selector = ContextSelector(min_score=0.82, mmr=False, max_chunks=3, token_budget=50)
+    # The long chunk does not fit the budget, a shorter one further down still does; no score means BM25 only
+    assert [doc.page_content for doc in selector.select(docs)] == ["first", "third", "bm25 only"]
@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from controllers.dimension_reduction import DEFAULT_DIMENSIONS, DimensionReducer, ReducedEmbeddings
+
+
+def test_truncate_keeps_the_leading_components_at_unit_length(tmp_path):
+    reducer = DimensionReducer(dimensions=2, method="truncate", model_path=str(tmp_path / "pca.npz"))
+    reduced = reducer.reduce([[3.0, 4.0, 12.0], [0.0, 0.0, 1.0]])
+
+    np.testing.assert_allclose(reduced, [[0.6, 0.8], [0.0, 0.0]])
+    # Vectors already at the target size pass through unchanged
+    np.testing.assert_array_equal(reducer.reduce([[3.0, 4.0]]), [[3.0, 4.0]])
+    with pytest.raises(ValueError, match="Cannot reduce"):
+        DimensionReducer(dimensions=4, method="truncate").reduce([[1.0, 2.0, 3.0]])
+
+
+def test_pca_projects_onto_the_main_directions_and_is_reloaded(tmp_path):
+    path = str(tmp_path / "pca.npz")
+    rng = np.random.default_rng(0)
+    # Variance lives in the first two of four dimensions
+    sample = np.column_stack([rng.normal(0, 10, 200), rng.normal(0, 5, 200),
+                              rng.normal(0, 0.01, 200), rng.normal(0, 0.01, 200)])
+
+    reducer = DimensionReducer(dimensions=2, method="pca", model_path=path)
+    with pytest.raises(RuntimeError, match="not fitted"):
+        reducer.reduce(sample[:1])
+    assert reducer.fit(sample) > 0.99
+
+    reduced = reducer.reduce(sample[:5])
+    assert reduced.shape == (5, 2)
+    np.testing.assert_allclose(np.linalg.norm(reduced, axis=1), 1.0, rtol=1e-5)
+
+    reloaded = DimensionReducer(dimensions=2, method="pca", model_path=path)
+    np.testing.assert_allclose(reloaded.reduce(sample[:5]), reduced, rtol=1e-5)
+    with pytest.raises(ValueError, match="projects to 2"):
+        DimensionReducer(dimensions=3, method="pca", model_path=path)
+
+
+def test_pca_needs_at_least_as_many_samples_as_dimensions(tmp_path):
+    reducer = DimensionReducer(dimensions=3, method="pca", model_path=str(tmp_path / "pca.npz"))
+    with pytest.raises(ValueError, match="at least 3"):
+        reducer.fit(np.eye(4)[:2])
+
+
+def test_reduced_vectors_use_their_own_cache_namespace():
+    assert DimensionReducer(dimensions=DEFAULT_DIMENSIONS).cache_namespace("ada") == "ada"
+    assert DimensionReducer(dimensions=256, method="truncate").cache_namespace("ada") == "ada:truncate256"
+    with pytest.raises(ValueError, match="Unsupported"):
+        DimensionReducer(dimensions=2, method="random")
+
+
+def test_reduced_embeddings_wrap_queries_and_documents():
+    class Full:
+        def embed_documents(self, texts):
+            return [[3.0, 4.0, 1.0] for _ in texts]
+
+        def embed_query(self, text):
+            return [0.0, 2.0, 1.0]
+
+    embeddings = ReducedEmbeddings(Full(), DimensionReducer(dimensions=2, method="truncate"))
+    assert embeddings.embed_query("q") == pytest.approx([0.0, 1.0])
+    assert embeddings.embed_documents(["a", "b"]) == [pytest.approx([0.6, 0.8])] * 2
+    assert embeddings.embed_documents([]) == []
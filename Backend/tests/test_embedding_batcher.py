@@ -0,0 +1,99 @@
+import pytest
+from langchain_core.embeddings import Embeddings
+
+from controllers import embedding_batcher
+from controllers.embedding_batcher import BatchEmbedder, RateLimiter
+from controllers.token_counter import count_tokens
+
+
+class FakeClock:
+    """Stands in for the time module: sleeping advances the clock instantly."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def monotonic(self):
+        return self.now
+
+    def perf_counter(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class RecordingEmbeddings(Embeddings):
+    def __init__(self):
+        self.batches = []
+
+    def embed_documents(self, texts):
+        self.batches.append(list(texts))
+        return [[float(len(text))] for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(embedding_batcher, "time", clock)
+    return clock
+
+
+def test_request_limit_waits_for_the_bucket_to_refill(clock):
+    limiter = RateLimiter(requests_per_minute=2)
+    limiter.acquire(1)
+    limiter.acquire(1)
+    assert clock.now == 0.0
+
+    limiter.acquire(1)
+    assert clock.now == pytest.approx(30.0, abs=0.1)
+
+
+def test_token_limit_waits_for_the_missing_tokens(clock):
+    limiter = RateLimiter(tokens_per_minute=100)
+    limiter.acquire(80)
+    limiter.acquire(50)  # 30 tokens short at 100 per minute
+    assert clock.now == pytest.approx(18.0, abs=0.1)
+
+
+def test_batch_over_the_whole_budget_waits_for_a_full_bucket(clock):
+    limiter = RateLimiter(tokens_per_minute=100)
+    limiter.acquire(100)
+    limiter.acquire(500)
+    assert clock.now == pytest.approx(60.0, abs=0.1)
+
+
+def test_unlimited_limiter_never_waits(clock):
+    limiter = RateLimiter()
+    for _ in range(100):
+        limiter.acquire(10_000)
+    assert clock.now == 0.0
+
+
+def test_batches_are_bounded_by_tokens_and_size():
+    texts = ["word " * 40, "word " * 40, "word " * 40, "hi", "hi", "hi", "hi"]
+    limit = 2 * count_tokens(texts[0])
+    embedder = BatchEmbedder(RecordingEmbeddings(), max_batch_tokens=limit, max_batch_size=3, concurrency=1)
+
+    batches = embedder.make_batches(texts)
+    assert [indexes for indexes, _ in batches] == [[0, 1], [2, 3, 4], [5, 6]]
+    assert all(tokens <= limit for _, tokens in batches)
+    assert batches[0][1] == limit
+
+
+def test_text_over_the_token_limit_gets_its_own_batch():
+    embedder = BatchEmbedder(RecordingEmbeddings(), max_batch_tokens=5, max_batch_size=10, concurrency=1)
+    batches = embedder.make_batches(["hi", "word " * 40, "hi"])
+    assert [indexes for indexes, _ in batches] == [[0], [1], [2]]
+
+
+def test_embed_keeps_input_order_across_concurrent_batches():
+    embeddings = RecordingEmbeddings()
+    texts = [f"text {'x' * i}" for i in range(10)]
+    embedder = BatchEmbedder(embeddings, max_batch_tokens=10_000, max_batch_size=3, concurrency=4)
+
+    assert embedder.embed(texts) == [[float(len(text))] for text in texts]
+    assert sorted(len(batch) for batch in embeddings.batches) == [1, 3, 3, 3]
+    assert embedder.last_run["chunks"] == 10 and embedder.last_run["batches"] == 4
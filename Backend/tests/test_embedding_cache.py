@@ -0,0 +1,62 @@
+from langchain_core.embeddings import Embeddings
+
+from controllers.embedding_cache import CachedEmbeddings, normalize_query
+
+
+class CountingEmbeddings(Embeddings):
+    model = "counting"
+
+    def __init__(self):
+        self.calls = []
+
+    def embed_query(self, text):
+        self.calls.append(text)
+        return [0.5, float(len(text))]
+
+    def embed_documents(self, texts):
+        self.calls.extend(texts)
+        return [[0.5, float(len(text))] for text in texts]
+
+
+def test_queries_are_normalized_before_lookup():
+    assert normalize_query("  What are the\n opening   HOURS?! ") == "what are the opening hours"
+
+    embeddings = CountingEmbeddings()
+    cache = CachedEmbeddings(embeddings, max_entries=8)
+    first = cache.embed_query("Opening hours?")
+    assert cache.embed_query("  opening   HOURS") == first
+    assert embeddings.calls == ["Opening hours?"]
+    assert cache.stats()["memory_hits"] == 1
+
+
+def test_sqlite_tier_survives_a_restart_and_is_scoped_by_model(tmp_path):
+    path = str(tmp_path / "embeddings.db")
+    CachedEmbeddings(CountingEmbeddings(), persist_path=path).embed_query("opening hours")
+
+    embeddings = CountingEmbeddings()
+    restarted = CachedEmbeddings(embeddings, persist_path=path)
+    assert restarted.embed_query("Opening hours.") == [0.5, 13.0]
+    assert embeddings.calls == []
+    assert restarted.stats()["disk_hits"] == 1
+
+    # The disk hit was promoted to memory
+    restarted.embed_query("opening hours")
+    assert restarted.stats()["memory_hits"] == 1
+
+    other_model = CountingEmbeddings()
+    CachedEmbeddings(other_model, persist_path=path, namespace="other").embed_query("opening hours")
+    assert other_model.calls == ["opening hours"]
+
+
+def test_memory_tier_is_lru_bounded_and_embed_many_batches_misses():
+    embeddings = CountingEmbeddings()
+    cache = CachedEmbeddings(embeddings, max_entries=2)
+    cache.embed_query("a")
+    cache.embed_query("b")
+    cache.embed_query("a")
+    cache.embed_query("c")  # evicts b, the least recently used
+    assert cache.stats()["entries"] == 2
+
+    embeddings.calls.clear()
+    cache.embed_many(["A", "b", "d", "c"])
+    assert embeddings.calls == ["b", "d"]
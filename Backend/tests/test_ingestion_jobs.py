@@ -0,0 +1,167 @@
+import threading
+import time
+
+import pytest
+
+from controllers.ingestion_jobs import IngestionJobs
+
+
+class RecordingStore:
+    """Stands in for VectorStoreController.insert_data."""
+
+    def __init__(self):
+        self.calls = []
+        self.done = threading.Event()
+
+    def insert_data(self, sources, sources_type, tags=None, progress=None, cancel_event=None, run_id=None):
+        self.calls.append(list(sources))
+        for source in sources:
+            progress(source, "done")
+        self.done.set()
+        return {"completed": len(sources)}
+
+
+def drain(jobs):
+    jobs.close()
+
+
+def test_job_runs_and_reports_progress(tmp_path):
+    store = RecordingStore()
+    jobs = IngestionJobs(lambda: store, path=str(tmp_path / "jobs.sqlite3"))
+    job_id = jobs.submit(["a", "b"], "url")
+    drain(jobs)
+
+    status = jobs.status(job_id)
+    assert status["status"] == "completed"
+    assert status["progress"]["done"] == 2
+    assert store.calls == [["a", "b"]]
+
+
+def test_resume_after_cancel_does_not_deadlock(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    jobs = IngestionJobs(RecordingStore, path=path)
+    job_id = jobs.submit(["a"], "url")
+    drain(jobs)
+    # A job the previous process was running when cancellation was requested; its lease has expired
+    jobs._db.execute("UPDATE jobs SET status = 'running', cancel_requested = 1, heartbeat_at = 0 WHERE id = ?",
+                     (job_id,))
+    jobs._db.execute("UPDATE job_sources SET state = 'fetch' WHERE job_id = ?", (job_id,))
+    jobs._db.commit()
+
+    store = RecordingStore()
+    resumed = IngestionJobs(lambda: store, path=path)
+    finished = threading.Thread(target=drain, args=(resumed,), daemon=True)
+    finished.start()
+    finished.join(timeout=5)
+    assert not finished.is_alive(), "resumed job deadlocked"
+
+    status = resumed.status(job_id)
+    assert status["status"] == "cancelled"
+    assert status["progress"]["cancelled"] == 1
+    assert store.calls == []
+
+
+def test_cancel_queued_job(tmp_path):
+    gate = threading.Event()
+
+    class BlockingStore(RecordingStore):
+        def insert_data(self, *args, **kwargs):
+            gate.wait(5)
+            return super().insert_data(*args, **kwargs)
+
+    store = BlockingStore()
+    jobs = IngestionJobs(lambda: store, path=str(tmp_path / "jobs.sqlite3"))
+    first = jobs.submit(["a"], "url")
+    second = jobs.submit(["b"], "url")  # waits behind the first job (one worker)
+    assert jobs.cancel(second) == "cancelled"
+    gate.set()
+    drain(jobs)
+
+    assert jobs.status(first)["status"] == "completed"
+    assert jobs.status(second)["status"] == "cancelled"
+    assert store.calls == [["a"]]
+
+
+class WaitForCancelStore(RecordingStore):
+    """Runs until the job is cancelled."""
+
+    def __init__(self):
+        super().__init__()
+        self.started = threading.Event()
+
+    def insert_data(self, sources, sources_type, tags=None, progress=None, cancel_event=None, run_id=None):
+        self.calls.append(list(sources))
+        self.started.set()
+        cancel_event.wait(5)
+        for source in sources:
+            progress(source, "cancelled")
+        return {"completed": 0}
+
+
+def test_other_process_leaves_a_leased_job_alone(tmp_path, monkeypatch):
+    monkeypatch.setenv("INGEST_JOB_LEASE_SECONDS", "0.3")
+    path = str(tmp_path / "jobs.sqlite3")
+    owner_store, other_store = WaitForCancelStore(), RecordingStore()
+    owner = IngestionJobs(lambda: owner_store, path=path)
+    job_id = owner.submit(["a"], "url")
+    assert owner_store.started.wait(5)
+
+    # A second process (e.g. the reloader child, another gunicorn worker) opens the same table
+    other = IngestionJobs(lambda: other_store, path=path)
+    time.sleep(0.5)  # longer than a lease: the owner's heartbeat keeps the job
+    assert other.status(job_id)["status"] == "running"
+
+    # Cancelled through the other process, stopped by the owner at its next heartbeat
+    assert other.cancel(job_id) == "cancelling"
+    deadline = time.monotonic() + 5
+    while other.status(job_id)["status"] == "running" and time.monotonic() < deadline:
+        time.sleep(0.05)
+    drain(owner)
+    drain(other)
+    assert other.status(job_id)["status"] == "cancelled"
+    assert other_store.calls == []
+    assert owner_store.calls == [["a"]]
+
+
+def test_job_of_a_dead_process_is_taken_over(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    jobs = IngestionJobs(RecordingStore, path=path)
+    job_id = jobs.submit(["a"], "url")
+    drain(jobs)
+    jobs._db.execute("UPDATE jobs SET status = 'running', owner = 'dead', heartbeat_at = 0 WHERE id = ?", (job_id,))
+    jobs._db.execute("UPDATE job_sources SET state = 'embed' WHERE job_id = ?", (job_id,))
+    jobs._db.commit()
+
+    store = RecordingStore()
+    resumed = IngestionJobs(lambda: store, path=path)
+    drain(resumed)
+    assert resumed.status(job_id)["status"] == "completed"
+    assert store.calls == [["a"]]
+
+
+class OutcomeStore(RecordingStore):
+    """Reports the given final state for each source."""
+
+    def __init__(self, outcomes):
+        super().__init__()
+        self.outcomes = outcomes
+
+    def insert_data(self, sources, sources_type, tags=None, progress=None, cancel_event=None, run_id=None):
+        for source in sources:
+            progress(source, self.outcomes[source], "fetch: 404" if self.outcomes[source] == "failed" else None)
+        if "cancel" in self.outcomes:
+            cancel_event.set()  # cancellation requested after every source finished
+        return {"completed": list(self.outcomes.values()).count("done")}
+
+
+@pytest.mark.parametrize("outcomes, status", [
+    ({"a": "failed", "b": "failed"}, "failed"),
+    ({"a": "done", "b": "failed"}, "partial"),
+    ({"a": "done", "b": "done", "cancel": True}, "completed"),
+    ({"a": "done", "b": "cancelled"}, "cancelled"),
+])
+def test_final_status_follows_the_sources(tmp_path, outcomes, status):
+    jobs = IngestionJobs(lambda: OutcomeStore(outcomes), path=str(tmp_path / "jobs.sqlite3"))
+    job_id = jobs.submit(["a", "b"], "url")
+    drain(jobs)
+    assert jobs.status(job_id)["status"] == status
@@ -0,0 +1,40 @@
+import os
+
+from controllers.ingestion_pipeline import Checkpoint, IngestionPipeline, SourceTask, Stage
+
+
+def run(checkpoint_path, sources, run_id=None, failing=()):
+    processed = []
+
+    def work(task):
+        if task.source in failing:
+            raise ValueError("unreachable")
+        processed.append(task.source)
+        return task
+
+    pipeline = IngestionPipeline([Stage("work", work)], checkpoint_path=checkpoint_path, run_id=run_id)
+    pipeline.run(SourceTask(source, "url") for source in sources)
+    return sorted(processed)
+
+
+def test_crashed_run_resumes_from_its_checkpoint(tmp_path):
+    path = str(tmp_path / "checkpoint.jsonl")
+    Checkpoint(path, "job-1").mark_finished("a")  # job-1 crashed after finishing "a"
+
+    assert run(path, ["a", "b"], run_id="job-1") == ["b"]
+    assert not os.path.exists(f"{path}.job-1")  # removed once the run finished
+
+
+def test_concurrent_runs_keep_separate_checkpoints(tmp_path):
+    path = str(tmp_path / "checkpoint.jsonl")
+    Checkpoint(path, "job-1").mark_finished("a")
+
+    assert run(path, ["a", "b"], run_id="job-2") == ["a", "b"]
+    assert Checkpoint(path, "job-1").is_finished("a")
+    assert run(path, ["a", "b"]) == ["a", "b"]
+
+
+def test_finished_run_removes_its_checkpoint_even_with_failures(tmp_path):
+    path = str(tmp_path / "checkpoint.jsonl")
+    assert run(path, ["a", "b"], run_id="job-1", failing={"b"}) == ["a"]
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+
+from controllers.query_router import QueryRouter
+
+
+class Chatbot:
+    """The parts of Chatbot the router uses; the LLM answers "search"."""
+
+    search_filters = None
+
+    def __init__(self, vector_store):
+        self.vectorStore = vector_store
+        self.llm_calls = 0
+
+    def is_search_tool_required(self, query):
+        self.llm_calls += 1
+        return True
+
+    async def ais_search_tool_required(self, query):
+        return self.is_search_tool_required(query)
+
+
+@pytest.fixture
+def embed(local_store, monkeypatch):
+    """Make the query embedding a fixed vector (or an error) instead of an API call."""
+    def use(vector):
+        def embed_query(query):
+            if isinstance(vector, Exception):
+                raise vector
+            return vector
+
+        async def aembed_query(query):
+            return embed_query(query)
+
+        monkeypatch.setattr(local_store.query_embeddings, "embed_query", embed_query)
+        monkeypatch.setattr(local_store.query_embeddings, "aembed_query", aembed_query)
+    return use
+
+
+@pytest.mark.parametrize("stored, query_vector, llm_calls", [
+    ([], [1.0, 0.0], 0),  # empty knowledge base: nothing to search
+    ([[1.0, 0.0]], [1.0, 0.0], 0),  # confident match
+    ([[1.0, 0.0]], [0.0, 1.0], 0),  # confidently unrelated
+    ([[1.0, 0.0]], ConnectionError("down"), 1),  # search failed: ask the LLM
+])
+def test_sync_and_async_routers_agree(local_store, embed, stored, query_vector, llm_calls):
+    local_store.collection.insert_many([
+        {"text": f"chunk {i}", "source": "page", "chunk_hash": str(i), "embedding": vector}
+        for i, vector in enumerate(stored)
+    ])
+    embed(query_vector)
+    chatbot = Chatbot(local_store)
+    router = QueryRouter(chatbot, shadow_rate=0, mode="local")
+
+    decision = router.route("What are the opening hours?")
+    assert asyncio.run(router.aroute("What are the opening hours?")) == decision
+    assert chatbot.llm_calls == 2 * llm_calls
+
+
+def test_explicit_zero_thresholds_are_kept(local_store, monkeypatch):
+    monkeypatch.setenv("ROUTER_HIGH_THRESHOLD", "0.5")
+    router = QueryRouter(Chatbot(local_store), high_threshold=0.0, low_threshold=0.0, shadow_rate=0.0)
+    assert (router.high_threshold, router.low_threshold) == (0.0, 0.0)
+    assert QueryRouter(Chatbot(local_store), shadow_rate=0.0).high_threshold == 0.5
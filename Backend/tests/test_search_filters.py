@@ -0,0 +1,66 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from controllers.vector_backends import matches
+from controllers.vector_store_controller import VectorStoreController
+
+JAN = datetime(2024, 1, 1, tzinfo=timezone.utc)
+FEB = datetime(2024, 2, 1, tzinfo=timezone.utc)
+MAR = datetime(2024, 3, 1, tzinfo=timezone.utc)
+
+
+def chunk(text, source, content_type, tags, upload_date, vector):
+    return {"text": text, "source": source, "content_type": content_type, "tags": tags,
+            "upload_date": upload_date, "chunk_hash": text, "embedding": vector}
+
+
+def test_build_filter_without_criteria_is_none():
+    assert VectorStoreController.build_filter() is None
+    assert VectorStoreController.build_filter(sources=[], tags=[]) is None
+
+
+def test_build_filter_single_criterion_is_not_wrapped():
+    assert VectorStoreController.build_filter(sources=("a.pdf",)) == {"source": {"$in": ["a.pdf"]}}
+    assert VectorStoreController.build_filter(date_to=FEB) == {"upload_date": {"$lt": FEB}}
+
+
+def test_build_filter_combines_criteria_with_and():
+    query = VectorStoreController.build_filter(content_types=["pdf"], tags=["billing"], date_from=JAN, date_to=FEB)
+    assert query == {"$and": [
+        {"content_type": {"$in": ["pdf"]}},
+        {"tags": {"$in": ["billing"]}},
+        {"upload_date": {"$gte": JAN, "$lt": FEB}},
+    ]}
+
+
+def test_matches_evaluates_filter_operators():
+    doc = {"source": "a.pdf", "tags": ["billing", "faq"], "upload_date": JAN}
+    assert matches(doc, {"tags": "faq"})
+    assert matches(doc, {"tags": {"$in": ["other", "billing"]}})
+    assert not matches(doc, {"tags": {"$nin": ["faq"]}})
+    assert matches(doc, {"upload_date": {"$gte": JAN, "$lt": FEB}})
+    assert not matches(doc, {"upload_date": {"$gt": JAN}})
+    assert not matches(doc, {"missing": {"$gte": JAN}})
+    assert matches(doc, {"$or": [{"source": "b.pdf"}, {"tags": "faq"}]})
+    assert not matches(doc, {"$and": [{"source": "a.pdf"}, {"tags": "other"}]})
+    assert matches(doc, {"missing": {"$exists": False}, "source": {"$exists": True}})
+    with pytest.raises(ValueError, match="Unsupported"):
+        matches(doc, {"source": {"$regex": "a"}})
+
+
+def test_local_search_applies_the_pre_filter(local_store):
+    local_store.collection.insert_many([
+        chunk("jan pdf", "a.pdf", "pdf", ["billing"], JAN, [1.0, 0.0]),
+        chunk("feb pdf", "b.pdf", "pdf", ["faq"], FEB, [0.9, 0.1]),
+        chunk("mar page", "c.html", "html", ["billing"], MAR, [0.8, 0.2]),
+    ])
+
+    def search(**criteria):
+        pre_filter = VectorStoreController.build_filter(**criteria)
+        return [doc["text"] for doc in local_store.backend.search([1.0, 0.0], k=3, pre_filter=pre_filter)]
+
+    assert search() == ["jan pdf", "feb pdf", "mar page"]
+    assert search(tags=["billing"]) == ["jan pdf", "mar page"]
+    assert search(content_types=["pdf"], date_from=FEB) == ["feb pdf"]
+    assert search(sources=["c.html"], date_to=MAR) == []
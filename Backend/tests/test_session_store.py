@@ -0,0 +1,81 @@
+import time
+
+from controllers.session_store import ConversationHistory, SessionStore
+from controllers.token_counter import count_message_tokens
+
+
+def test_least_recently_used_session_is_evicted_first():
+    store = SessionStore(max_sessions=2)
+    store.append("a", "human", "hi")
+    store.append("b", "human", "hi")
+    store.history("a")  # a is now more recent than b
+    store.append("c", "human", "hi")
+
+    assert "a" in store and "c" in store and "b" not in store
+    assert store.stats()["evictions"] == {"lru": 1, "ttl": 0, "memory": 0}
+
+
+def test_expired_sessions_are_dropped_on_next_access():
+    store = SessionStore(ttl_seconds=0.05)
+    store.append("a", "human", "hi")
+    time.sleep(0.1)
+    store.append("b", "human", "hi")
+
+    assert "a" not in store and len(store) == 1
+    assert store.stats()["evictions"]["ttl"] == 1
+
+
+def test_memory_limit_evicts_other_sessions_but_never_the_active_one():
+    store = SessionStore(max_bytes=150)
+    store.append("a", "human", "x" * 100)  # 5 + 100 bytes
+    store.append("b", "human", "y" * 100)
+
+    assert "a" not in store and "b" in store
+    assert store.total_bytes == 105
+    assert store.stats()["evictions"]["memory"] == 1
+
+    # A single session over the limit is kept: it is the one being written to
+    store.append("b", "ai", "z" * 100)
+    assert "b" in store and store.total_bytes == 207
+
+
+def test_removed_and_trimmed_messages_release_their_bytes():
+    store = SessionStore(max_messages_per_session=2)
+    store.extend("a", [("human", "one"), ("ai", "two"), ("human", "six")])
+    assert store.history("a") == [("ai", "two"), ("human", "six")]
+    assert store.total_bytes == 2 + 3 + 5 + 3
+
+    store.remove("a")
+    assert store.total_bytes == 0 and len(store) == 0
+
+
+def test_window_keeps_the_newest_messages_that_fit_the_budget():
+    messages = [("human", "first question"), ("ai", "a longer first answer"), ("human", "second"), ("ai", "ok")]
+    counts = [count_message_tokens(*message) for message in messages]
+    history = ConversationHistory(token_budget=sum(counts[1:]))
+    for message in messages:
+        history.append(*message)
+
+    assert history.window() == messages[1:]
+    assert history.window_tokens == sum(counts[1:])
+
+
+def test_window_always_keeps_the_newest_message():
+    history = ConversationHistory(token_budget=1)
+    history.append("human", "hello")
+    history.append("ai", "a reply well over the budget")
+
+    assert history.window() == [("ai", "a reply well over the budget")]
+    assert history.window_tokens == count_message_tokens("ai", "a reply well over the budget")
+
+
+def test_window_stays_consistent_when_old_messages_are_trimmed():
+    messages = [("human", f"message number {i}") for i in range(5)]
+    counts = [count_message_tokens(*message) for message in messages]
+    history = ConversationHistory(max_messages=3, token_budget=sum(counts[-2:]))
+    for message in messages:
+        history.append(*message)
+
+    assert history.messages == messages[-3:]
+    assert history.window() == messages[-2:]
+    assert history.window_tokens == sum(counts[-2:])
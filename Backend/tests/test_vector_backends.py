@@ -0,0 +1,108 @@
+import asyncio
+import json
+import os
+import threading
+
+import pytest
+
+from controllers.vector_backends import LocalVectorBackend, hnswlib
+
+
+def records(*items):
+    return [{"text": text, "source": "s", "chunk_hash": text, "embedding": vector} for text, vector in items]
+
+
+def test_controllers_on_one_path_share_the_local_store(local_store, monkeypatch):
+    from controllers.vector_store_controller import VectorStoreController
+    other = VectorStoreController(create_indexes=False)
+    assert other.collection is local_store.collection
+    assert other.meta_collection is local_store.meta_collection
+
+    version = other.get_kb_version()
+    local_store.collection.insert_many(records(("a", [1.0, 0.0])))
+    local_store.bump_kb_version()
+    other.kb_version_refresh_seconds = 0
+    assert other.get_kb_version() == version + 1
+    assert [doc["text"] for doc in other.backend.search([1.0, 0.0], k=1)] == ["a"]
+
+
+@pytest.mark.skipif(hnswlib is None, reason="hnswlib not installed")
+def test_hnsw_rows_follow_inserts_and_deletes(tmp_path):
+    backend = LocalVectorBackend(str(tmp_path), index="hnsw", hnsw_min_vectors=1)
+    backend.insert_many(records(("a", [1.0, 0.0, 0.0]), ("b", [0.0, 1.0, 0.0]), ("c", [0.0, 0.0, 1.0])))
+    assert backend.search([0.0, 1.0, 0.0], k=1)[0]["text"] == "b"
+
+    backend.delete_many({"text": "a"})
+    backend.insert_many(records(("d", [0.0, 0.6, 0.8])))
+    assert [doc["text"] for doc in backend.search([0.0, 0.0, 1.0], k=2)] == ["c", "d"]
+    assert backend.search([0.0, 1.0, 0.0], k=1)[0]["text"] == "b"
+
+
+def test_deferred_writes_flush_once_at_the_end(tmp_path):
+    backend = LocalVectorBackend(str(tmp_path), flush_seconds=3600)
+    with backend.deferred_writes():
+        backend.insert_many(records(("a", [1.0, 0.0])))
+        backend.insert_many(records(("b", [0.0, 1.0])))
+        assert os.listdir(tmp_path) == []
+    with open(tmp_path / "records.1.json") as f:
+        assert sorted(doc["text"] for doc in json.load(f)) == ["a", "b"]
+    assert len(LocalVectorBackend(str(tmp_path))) == 2
+
+
+def test_interrupted_write_keeps_the_last_complete_generation(tmp_path, monkeypatch):
+    backend = LocalVectorBackend(str(tmp_path))
+    backend.insert_many(records(("a", [1.0, 0.0])))
+
+    def crash(*args):
+        raise OSError("disk full")
+
+    # Records of the next generation are written, then the process dies before its vectors are
+    monkeypatch.setattr("controllers.vector_backends.np.save", crash)
+    with pytest.raises(OSError):
+        backend.insert_many(records(("b", [0.0, 1.0])))
+    monkeypatch.undo()
+
+    reopened = LocalVectorBackend(str(tmp_path))
+    assert [doc["text"] for doc in reopened.search([0.0, 1.0], k=2)] == ["a"]
+    reopened.insert_many(records(("c", [0.0, 1.0])))
+    assert sorted(os.listdir(tmp_path)) == ["records.2.json", "state.json", "vectors.2.npy"]
+
+
+def test_misaligned_files_are_refused(tmp_path):
+    backend = LocalVectorBackend(str(tmp_path))
+    backend.insert_many(records(("a", [1.0, 0.0]), ("b", [0.0, 1.0])))
+    with open(tmp_path / "records.2.json", "w") as f:
+        json.dump([{"_id": "a", "text": "a"}], f)
+    with open(tmp_path / "state.json", "w") as f:
+        json.dump({"generation": 2, "rows": 1}, f)
+    os.replace(tmp_path / "vectors.1.npy", tmp_path / "vectors.2.npy")
+
+    with pytest.raises(ValueError, match="inconsistent"):
+        LocalVectorBackend(str(tmp_path))
+
+
+def test_async_search_runs_off_the_event_loop(tmp_path, monkeypatch):
+    backend = LocalVectorBackend(str(tmp_path))
+    backend.insert_many(records(("a", [1.0, 0.0])))
+    search = backend.search
+    threads = []
+
+    def recording_search(*args, **kwargs):
+        threads.append(threading.current_thread())
+        return search(*args, **kwargs)
+
+    monkeypatch.setattr(backend, "search", recording_search)
+    results = asyncio.run(backend.asearch([1.0, 0.0], 1))
+    assert [doc["text"] for doc in results] == ["a"]
+    assert threads and threading.main_thread() not in threads
+
+
+def test_nbytes_counts_the_rescoring_matrix_next_to_the_codes(tmp_path):
+    flat = LocalVectorBackend(str(tmp_path / "flat"), index="flat")
+    binary = LocalVectorBackend(str(tmp_path / "binary"), index="flat", quantization="binary")
+    records = [{"_id": str(i), "text": "", "embedding": [((i * 7 + j * 13) % 11) - 5.0 for j in range(64)]}
+               for i in range(32)]
+    flat.insert_many(records)
+    binary.insert_many(records)
+
+    assert binary.nbytes == flat.nbytes + binary._codes.nbytes
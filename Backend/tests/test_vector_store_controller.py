@@ -0,0 +1,147 @@
+import asyncio
+import threading
+import time
+
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+from pymongo.errors import BulkWriteError
+
+from controllers.ingestion_pipeline import SourceTask
+from controllers.metrics import metrics
+from controllers.vector_backends import LocalVectorBackend
+
+
+class UniqueTextBackend(LocalVectorBackend):
+    """Local backend that also enforces unique_source_text_index, like the Atlas collection."""
+
+    def insert_many(self, records, ordered=True):
+        stored = {(doc.get("source"), doc.get("text")) for doc in self._docs.values()}
+        accepted = [record for record in records if (record.get("source"), record.get("text")) not in stored]
+        result = super().insert_many(accepted, ordered)
+        if len(accepted) < len(records):
+            duplicates = [{"code": 11000} for _ in range(len(records) - len(accepted))]
+            raise BulkWriteError({"nInserted": len(result.inserted_ids), "writeErrors": duplicates})
+        return result
+
+
+def test_reingest_keeps_text_of_hashless_legacy_chunks(local_store):
+    store = local_store
+    store.collection = store.backend = UniqueTextBackend(store.collection.directory)
+    # Written by langchain_mongodb before chunk hashes existed
+    store.collection.insert_many([{"text": "Opening hours are 9 to 5.", "source": "page", "embedding": [1.0, 0.0]}])
+
+    chunk_hash = store.content_hash("Opening hours are 9 to 5.")
+    task = SourceTask("page", "url")
+    task.content_hash = "new-content"
+    task.chunks = [Document(page_content="Opening hours are 9 to 5.",
+                            metadata={"source": "page", "chunk_hash": chunk_hash})]
+    task.vectors = [np.array([1.0, 0.0])]
+    task.chunk_hashes = [chunk_hash]
+    store.write_source(task)
+
+    stored = store.collection.find({"source": "page"})
+    assert [(doc["text"], doc.get("chunk_hash")) for doc in stored] == [("Opening hours are 9 to 5.", chunk_hash)]
+    assert task.inserted == 1
+
+
+def test_failed_insert_leaves_the_manifest_for_a_retry(local_store, monkeypatch):
+    store = local_store
+    store.collection.insert_many([{"text": "Old hours.", "source": "page", "chunk_hash": "old", "embedding": [1.0, 0.0]}])
+    store.manifest_collection.replace_one({"_id": "page"}, {"content_hash": "v1", "chunk_hashes": ["old"]}, upsert=True)
+
+    def task():
+        task = SourceTask("page", "url")
+        task.content_hash = "v2"
+        task.chunks = [Document(page_content="New hours.", metadata={"source": "page", "chunk_hash": "new"})]
+        task.vectors = [np.array([0.0, 1.0])]
+        task.chunk_hashes = ["new"]
+        task.removed_hashes = ["old"]
+        return task
+
+    insert_many = store.collection.insert_many
+
+    def hiccup(records, ordered=True):
+        raise BulkWriteError({"nInserted": 0, "writeErrors": [{"code": 6, "errmsg": "host unreachable"}]})
+
+    monkeypatch.setattr(store.collection, "insert_many", hiccup)
+    with pytest.raises(BulkWriteError):
+        store.write_source(task())
+    assert store.manifest_collection.find_one({"_id": "page"})["content_hash"] == "v1"
+
+    # The next run sees changed content and writes the chunk
+    monkeypatch.setattr(store.collection, "insert_many", insert_many)
+    manifest = store.manifest_collection.find_one({"_id": "page"})
+    assert manifest["content_hash"] != "v2" and "new" not in manifest["chunk_hashes"]
+    store.write_source(task())
+    assert [doc["text"] for doc in store.collection.find({"source": "page"})] == ["New hours."]
+    assert store.manifest_collection.find_one({"_id": "page"})["chunk_hashes"] == ["new"]
+
+
+def test_embedding_config_change_reembeds_unchanged_sources(local_store, monkeypatch):
+    store = local_store
+    chunk_hash = store.content_hash("Opening hours are 9 to 5.")
+
+    def chunk_document(doc):
+        return [Document(page_content=doc.page_content, metadata={"source": "page", "chunk_hash": chunk_hash})], [None]
+
+    def task():
+        task = SourceTask("page", "url")
+        task.documents = [Document(page_content="Opening hours are 9 to 5.")]
+        return task
+
+    monkeypatch.setattr(store, "chunk_document", chunk_document)
+    content_hash = store.content_hash("Opening hours are 9 to 5.")
+    store.manifest_collection.replace_one(
+        {"_id": "page"},
+        {"content_hash": content_hash, "chunk_hashes": [chunk_hash], "embedding_config": store.embedding_config()},
+        upsert=True,
+    )
+    assert store.chunk_source(task()).unchanged
+
+    monkeypatch.setattr(store.reducer, "dimensions", 512)
+    changed = store.chunk_source(task())
+    assert not changed.unchanged
+    assert [chunk.page_content for chunk in changed.chunks] == ["Opening hours are 9 to 5."]
+    assert changed.removed_hashes == [chunk_hash]  # the old-size vector is deleted before the new one is written
+
+
+def test_lexical_index_is_rebuilt_off_the_request_path(local_store, monkeypatch):
+    store = local_store
+    assert store._lexical_version is None  # vector mode: no BM25 index is built at construction
+    store.collection.insert_many([{"text": "opening hours", "source": "page", "chunk_hash": "h", "embedding": [1.0, 0.0]}])
+    store.bump_kb_version()
+
+    scanned = threading.Event()
+    find = store.collection.find
+
+    def slow_find(*args, **kwargs):
+        time.sleep(0.3)
+        scanned.set()
+        return find(*args, **kwargs)
+
+    monkeypatch.setattr(store.collection, "find", slow_find)
+    start = time.perf_counter()
+    index = store.get_lexical_index()
+    assert time.perf_counter() - start < 0.1
+    assert len(index) == 0  # the previous (empty) index answers while the rebuild runs
+
+    assert scanned.wait(5)
+    for _ in range(50):
+        if store._lexical_version == store.get_kb_version():
+            break
+        time.sleep(0.05)
+    assert len(store.get_lexical_index()) == 1
+
+
+def test_swallowed_search_errors_are_counted(local_store, monkeypatch):
+    def unreachable(*args, **kwargs):
+        raise ConnectionError("search service down")
+
+    monkeypatch.setattr(local_store.query_embeddings, "embed_query", unreachable)
+    monkeypatch.setattr(local_store.query_embeddings, "aembed_query", unreachable)
+    before = metrics.errors.values.get(("vector_search", "ConnectionError"), 0)
+
+    assert local_store.vector_search("opening hours") == []
+    assert asyncio.run(local_store.avector_search("opening hours")) == []
+    assert metrics.errors.values[("vector_search", "ConnectionError")] == before + 2
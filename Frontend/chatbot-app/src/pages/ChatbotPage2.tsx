@@ -19,6 +19,7 @@ export default function ChatbotPage2() {
     const [messages, setMessages] = useState<Message[]>([]);
     const [inputText, setInputText] = useState('');
     const [loading, setLoading] = useState(false);
+    const [sessionId, setSessionId] = useState<string | null>(null);
 
 
     useEffect(() =>{
@@ -30,12 +31,13 @@ export default function ChatbotPage2() {
         setLoading(true);
         setMessages((prevMessages) => [...prevMessages, { sender: "human", text: query }]);
         setInputText("");
-        const data = {message: query};
+        const data = {message: query, session_id: sessionId};
 
         try {
             const response = await axiosInstance.post('/api/chatbot', data);
             console.log(response.data);
             const message = response.data.ai_message;
+            setSessionId(response.data.session_id);
             setMessages((prevMessages) => [...prevMessages, { sender: "ai", text: message }]);
         } catch (error) {
             console.error('Error:', error);